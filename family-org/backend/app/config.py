@@ -11,6 +11,26 @@ class Settings(BaseSettings):
     SECRET_KEY: str = os.getenv("SECRET_KEY", "super-secret-key-for-jwt")
     OLLAMA_HOST: str = os.getenv("OLLAMA_HOST", "http://host.docker.internal:11434")
     OLLAMA_MODEL: str = os.getenv("OLLAMA_MODEL", "deepseek-r1:latest")
+    OLLAMA_CONCURRENCY: int = int(os.getenv("OLLAMA_CONCURRENCY", "2"))  # generations in flight per process
+    OLLAMA_TIMEOUT: int = int(os.getenv("OLLAMA_TIMEOUT", "60"))  # seconds
+    OLLAMA_KEEP_ALIVE: str = os.getenv("OLLAMA_KEEP_ALIVE", "30m")  # how long Ollama keeps the model loaded
+    OLLAMA_FAILURE_THRESHOLD: int = int(os.getenv("OLLAMA_FAILURE_THRESHOLD", "3"))  # consecutive failures before failing fast
+    OLLAMA_RECOVERY_TIME: int = int(os.getenv("OLLAMA_RECOVERY_TIME", "30"))  # seconds before probing again
+    LLM_CACHE_TTL: int = int(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))  # seconds
+    LLM_CACHE_MEMORY_SIZE: int = int(os.getenv("LLM_CACHE_MEMORY_SIZE", "512"))  # entries per process
+    BROWSER_CONCURRENCY: int = int(os.getenv("BROWSER_CONCURRENCY", "2"))  # scrapes sharing the worker's Chromium at once
+    BROWSER_MAX_USES: int = int(os.getenv("BROWSER_MAX_USES", "50"))  # contexts before Chromium is restarted
+    GO4SCHOOLS_SESSION_TTL: int = int(os.getenv("GO4SCHOOLS_SESSION_TTL", str(7 * 24 * 3600)))  # seconds a saved login is reused at most; above a day so the nightly scrape can use it
+    GOOGLE_SYNC_CONCURRENCY: int = int(os.getenv("GOOGLE_SYNC_CONCURRENCY", "5"))
+    SYNC_MAX_ATTEMPTS: int = int(os.getenv("SYNC_MAX_ATTEMPTS", "5"))
+    SYNC_RETRY_BASE_DELAY: int = int(os.getenv("SYNC_RETRY_BASE_DELAY", "30"))  # seconds, x4 per attempt
+    SYNC_INTERACTIVE_CONSUMERS: int = int(os.getenv("SYNC_INTERACTIVE_CONSUMERS", "2"))
+    SCHEDULER_TICK: int = int(os.getenv("SCHEDULER_TICK", "30"))  # seconds between due-job checks
+    WORKER_METRICS_PORT: int = int(os.getenv("WORKER_METRICS_PORT", "9100"))
+    API_METRICS_PORT: int = int(os.getenv("API_METRICS_PORT", "9101"))  # internal only, not the public API port; 0 disables
+    N_PLUS_ONE_THRESHOLD: int = int(os.getenv("N_PLUS_ONE_THRESHOLD", "5"))  # repeats of one statement per request
+    TRACE_FILE: str = os.getenv("TRACE_FILE", "")  # JSON lines of finished spans; empty disables
+    TRACE_COLLECTOR_URL: str = os.getenv("TRACE_COLLECTOR_URL", "")  # OTLP/HTTP endpoint, e.g. http://jaeger:4318
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 # 1 day
 
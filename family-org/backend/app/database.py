@@ -1,11 +1,13 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect
 from sqlalchemy.orm import sessionmaker
 from .config import settings
 from .models import Base
+from .services.query_stats import instrument_engine
 
 SQLALCHEMY_DATABASE_URL = settings.DATABASE_URL
 
 engine = create_engine(SQLALCHEMY_DATABASE_URL)
+instrument_engine(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 def get_db():
@@ -15,5 +17,37 @@ def get_db():
     finally:
         db.close()
 
+def dialect_insert(db):
+    """Return the dialect's `insert` construct, which supports ON CONFLICT upserts."""
+    if db.get_bind().dialect.name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        from sqlalchemy.dialects.postgresql import insert
+    return insert
+
+def _add_missing_columns():
+    """Add nullable columns that were added to existing models.
+
+    `create_all` only creates missing tables, so new columns on existing
+    tables would otherwise need a manual ALTER TABLE.
+    """
+    inspector = inspect(engine)
+    existing_tables = inspector.get_table_names()
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or not column.nullable:
+                    continue
+                col_type = column.type.compile(dialect=engine.dialect)
+                conn.exec_driver_sql(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {col_type}')
+                if column.index:
+                    conn.exec_driver_sql(
+                        f'CREATE INDEX IF NOT EXISTS ix_{table.name}_{column.name} ON {table.name} ({column.name})'
+                    )
+
 def init_db():
     Base.metadata.create_all(bind=engine)
+    _add_missing_columns()
@@ -1,11 +1,35 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from typing import Optional
 import time
-from .routers import auth, chores, rewards, dashboard, settings, rosters
+from .routers import auth, chores, rewards, dashboard, settings, rosters, sync
 from .database import init_db
+from .services.rabbitmq import publisher
+from .services.ollama import ollama
+from .services.metrics import MetricsMiddleware
+from .services.tracing import TracingMiddleware
+from .config import settings as app_settings
+from prometheus_client import start_http_server
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    try:
+        await publisher.start()
+    except Exception as e:
+        print(f"RabbitMQ publisher not started, will connect on first publish: {e}")
+    # Metrics go on their own port so they aren't reachable through the public API
+    if app_settings.API_METRICS_PORT:
+        try:
+            start_http_server(app_settings.API_METRICS_PORT)
+            print(f"Serving metrics on port {app_settings.API_METRICS_PORT}")
+        except OSError as e:
+            print(f"Metrics server not started: {e}")
+    yield
+    await publisher.close()
+    await ollama.close()
+
+app = FastAPI(lifespan=lifespan)
 
 # Create tables on startup with retry logic
 for i in range(5):
@@ -29,6 +53,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(TracingMiddleware)
 
 app.include_router(auth.router)
 app.include_router(chores.router)
@@ -36,6 +62,7 @@ app.include_router(rewards.router)
 app.include_router(dashboard.router)
 app.include_router(settings.router)
 app.include_router(rosters.router)
+app.include_router(sync.router)
 
 @app.get("/")
 def read_root():
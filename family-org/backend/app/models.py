@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, Float, DateTime, JSON
+from sqlalchemy import Column, Integer, String, Text, Boolean, ForeignKey, Float, DateTime, JSON, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql import func
@@ -19,9 +19,12 @@ class User(Base):
     threshold_preference = Column(Float, default=5.0) # Number of tasks/events before warning
     google_access_token = Column(String, nullable=True)
     google_refresh_token = Column(String, nullable=True)
+    google_token_expiry = Column(DateTime, nullable=True)  # naive UTC, as reported by google-auth
     preferences = Column(JSON, default=dict, nullable=False, server_default="{}")
     go4schools_email = Column(String, nullable=True)
     go4schools_password = Column(String, nullable=True)  # Fernet-encrypted
+    go4schools_session = Column(Text, nullable=True)  # Fernet-encrypted Playwright storage state of the last login
+    go4schools_session_expires_at = Column(DateTime, nullable=True)  # naive UTC
 
     chores = relationship("Chore", back_populates="assignee")
     rewards = relationship("Reward", back_populates="redeemer")
@@ -33,6 +36,8 @@ class Chore(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     google_task_id = Column(String, unique=True, index=True, nullable=True)
+    google_task_status = Column(String, nullable=True)  # last status seen on/sent to Google Tasks
+    google_task_etag = Column(String, nullable=True)
     title = Column(String, index=True)
     description = Column(String, nullable=True)
     points = Column(Integer, default=0)
@@ -111,10 +116,25 @@ class Event(Base):
     start_time = Column(String) # ISO format
     end_time = Column(String)
     location = Column(String, nullable=True)
+    calendar_id = Column(String, nullable=True, index=True)  # Google calendar the event came from
+    etag = Column(String, nullable=True)  # Google etag, used to skip unchanged rows on sync
     user_id = Column(Integer, ForeignKey("users.id"))
 
     user = relationship("User", back_populates="events")
 
+
+class GoogleSyncState(Base):
+    """Incremental sync cursor for one Google calendar or task list of a user."""
+    __tablename__ = "google_sync_states"
+    __table_args__ = (UniqueConstraint("user_id", "resource_type", "resource_id"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    resource_type = Column(String, nullable=False)  # "calendar" or "tasks"
+    resource_id = Column(String, nullable=False)  # Google calendar or task list ID
+    sync_token = Column(String, nullable=True)  # nextSyncToken (calendar) or updatedMin cursor (tasks)
+    last_synced_at = Column(DateTime, nullable=True)
+
 class Alert(Base):
     __tablename__ = "alerts"
 
@@ -127,3 +147,67 @@ class Alert(Base):
     created_at = Column(DateTime, server_default=func.now())
 
     user = relationship("User", back_populates="alerts")
+
+
+class SyncRequest(Base):
+    """A queued or running sync for one user, used to collapse repeated triggers."""
+    __tablename__ = "sync_requests"
+    __table_args__ = (UniqueConstraint("user_id", "sync_type"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    sync_type = Column(String, nullable=False)  # message type, e.g. "calendar_sync"
+    state = Column(String, nullable=False, default="queued")  # queued, running, retrying
+    lane = Column(String, nullable=True, default="interactive")  # interactive, batch
+    rerun = Column(Boolean, nullable=False, default=False)  # triggered again while running
+    updated_at = Column(DateTime, nullable=False)
+
+
+class ScheduledJob(Base):
+    """Persisted run times of a recurring worker job, shared by all worker replicas."""
+    __tablename__ = "scheduled_jobs"
+
+    name = Column(String, primary_key=True)
+    schedule = Column(String, nullable=False)  # cron expression, server local time
+    next_run_at = Column(DateTime, nullable=False)  # naive UTC
+    last_run_at = Column(DateTime, nullable=True)
+    last_duration = Column(Float, nullable=True)  # seconds
+    last_error = Column(String, nullable=True)
+
+
+class LLMCacheEntry(Base):
+    """A cached LLM reply, keyed by model and normalised prompt."""
+    __tablename__ = "llm_cache"
+
+    key = Column(String(64), primary_key=True)  # sha256 hex of model + normalised prompt
+    model = Column(String, nullable=False)
+    response = Column(Text, nullable=False)
+    created_at = Column(DateTime, nullable=False)  # naive UTC
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+
+class ScheduleAnalysis(Base):
+    """Latest AI analysis of a user's day, precomputed by the worker and served as-is."""
+    __tablename__ = "schedule_analyses"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    event_count = Column(Integer, nullable=False, default=0)
+    chore_count = Column(Integer, nullable=False, default=0)
+    busy = Column(Boolean, nullable=False, default=False)
+    message = Column(String, nullable=True)  # alert text on a busy day
+    alert_id = Column(Integer, ForeignKey("alerts.id", ondelete="SET NULL"), nullable=True)
+    computed_at = Column(DateTime, nullable=True)  # naive UTC; null until first computed
+    requested_job_id = Column(String, nullable=True)  # latest recompute asked for
+    completed_job_id = Column(String, nullable=True)  # latest recompute reflected in this row
+
+
+class PrepRule(Base):
+    """A household rule answering which preparation tasks an event needs, checked before the LLM."""
+    __tablename__ = "prep_rules"
+
+    id = Column(Integer, primary_key=True, index=True)
+    pattern = Column(String, nullable=False)  # comma-separated keywords, or a regex if is_regex
+    is_regex = Column(Boolean, nullable=False, default=False)
+    tasks = Column(JSON, nullable=False, default=list)  # task titles; empty means no preparation needed
+    priority = Column(Integer, nullable=False, default=0)  # higher is checked first
+    created_at = Column(DateTime, server_default=func.now())
@@ -11,6 +11,7 @@ from ..database import get_db
 from ..models import User
 from ..config import settings
 from ..services.auth_service import create_access_token
+from ..services.google_tokens import token_manager
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
@@ -79,6 +80,7 @@ async def callback(code: str, db: Session = Depends(get_db)):
             # Link pre-created account to their Google identity
             user.google_id = google_id
             user.google_access_token = credentials.token
+            user.google_token_expiry = credentials.expiry
             if credentials.refresh_token:
                 user.google_refresh_token = credentials.refresh_token
         else:
@@ -87,22 +89,23 @@ async def callback(code: str, db: Session = Depends(get_db)):
                 email=email,
                 name=name,
                 google_access_token=credentials.token,
-                google_refresh_token=credentials.refresh_token
+                google_refresh_token=credentials.refresh_token,
+                google_token_expiry=credentials.expiry
             )
             db.add(user)
     else:
         user.google_access_token = credentials.token
+        user.google_token_expiry = credentials.expiry
         if credentials.refresh_token:
             user.google_refresh_token = credentials.refresh_token
     
     db.commit()
     db.refresh(user)
+    token_manager.forget(user.id)
 
-    # Trigger sync in background
-    from ..services.rabbitmq import send_sync_message
-    import asyncio
-    asyncio.create_task(send_sync_message("calendar_sync", {"user_id": user.id}))
-    asyncio.create_task(send_sync_message("tasks_sync", {"user_id": user.id}))
+    # Trigger sync (skipped if one is already queued for this user)
+    from ..services.sync_requests import try_request_syncs
+    await try_request_syncs(db, [("calendar_sync", user.id), ("tasks_sync", user.id)])
 
     # Create JWT for our application
     access_token = create_access_token(data={"sub": user.email, "id": user.id})
@@ -130,6 +133,12 @@ async def get_me(request: Request, db: Session = Depends(get_db)):
         raise HTTPException(status_code=401, detail="User not found")
     return user
 
+def require_parent(current_user: User = Depends(get_me)) -> User:
+    """Like `get_me`, for endpoints only parents may use."""
+    if current_user.role != "parent":
+        raise HTTPException(status_code=403, detail="Only parents can do this")
+    return current_user
+
 @router.post("/test-user")
 def create_test_user(user_in: dict, db: Session = Depends(get_db)):
     """Create a test user or return if exists."""
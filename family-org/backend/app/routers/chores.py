@@ -6,6 +6,7 @@ from typing import List
 from ..database import get_db
 from ..models import User, Chore, ChoreCompletion, RosterAssignment
 from ..schemas import ChoreCreate, Chore as ChoreSchema
+from ..services.sync_requests import try_request_sync
 
 from .auth import get_me
 from .dashboard import manager
@@ -122,6 +123,10 @@ async def complete_chore(chore_id: int, user_id: int, db: Session = Depends(get_
 
     db.commit()
 
+    if chore.google_task_id:
+        # Push the completion back to Google Tasks
+        await try_request_sync(db, "tasks_sync", chore.assignee_id)
+
     await manager.broadcast({
         "type": "CHORE_COMPLETED",
         "chore_id": chore_id,
@@ -161,6 +166,9 @@ async def uncomplete_chore(chore_id: int, db: Session = Depends(get_db), current
     chore.last_completed_at = None
     db.commit()
 
+    if chore.google_task_id and chore.assignee_id:
+        await try_request_sync(db, "tasks_sync", chore.assignee_id)
+
     await manager.broadcast({
         "type": "CHORE_UNCOMPLETED",
         "chore_id": chore_id,
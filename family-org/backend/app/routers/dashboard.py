@@ -1,14 +1,18 @@
 import html as _html_mod
 import re
+import anyio
 from datetime import datetime
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, HTTPException
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, StreamingResponse
 from sqlalchemy.orm import Session
 from typing import List
 import json
 from ..database import get_db
 from ..services.ai_agent import FamilyAIAgent
-from ..models import User, Event, Alert, Chore, Roster, RosterAssignment, ChoreCompletion
+from ..services.schedule_analysis import (
+    request_analysis, stream_analysis, is_pending, is_stale, serialize as serialize_analysis,
+)
+from ..models import User, Event, Alert, Chore, Roster, RosterAssignment, ChoreCompletion, ScheduleAnalysis
 from .auth import get_me
 
 
@@ -113,9 +117,52 @@ def dismiss_alert(alert_id: int, db: Session = Depends(get_db)):
 
 @router.get("/ai-analysis/{user_id}")
 def get_ai_analysis(user_id: int, db: Session = Depends(get_db)):
-    agent = FamilyAIAgent(db)
-    analysis = agent.analyze_user_schedule(user_id)
-    return analysis
+    """Serve the precomputed analysis; a missing or stale one is queued for recompute.
+
+    A read never fails because the broker is down: the stored analysis (or
+    a placeholder) is served and the next read tries to queue again.
+    """
+    if not db.query(User.id).filter(User.id == user_id).first():
+        raise HTTPException(status_code=404, detail="User not found")
+    analysis = db.get(ScheduleAnalysis, user_id)
+    if analysis is None or (is_stale(analysis) and not is_pending(analysis)):
+        try:
+            # Publishing needs the event loop; request_analysis hands its database work back to threads
+            anyio.from_thread.run(request_analysis, db, user_id)
+        except Exception as e:
+            print(f"[Dashboard] Could not queue analysis for user {user_id}: {e!r}")
+        analysis = db.get(ScheduleAnalysis, user_id)
+    if analysis is None:
+        analysis = ScheduleAnalysis(user_id=user_id, event_count=0, chore_count=0, busy=False)
+    return serialize_analysis(analysis)
+
+@router.get("/ai-analysis/{user_id}/stream")
+def stream_ai_analysis(user_id: int, refresh: bool = False, db: Session = Depends(get_db),
+                       current_user: User = Depends(get_me)):
+    """Server-sent events relaying the analysis as it is generated; see stream_analysis.
+
+    Signed in only, like /recompute: a stream can start an LLM generation
+    and holds one of Ollama's few slots while it runs.
+    """
+    if not db.query(User.id).filter(User.id == user_id).first():
+        raise HTTPException(status_code=404, detail="User not found")
+    return StreamingResponse(
+        stream_analysis(user_id, refresh=refresh),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.post("/ai-analysis/{user_id}/recompute", status_code=202)
+async def recompute_ai_analysis(user_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_me)):
+    """Queue a fresh analysis; poll GET /ai-analysis/{user_id} until its status is "ready"."""
+    if not db.query(User.id).filter(User.id == user_id).first():
+        raise HTTPException(status_code=404, detail="User not found")
+    try:
+        job_id = await request_analysis(db, user_id)
+    except Exception as e:
+        print(f"[Dashboard] Could not queue analysis for user {user_id}: {e!r}")
+        raise HTTPException(status_code=503, detail="Could not queue the analysis, try again shortly")
+    return {"job_id": job_id, "status": "pending"}
 
 
 @router.get("/kiosk", response_class=HTMLResponse)
@@ -466,6 +513,7 @@ class ConnectionManager:
 import asyncio
 import aio_pika
 from ..config import settings
+from ..services.tracing import TRACEPARENT, span
 
 manager = ConnectionManager()
 
@@ -480,7 +528,10 @@ async def consume_broadcasts():
             async with message.process():
                 body = json.loads(message.body.decode())
                 if body.get("type") == "dashboard_refresh":
-                    await manager.broadcast({"type": "DASHBOARD_REFRESH", "user_id": body["data"]["user_id"]})
+                    # Continues the trace of the sync that asked for the refresh
+                    with span("broadcast dashboard_refresh", traceparent=(message.headers or {}).get(TRACEPARENT),
+                              clients=len(manager.active_connections)):
+                        await manager.broadcast({"type": "DASHBOARD_REFRESH", "user_id": body["data"]["user_id"]})
 
 # Start the consumer in the background
 @router.on_event("startup")
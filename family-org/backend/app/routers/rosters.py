@@ -7,16 +7,11 @@ from ..schemas import (
     RosterCreate, RosterOut, RosterChoreCreate, RosterAssign,
     RosterAssignmentOut, MyChoresResponse, MyRosterOut, MyChoreOut
 )
-from .auth import get_me
+from .auth import get_me, require_parent
 
 router = APIRouter(prefix="/rosters", tags=["rosters"])
 
 
-def _require_parent(user: User):
-    if user.role != "parent":
-        raise HTTPException(status_code=403, detail="Only parents can manage rosters")
-
-
 def _roster_to_out(roster: Roster, db: Session) -> dict:
     assignments = []
     for a in roster.assignments:
@@ -33,8 +28,7 @@ def _roster_to_out(roster: Roster, db: Session) -> dict:
 
 
 @router.post("/", response_model=RosterOut)
-def create_roster(body: RosterCreate, db: Session = Depends(get_db), current_user: User = Depends(get_me)):
-    _require_parent(current_user)
+def create_roster(body: RosterCreate, db: Session = Depends(get_db), current_user: User = Depends(require_parent)):
     roster = Roster(name=body.name, created_by=current_user.id)
     db.add(roster)
     db.commit()
@@ -43,15 +37,13 @@ def create_roster(body: RosterCreate, db: Session = Depends(get_db), current_use
 
 
 @router.get("/", response_model=List[RosterOut])
-def list_rosters(db: Session = Depends(get_db), current_user: User = Depends(get_me)):
-    _require_parent(current_user)
+def list_rosters(db: Session = Depends(get_db), current_user: User = Depends(require_parent)):
     rosters = db.query(Roster).all()
     return [_roster_to_out(r, db) for r in rosters]
 
 
 @router.put("/{roster_id}", response_model=RosterOut)
-def update_roster(roster_id: int, body: RosterCreate, db: Session = Depends(get_db), current_user: User = Depends(get_me)):
-    _require_parent(current_user)
+def update_roster(roster_id: int, body: RosterCreate, db: Session = Depends(get_db), current_user: User = Depends(require_parent)):
     roster = db.query(Roster).filter(Roster.id == roster_id).first()
     if not roster:
         raise HTTPException(status_code=404, detail="Roster not found")
@@ -62,8 +54,7 @@ def update_roster(roster_id: int, body: RosterCreate, db: Session = Depends(get_
 
 
 @router.delete("/{roster_id}")
-def delete_roster(roster_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_me)):
-    _require_parent(current_user)
+def delete_roster(roster_id: int, db: Session = Depends(get_db), current_user: User = Depends(require_parent)):
     roster = db.query(Roster).filter(Roster.id == roster_id).first()
     if not roster:
         raise HTTPException(status_code=404, detail="Roster not found")
@@ -75,8 +66,7 @@ def delete_roster(roster_id: int, db: Session = Depends(get_db), current_user: U
 # -- Roster Assignments --
 
 @router.post("/{roster_id}/assign", response_model=List[RosterAssignmentOut])
-def assign_roster(roster_id: int, body: RosterAssign, db: Session = Depends(get_db), current_user: User = Depends(get_me)):
-    _require_parent(current_user)
+def assign_roster(roster_id: int, body: RosterAssign, db: Session = Depends(get_db), current_user: User = Depends(require_parent)):
     roster = db.query(Roster).filter(Roster.id == roster_id).first()
     if not roster:
         raise HTTPException(status_code=404, detail="Roster not found")
@@ -99,8 +89,7 @@ def assign_roster(roster_id: int, body: RosterAssign, db: Session = Depends(get_
 
 
 @router.delete("/{roster_id}/assign/{user_id}")
-def unassign_roster(roster_id: int, user_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_me)):
-    _require_parent(current_user)
+def unassign_roster(roster_id: int, user_id: int, db: Session = Depends(get_db), current_user: User = Depends(require_parent)):
     a = db.query(RosterAssignment).filter(
         RosterAssignment.roster_id == roster_id,
         RosterAssignment.user_id == user_id
@@ -115,8 +104,7 @@ def unassign_roster(roster_id: int, user_id: int, db: Session = Depends(get_db),
 # -- Roster Chores --
 
 @router.post("/{roster_id}/chores")
-def add_roster_chore(roster_id: int, body: RosterChoreCreate, db: Session = Depends(get_db), current_user: User = Depends(get_me)):
-    _require_parent(current_user)
+def add_roster_chore(roster_id: int, body: RosterChoreCreate, db: Session = Depends(get_db), current_user: User = Depends(require_parent)):
     roster = db.query(Roster).filter(Roster.id == roster_id).first()
     if not roster:
         raise HTTPException(status_code=404, detail="Roster not found")
@@ -138,8 +126,7 @@ def add_roster_chore(roster_id: int, body: RosterChoreCreate, db: Session = Depe
 # -- Drag-and-drop chore management --
 
 @router.post("/{roster_id}/chores/from/{chore_id}")
-def move_chore_to_roster(roster_id: int, chore_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_me)):
-    _require_parent(current_user)
+def move_chore_to_roster(roster_id: int, chore_id: int, db: Session = Depends(get_db), current_user: User = Depends(require_parent)):
     roster = db.query(Roster).filter(Roster.id == roster_id).first()
     if not roster:
         raise HTTPException(status_code=404, detail="Roster not found")
@@ -167,8 +154,7 @@ def move_chore_to_roster(roster_id: int, chore_id: int, db: Session = Depends(ge
 
 
 @router.delete("/{roster_id}/chores/{chore_id}")
-def remove_chore_from_roster(roster_id: int, chore_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_me)):
-    _require_parent(current_user)
+def remove_chore_from_roster(roster_id: int, chore_id: int, db: Session = Depends(get_db), current_user: User = Depends(require_parent)):
     chore = db.query(Chore).filter(Chore.id == chore_id, Chore.roster_id == roster_id).first()
     if not chore:
         raise HTTPException(status_code=404, detail="Chore not found in this roster")
@@ -180,8 +166,7 @@ def remove_chore_from_roster(roster_id: int, chore_id: int, db: Session = Depend
 # -- Family members (for assignment picker) --
 
 @router.get("/family-members")
-def list_family_members(db: Session = Depends(get_db), current_user: User = Depends(get_me)):
-    _require_parent(current_user)
+def list_family_members(db: Session = Depends(get_db), current_user: User = Depends(require_parent)):
     members = db.query(User).filter(User.role != "parent").all()
     return [{"id": m.id, "name": m.name, "email": m.email, "color": (m.preferences or {}).get("color")} for m in members]
 
@@ -189,8 +174,7 @@ def list_family_members(db: Session = Depends(get_db), current_user: User = Depe
 # -- Parent View: Family Overview --
 
 @router.get("/family-overview")
-def get_family_overview(db: Session = Depends(get_db), current_user: User = Depends(get_me)):
-    _require_parent(current_user)
+def get_family_overview(db: Session = Depends(get_db), current_user: User = Depends(require_parent)):
     from datetime import datetime
 
     today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
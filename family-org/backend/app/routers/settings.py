@@ -1,14 +1,17 @@
+import re
 from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.orm import Session
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
+from google.auth.exceptions import RefreshError
 from ..database import get_db
-from ..models import User
-from ..schemas import PreferencesUpdate, Go4SchoolsConnect
+from ..models import User, PrepRule
+from ..schemas import PreferencesUpdate, Go4SchoolsConnect, PrepRuleCreate, PrepRule as PrepRuleSchema
 from ..services.encryption import encrypt
-from ..services.rabbitmq import send_sync_message
-from ..config import settings
-from .auth import get_me
+from ..services.sync_requests import try_request_sync
+from ..services.google_api import build_service
+from ..services.google_tokens import token_manager
+from ..services.prep_rules import compile_pattern
+from ..services.go4schools import clear_session
+from .auth import get_me, require_parent
 
 router = APIRouter(prefix="/settings", tags=["settings"])
 
@@ -27,20 +30,17 @@ def update_preferences(prefs: PreferencesUpdate, db: Session = Depends(get_db),
     return current_user.preferences
 
 @router.get("/calendars")
-async def list_google_calendars(current_user: User = Depends(get_me)):
+async def list_google_calendars(db: Session = Depends(get_db), current_user: User = Depends(get_me)):
     if not current_user.google_access_token:
         raise HTTPException(status_code=401, detail="Google account not linked")
 
-    creds = Credentials(
-        token=current_user.google_access_token,
-        refresh_token=current_user.google_refresh_token,
-        token_uri="https://oauth2.googleapis.com/token",
-        client_id=settings.GOOGLE_CLIENT_ID,
-        client_secret=settings.GOOGLE_CLIENT_SECRET
-    )
+    try:
+        creds = await token_manager.get_credentials(db, current_user)
+    except RefreshError:
+        raise HTTPException(status_code=401, detail="Google authorisation expired, please sign in again")
 
     try:
-        service = build('calendar', 'v3', credentials=creds)
+        service = build_service('calendar', 'v3', creds)
         calendar_list = service.calendarList().list().execute()
         return calendar_list.get('items', [])
     except Exception as e:
@@ -51,12 +51,12 @@ async def update_synced_calendars(calendar_ids: list[str], db: Session = Depends
     # In this dev version, we check if the user is a parent (or just allow for now)
     # current_user.role = "parent" # Manual override for testing if needed
     
-    current_user.synced_calendars = calendar_ids
+    current_user.synced_calendars = list(dict.fromkeys(calendar_ids))
     db.add(current_user)
     db.commit()
     
     # Trigger an immediate sync for the new calendars
-    await send_sync_message("calendar_sync", {"user_id": current_user.id})
+    await try_request_sync(db, "calendar_sync", current_user.id)
     
     return {"status": "success", "synced_calendars": current_user.synced_calendars}
 
@@ -73,6 +73,7 @@ async def become_parent(db: Session = Depends(get_db), current_user: User = Depe
 async def connect_go4schools(creds: Go4SchoolsConnect, db: Session = Depends(get_db), current_user: User = Depends(get_me)):
     current_user.go4schools_email = creds.email
     current_user.go4schools_password = encrypt(creds.password)
+    clear_session(current_user)
     # Clear any previous error
     prefs = dict(current_user.preferences or {})
     prefs.pop("go4schools_error", None)
@@ -81,7 +82,7 @@ async def connect_go4schools(creds: Go4SchoolsConnect, db: Session = Depends(get
     db.add(current_user)
     db.commit()
     # Trigger immediate sync
-    await send_sync_message("go4schools_sync", {"user_id": current_user.id})
+    await try_request_sync(db, "go4schools_sync", current_user.id)
     return {"status": "connected"}
 
 
@@ -89,6 +90,7 @@ async def connect_go4schools(creds: Go4SchoolsConnect, db: Session = Depends(get
 def disconnect_go4schools(db: Session = Depends(get_db), current_user: User = Depends(get_me)):
     current_user.go4schools_email = None
     current_user.go4schools_password = None
+    clear_session(current_user)
     prefs = dict(current_user.preferences or {})
     prefs.pop("go4schools_error", None)
     prefs.pop("go4schools_last_sync", None)
@@ -99,10 +101,10 @@ def disconnect_go4schools(db: Session = Depends(get_db), current_user: User = De
 
 
 @router.post("/go4schools/sync")
-async def sync_go4schools(current_user: User = Depends(get_me)):
+async def sync_go4schools(db: Session = Depends(get_db), current_user: User = Depends(get_me)):
     if not current_user.go4schools_email:
         raise HTTPException(status_code=400, detail="Go4Schools not connected")
-    await send_sync_message("go4schools_sync", {"user_id": current_user.id})
+    await try_request_sync(db, "go4schools_sync", current_user.id)
     return {"status": "sync_triggered"}
 
 
@@ -115,3 +117,33 @@ def go4schools_status(current_user: User = Depends(get_me)):
         "last_sync": prefs.get("go4schools_last_sync"),
         "error": prefs.get("go4schools_error"),
     }
+
+
+@router.get("/prep-rules", response_model=list[PrepRuleSchema])
+def list_prep_rules(db: Session = Depends(get_db), current_user: User = Depends(get_me)):
+    return db.query(PrepRule).order_by(PrepRule.priority.desc(), PrepRule.id).all()
+
+
+@router.post("/prep-rules", response_model=PrepRuleSchema)
+def create_prep_rule(rule: PrepRuleCreate, db: Session = Depends(get_db), current_user: User = Depends(require_parent)):
+    """Add a rule that answers an event's preparation tasks without asking the LLM; [] means none needed."""
+    try:
+        compile_pattern(rule.pattern, rule.is_regex)
+    except re.error as e:
+        raise HTTPException(status_code=400, detail=f"Invalid pattern: {e}")
+    db_rule = PrepRule(**rule.model_dump())
+    db_rule.tasks = [t.strip()[:200] for t in rule.tasks if t.strip()]
+    db.add(db_rule)
+    db.commit()
+    db.refresh(db_rule)
+    return db_rule
+
+
+@router.delete("/prep-rules/{rule_id}")
+def delete_prep_rule(rule_id: int, db: Session = Depends(get_db), current_user: User = Depends(require_parent)):
+    rule = db.query(PrepRule).filter(PrepRule.id == rule_id).first()
+    if not rule:
+        raise HTTPException(status_code=404, detail="Rule not found")
+    db.delete(rule)
+    db.commit()
+    return {"status": "deleted"}
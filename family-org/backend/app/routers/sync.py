@@ -0,0 +1,25 @@
+from fastapi import APIRouter, Depends, HTTPException
+from ..models import User
+from ..services.rabbitmq import SYNC_LANES, peek_dead_letters, replay_dead_letters
+from .auth import require_parent
+
+router = APIRouter(prefix="/sync", tags=["sync"])
+
+
+def _lane_queue(lane: str) -> str:
+    if lane not in SYNC_LANES:
+        raise HTTPException(status_code=400, detail=f"Unknown sync lane; expected one of {sorted(SYNC_LANES)}")
+    return SYNC_LANES[lane]
+
+
+@router.get("/dead-letters")
+async def list_dead_letters(lane: str = "interactive", limit: int = 50, current_user: User = Depends(require_parent)):
+    """Show sync messages from `lane` that failed every retry, without removing them."""
+    return await peek_dead_letters(_lane_queue(lane), limit=min(limit, 500))
+
+
+@router.post("/dead-letters/replay")
+async def replay_failed_syncs(lane: str = "interactive", limit: int = 50, current_user: User = Depends(require_parent)):
+    """Requeue dead-lettered sync messages from `lane` with a fresh attempt count."""
+    replayed = await replay_dead_letters(_lane_queue(lane), limit=min(limit, 500))
+    return {"status": "replayed", "count": replayed, "lane": lane}
@@ -34,6 +34,22 @@ class Go4SchoolsConnect(BaseModel):
     email: str
     password: str
 
+class PrepRuleBase(BaseModel):
+    pattern: str
+    is_regex: bool = False
+    tasks: list[str] = []
+    priority: int = 0
+
+class PrepRuleCreate(PrepRuleBase):
+    pass
+
+class PrepRule(PrepRuleBase):
+    id: int
+
+    model_config = {
+        "from_attributes": True
+    }
+
 class ChoreBase(BaseModel):
     title: str
     description: Optional[str] = None
@@ -1,38 +1,95 @@
+import asyncio
+import hashlib
 import os
-import requests
 import json
+from collections import defaultdict
+from typing import AsyncIterator, Optional
 from ..database import SessionLocal
-from ..models import User, Event, Chore, Alert
+from ..models import User, Event, Chore, Alert, ScheduleAnalysis
 from sqlalchemy.orm import Session
 from datetime import datetime, timezone, timedelta
 from ..config import settings
+from .ollama import ollama
+from .llm_cache import llm_cache
+from .prep_rules import prep_rules
+
+# Events asked about per LLM call when suggesting preparation tasks
+EVENT_BATCH_SIZE = 10
+
+
+def _event_prompt(event_summary: str) -> str:
+    return f"""You are a family organization assistant. Given this calendar event, suggest 0-3 short preparation tasks that someone might need to do beforehand.
+
+Event: "{event_summary}"
+
+Rules:
+- Only suggest tasks if preparation is actually needed
+- Each task should be a short action (3-8 words)
+- Reply with ONLY a JSON array of strings, nothing else
+- If no preparation needed, reply with []
+
+Examples:
+- "Sarah's Birthday Party" → ["Buy birthday card for Sarah", "Buy present for Sarah"]
+- "Team standup" → []
+- "Dentist appointment" → ["Prepare list of dental concerns"]"""
+
+
+def _parse_json(response: str, opening: str, closing: str):
+    """Parse the outermost JSON array or object in an LLM reply, or return None.
+
+    Tolerates markdown code fences and reasoning text around the JSON.
+    """
+    start = response.find(opening)
+    end = response.rfind(closing)
+    if start == -1 or end < start:
+        return None
+    try:
+        return json.loads(response[start:end + 1])
+    except ValueError:
+        return None
+
+
+def _clean_tasks(tasks: list) -> list[str]:
+    return [str(t).strip()[:200] for t in tasks if t and str(t).strip()][:3]
+
+
+def _parse_task_list(response: str):
+    """The task titles in a per-event reply, or None if it isn't a JSON array."""
+    tasks = _parse_json(response, "[", "]")
+    return _clean_tasks(tasks) if isinstance(tasks, list) else None
+
+
+def _task_window() -> tuple[datetime, datetime]:
+    """Events this far ahead get preparation tasks suggested."""
+    now = datetime.now()
+    return now + timedelta(days=7), now + timedelta(days=14)
+
 
 class FamilyAIAgent:
     def __init__(self, db: Session):
         self.db = db
-        self.ollama_url = f"{settings.OLLAMA_HOST}/api/generate"
-
-    def _call_llm(self, prompt: str):
-        try:
-            response = requests.post(
-                self.ollama_url,
-                json={
-                    "model": settings.OLLAMA_MODEL,
-                    "prompt": prompt,
-                    "stream": False
-                },
-                timeout=30
-            )
-            if response.status_code == 200:
-                return response.json().get("response", "").strip()
-        except Exception as e:
-            print(f"Ollama error: {e}")
-        return None
 
-    def analyze_user_schedule(self, user_id: int):
+    async def _call_llm(self, prompt: str):
+        """Ask the model, reusing a cached reply when the same prompt was answered recently."""
+        model = settings.OLLAMA_MODEL
+        cached = await llm_cache.aget(model, prompt)
+        if cached is not None:
+            return cached
+        response = await ollama.generate(prompt, model=model)
+        if response:
+            await llm_cache.aput(model, prompt, response)
+        return response
+
+    def _prepare_schedule_analysis(self, user_id: int):
+        """Load a user's remaining day into their ScheduleAnalysis row.
+
+        Returns (analysis, prompt, fallback), or None for an unknown user.
+        `prompt` is set only when a busy day still needs an alert message
+        from the LLM; `fallback` is the heuristic message to use without one.
+        """
         user = self.db.query(User).filter(User.id == user_id).first()
         if not user:
-            return
+            return None
 
         now = datetime.now()
         today_end = now.replace(hour=23, minute=59, second=59)
@@ -47,43 +104,180 @@ class FamilyAIAgent:
             Chore.assignee_id == user_id,
             Chore.is_completed == False
         ).all()
-        
-        count = len(events) + len(chores)
-        
-        # Only invoke LLM if count is high OR we want smart insights
-        if count > user.threshold_preference:
-            # Prepare context for LLM
-            event_list = ", ".join([e.summary for e in events])
-            chore_list = ", ".join([c.title for c in chores])
-            
-            prompt = f"""
-            You are a helpful family organization assistant. 
-            User {user.name} has a busy day with {len(events)} events and {len(chores)} tasks.
-            Events: {event_list}
-            Tasks: {chore_list}
-            
-            Based on this, provide a VERY SHORT (max 20 words) proactive warning or suggestion. 
-            Keep it encouraging but realistic. Don't use markdown.
-            """
-            
-            ai_message = self._call_llm(prompt)
-            
-            if not ai_message:
-                # Fallback to heuristic
-                ai_message = f"Busy day! {len(events)} events and {len(chores)} tasks remaining."
-
-            # Avoid duplicate alerts for the same day
+
+        analysis = self.db.get(ScheduleAnalysis, user_id)
+        if analysis is None:
+            analysis = ScheduleAnalysis(user_id=user_id)
+            self.db.add(analysis)
+
+        # Avoid duplicate alerts for the same day; no need to ask the LLM again either
+        existing = None
+        if len(events) + len(chores) > user.threshold_preference:
             existing = self.db.query(Alert).filter(
                 Alert.user_id == user_id,
                 Alert.created_at >= now.replace(hour=0, minute=0, second=0)
             ).first()
-            
-            if not existing:
-                alert = Alert(user_id=user_id, message=ai_message, type="warning")
-                self.db.add(alert)
-                self.db.commit()
-                return alert
-        return None
+
+        prompt, fallback = self._assess_schedule(user, analysis, events, chores, existing)
+        return analysis, prompt, fallback
+
+    def _assess_schedule(self, user: User, analysis: ScheduleAnalysis, events: list, chores: list,
+                         existing: Optional[Alert]):
+        """Fill in `analysis` from a user's remaining events and open chores.
+
+        `existing` is the alert already raised for them today, if any.
+        Returns (prompt, fallback) as described in `_prepare_schedule_analysis`.
+        """
+        count = len(events) + len(chores)
+        analysis.event_count = len(events)
+        analysis.chore_count = len(chores)
+        analysis.busy = count > user.threshold_preference
+        analysis.message = None
+        analysis.alert_id = None
+        fallback = f"Busy day! {len(events)} events and {len(chores)} tasks remaining."
+
+        # Only invoke LLM if count is high OR we want smart insights
+        if not analysis.busy:
+            return None, fallback
+
+        if existing:
+            analysis.message = existing.message
+            analysis.alert_id = existing.id
+            return None, fallback
+
+        # Prepare context for LLM
+        event_list = ", ".join([e.summary for e in events])
+        chore_list = ", ".join([c.title for c in chores])
+
+        prompt = f"""
+        You are a helpful family organization assistant. 
+        User {user.name} has a busy day with {len(events)} events and {len(chores)} tasks.
+        Events: {event_list}
+        Tasks: {chore_list}
+
+        Based on this, provide a VERY SHORT (max 20 words) proactive warning or suggestion. 
+        Keep it encouraging but realistic. Don't use markdown.
+        """
+        return prompt, fallback
+
+    def _add_alert(self, analysis: ScheduleAnalysis, message: str) -> Alert:
+        alert = Alert(user_id=analysis.user_id, message=message, type="warning")
+        self.db.add(alert)
+        self.db.flush()
+        analysis.message = message
+        analysis.alert_id = alert.id
+        return alert
+
+    def _finish_schedule_analysis(self, analysis: ScheduleAnalysis, message: Optional[str]):
+        """Raise an alert with `message` if there is one, and save the analysis."""
+        alert = self._add_alert(analysis, message) if message else None
+        analysis.computed_at = datetime.now(timezone.utc).replace(tzinfo=None)
+        self.db.commit()
+        return alert
+
+    async def analyze_user_schedule(self, user_id: int):
+        """Analyse the rest of today for a user and store it as their ScheduleAnalysis.
+
+        On a busy day an alert is raised, once per day. Returns the new Alert,
+        or None if the day isn't busy or was already flagged.
+        """
+        prepared = self._prepare_schedule_analysis(user_id)
+        if prepared is None:
+            return None
+        analysis, prompt, fallback = prepared
+        message = None
+        if prompt:
+            # Fallback to heuristic
+            message = await self._call_llm(prompt) or fallback
+        return self._finish_schedule_analysis(analysis, message)
+
+    async def stream_schedule_analysis(self, user_id: int) -> AsyncIterator[str]:
+        """Like `analyze_user_schedule`, but yields the alert text as the LLM writes it.
+
+        Yields nothing when no new alert is needed. A cached reply or the
+        heuristic fallback is yielded in one piece. If the reply breaks off,
+        the fallback follows the partial tokens and is what gets stored.
+        """
+        prepared = await asyncio.to_thread(self._prepare_schedule_analysis, user_id)
+        if prepared is None:
+            return
+        analysis, prompt, fallback = prepared
+        message = None
+        if prompt:
+            model = settings.OLLAMA_MODEL
+            message = await llm_cache.aget(model, prompt)
+            if message is not None:
+                yield message
+            else:
+                parts = []
+                try:
+                    async for token in ollama.stream(prompt, model=model):
+                        parts.append(token)
+                        yield token
+                    message = "".join(parts).strip()
+                except Exception:
+                    # Only a completed reply is cached or stored
+                    message = None
+                if message:
+                    await llm_cache.aput(model, prompt, message)
+                else:
+                    message = fallback
+                    yield fallback
+        await asyncio.to_thread(self._finish_schedule_analysis, analysis, message)
+
+    async def analyze_family_schedules(self) -> list[Alert]:
+        """`analyze_user_schedule` for every user at once.
+
+        Users, today's events, open chores, today's alerts and the stored
+        analyses are each loaded in one query, so the database work doesn't
+        grow with the number of users. The LLM is only asked about users
+        with a busy day and no alert yet; everyone else is updated from
+        counts alone. Any recompute requested before the pass started is
+        marked complete. Returns the new alerts.
+        """
+        now = datetime.now()
+        today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        today_end = now.replace(hour=23, minute=59, second=59)
+
+        users = self.db.query(User).all()
+        events_by_user = defaultdict(list)
+        for event in self.db.query(Event).filter(
+            Event.start_time >= now.isoformat(),
+            Event.start_time <= today_end.isoformat()
+        ):
+            events_by_user[event.user_id].append(event)
+        chores_by_user = defaultdict(list)
+        for chore in self.db.query(Chore).filter(Chore.is_completed == False):
+            chores_by_user[chore.assignee_id].append(chore)
+        alerts_today = {}
+        for alert in self.db.query(Alert).filter(Alert.created_at >= today_start).order_by(Alert.id):
+            alerts_today.setdefault(alert.user_id, alert)
+        analyses = {a.user_id: a for a in self.db.query(ScheduleAnalysis)}
+
+        needs_llm = []
+        for user in users:
+            analysis = analyses.get(user.id)
+            if analysis is None:
+                analysis = ScheduleAnalysis(user_id=user.id)
+                self.db.add(analysis)
+                analyses[user.id] = analysis
+            elif analysis.requested_job_id:
+                analysis.completed_job_id = analysis.requested_job_id
+            prompt, fallback = self._assess_schedule(
+                user, analysis, events_by_user[user.id], chores_by_user[user.id], alerts_today.get(user.id))
+            if prompt:
+                needs_llm.append((analysis, prompt, fallback))
+
+        replies = await asyncio.gather(*(self._call_llm(prompt) for _, prompt, _ in needs_llm))
+        created = [self._add_alert(analysis, reply or fallback)
+                   for (analysis, _, fallback), reply in zip(needs_llm, replies)]
+
+        computed_at = datetime.now(timezone.utc).replace(tzinfo=None)
+        for analysis in analyses.values():
+            analysis.computed_at = computed_at
+        self.db.commit()
+        print(f"[AI] Analysed {len(users)} users, {len(needs_llm)} needed the LLM")
+        return created
 
     def learn_from_feedback(self, alert_id: int, feedback: int):
         alert = self.db.query(Alert).filter(Alert.id == alert_id).first()
@@ -103,27 +297,32 @@ class FamilyAIAgent:
 
         self.db.commit()
 
-    def generate_event_tasks(self, user_id: int):
-        """Scan upcoming events and create personal preparation tasks."""
-        import hashlib
-
-        user = self.db.query(User).filter(User.id == user_id).first()
-        if not user:
-            return []
-
-        now = datetime.now()
-        window_start = now + timedelta(days=7)
-        window_end = now + timedelta(days=14)
+    async def generate_family_event_tasks(self):
+        """Scan every user's upcoming events and create personal preparation tasks in one pass.
 
+        Events are stored once per Google event id, so each event is assigned
+        to a single user. Events that share a summary, e.g. recurring ones or
+        the same activity on two children's calendars, are asked about once.
+        """
+        window_start, window_end = _task_window()
         events = self.db.query(Event).filter(
-            Event.user_id == user_id,
+            Event.user_id.isnot(None),
             Event.start_time >= window_start.isoformat(),
             Event.start_time <= window_end.isoformat()
         ).all()
+        return await self._create_event_tasks(events)
+
+    async def _create_event_tasks(self, events: list[Event]) -> list[Chore]:
+        if not events:
+            return []
+        suggestions = await self._suggest_tasks_for_events([e.summary for e in events])
+
+        # Dedup keys of every AI task already created, loaded once rather than per task
+        existing = {source_id for (source_id,) in
+                    self.db.query(Chore.source_id).filter(Chore.source == "ai", Chore.source_id.isnot(None))}
 
         created = []
-        for event in events:
-            tasks = self._suggest_tasks_for_event(event.summary)
+        for event, tasks in zip(events, suggestions):
             if not tasks:
                 continue
 
@@ -140,9 +339,9 @@ class FamilyAIAgent:
                 raw = f"{event.google_event_id}|{task_title}"
                 source_id = hashlib.sha256(raw.encode()).hexdigest()[:16]
 
-                existing = self.db.query(Chore).filter(Chore.source_id == source_id).first()
-                if existing:
+                if source_id in existing:
                     continue
+                existing.add(source_id)
 
                 chore = Chore(
                     title=task_title[:200],
@@ -153,7 +352,7 @@ class FamilyAIAgent:
                     is_bonus=False,
                     points=3,
                     personal=True,
-                    assignee_id=user_id,
+                    assignee_id=event.user_id,
                 )
                 self.db.add(chore)
                 created.append(chore)
@@ -162,56 +361,90 @@ class FamilyAIAgent:
             self.db.commit()
         return created
 
-    def _suggest_tasks_for_event(self, event_summary: str) -> list[str]:
-        """Ask LLM to suggest preparation tasks, with keyword fallback."""
-        prompt = f"""You are a family organization assistant. Given this calendar event, suggest 0-3 short preparation tasks that someone might need to do beforehand.
+    async def _suggest_tasks_for_events(self, summaries: list[str]) -> list[list[str]]:
+        """Suggest preparation tasks for many events with as few LLM calls as possible.
 
-Event: "{event_summary}"
+        The household's preparation rules answer what they can without the
+        model. Summaries already answered (individually or in an earlier
+        batch) come from the cache; the rest are asked EVENT_BATCH_SIZE at a
+        time in one prompt. Any event a batch reply doesn't cleanly answer
+        falls back to its own per-event prompt.
+        """
+        model = settings.OLLAMA_MODEL
+        answers = {}
+        pending = []
+        prep_rules.refresh(self.db)
+        unanswered = []
+        for summary in dict.fromkeys(summaries):  # unique, in order
+            tasks = prep_rules.decide(summary)
+            if tasks is None:
+                unanswered.append(summary)
+            else:
+                answers[summary] = tasks
+        cached_replies = await asyncio.gather(
+            *(llm_cache.aget(model, _event_prompt(summary)) for summary in unanswered))
+        for summary, cached in zip(unanswered, cached_replies):
+            tasks = _parse_task_list(cached) if cached is not None else None
+            if tasks is None:
+                pending.append(summary)
+            else:
+                answers[summary] = tasks
+
+        batches = [pending[i:i + EVENT_BATCH_SIZE] for i in range(0, len(pending), EVENT_BATCH_SIZE)]
+        for batch_answers in await asyncio.gather(*(self._suggest_batch(batch) for batch in batches)):
+            answers.update(batch_answers)
+
+        missing = [summary for summary in pending if summary not in answers]
+        if missing:
+            singles = await asyncio.gather(*(self._suggest_tasks_for_event(summary) for summary in missing))
+            answers.update(zip(missing, singles))
+        return [answers[summary] for summary in summaries]
+
+    async def _suggest_batch(self, summaries: list[str]) -> dict:
+        """Ask about several events in one prompt. Returns summary -> tasks for the events it answered."""
+        if len(summaries) == 1:
+            return {}  # a batch of one is just the per-event prompt, which is cached
+        event_lines = "\n".join(f'{i}. "{summary}"' for i, summary in enumerate(summaries, 1))
+        prompt = f"""You are a family organization assistant. For each numbered calendar event below, suggest 0-3 short preparation tasks that someone might need to do beforehand.
+
+Events:
+{event_lines}
 
 Rules:
 - Only suggest tasks if preparation is actually needed
 - Each task should be a short action (3-8 words)
-- Reply with ONLY a JSON array of strings, nothing else
-- If no preparation needed, reply with []
+- Reply with ONLY a JSON object mapping every event number to a JSON array of strings, nothing else
+- Use [] for events that need no preparation
 
-Examples:
-- "Sarah's Birthday Party" → ["Buy birthday card for Sarah", "Buy present for Sarah"]
-- "Team standup" → []
-- "Dentist appointment" → ["Prepare list of dental concerns"]"""
+Example reply for three events:
+{{"1": ["Buy birthday card for Sarah", "Buy present for Sarah"], "2": [], "3": ["Prepare list of dental concerns"]}}"""
 
-        response = self._call_llm(prompt)
+        response = await ollama.generate(prompt)
+        keyed = _parse_json(response, "{", "}") if response else None
+        if not isinstance(keyed, dict):
+            print(f"[AI] Unusable batch reply for {len(summaries)} events, asking individually")
+            return {}
 
-        if response:
-            try:
-                # Try to parse JSON from the response
-                # Handle cases where LLM wraps in markdown code blocks
-                cleaned = response.strip()
-                if cleaned.startswith("```"):
-                    cleaned = cleaned.split("\n", 1)[-1].rsplit("```", 1)[0].strip()
-                tasks = json.loads(cleaned)
-                if isinstance(tasks, list):
-                    return [str(t).strip() for t in tasks if t and str(t).strip()][:3]
-            except (json.JSONDecodeError, ValueError):
-                pass
-
-        # Fallback: keyword matching
-        return self._keyword_fallback(event_summary)
-
-    def _keyword_fallback(self, summary: str) -> list[str]:
-        """Simple keyword-based task suggestions when LLM is unavailable."""
-        lower = summary.lower()
-
-        if "birthday" in lower:
-            # Try to extract the name
-            name = summary.split("'s")[0].strip() if "'s" in summary else ""
-            if name:
-                return [f"Buy birthday card for {name}", f"Buy present for {name}"]
-            return ["Buy birthday card", "Buy present"]
-
-        if any(word in lower for word in ["dentist", "doctor", "gp", "hospital"]):
-            return ["Prepare any paperwork or questions"]
-
-        if any(word in lower for word in ["interview", "presentation"]):
-            return ["Prepare notes and materials"]
+        model = settings.OLLAMA_MODEL
+        answered = {}
+        for i, summary in enumerate(summaries, 1):
+            tasks = keyed.get(str(i))
+            if isinstance(tasks, list):
+                answered[summary] = _clean_tasks(tasks)
+        # Cache under the per-event prompt so later passes skip the model for these events
+        await asyncio.gather(*(llm_cache.aput(model, _event_prompt(summary), json.dumps(tasks))
+                               for summary, tasks in answered.items()))
+        return answered
 
+    async def _suggest_tasks_for_event(self, event_summary: str) -> list[str]:
+        """Ask LLM to suggest preparation tasks; none if it can't answer.
+
+        Events the preparation rules already answer never get here.
+        """
+        response = await self._call_llm(_event_prompt(event_summary))
+
+        if response:
+            tasks = _parse_task_list(response)
+            if tasks is not None:
+                return tasks
         return []
@@ -0,0 +1,123 @@
+import asyncio
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Awaitable, Callable, Optional
+from ..config import settings
+from .metrics import BROWSER_LAUNCHES, BROWSER_CONTEXTS_ACTIVE
+
+
+@dataclass
+class _PooledBrowser:
+    browser: object  # playwright Browser
+    uses: int = 0  # contexts handed out so far
+    active: int = 0  # contexts still open
+
+
+class BrowserPool:
+    """One long-lived headless Chromium for the worker, handing out a fresh context per scrape.
+
+    A context is isolated like a new browser profile (own cookies and
+    storage) but costs milliseconds instead of a process launch. At most
+    `concurrency` contexts are open at once. Before each context the
+    browser is checked to still be connected, and after `max_uses` contexts
+    it is retired to cap memory growth: new scrapes go to a fresh browser
+    while the old one closes once its last context does.
+    """
+
+    def __init__(self, concurrency: Optional[int] = None, max_uses: Optional[int] = None,
+                 launcher: Optional[Callable[[], Awaitable[object]]] = None):
+        self._concurrency = concurrency or settings.BROWSER_CONCURRENCY
+        self._max_uses = max_uses or settings.BROWSER_MAX_USES
+        self._launcher = launcher or self._launch_chromium
+        self._playwright = None
+        self._current: Optional[_PooledBrowser] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._loop = None
+
+    async def _launch_chromium(self):
+        if self._playwright is None:
+            from playwright.async_api import async_playwright
+            self._playwright = await async_playwright().start()
+        return await self._playwright.chromium.launch(headless=True)
+
+    def _ensure_loop_state(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self._concurrency)
+            self._lock = asyncio.Lock()
+            self._current = None
+            self._loop = loop
+
+    async def _retire(self, pooled: _PooledBrowser):
+        if self._current is pooled:
+            self._current = None
+        if pooled.active == 0:
+            try:
+                await pooled.browser.close()
+            except Exception as e:
+                print(f"[Browser] Error closing retired browser: {e!r}")
+
+    async def _acquire(self, failed: Optional[_PooledBrowser] = None) -> _PooledBrowser:
+        """Take a slot on a healthy browser, launching one if needed. `failed` is replaced regardless."""
+        async with self._lock:
+            current = self._current
+            reason = "start"
+            if current is not None and (current is failed or not current.browser.is_connected()):
+                print("[Browser] Chromium is not responding, relaunching")
+                await self._retire(current)
+                current, reason = None, "crash"
+            elif current is not None and current.uses >= self._max_uses:
+                await self._retire(current)
+                current, reason = None, "recycle"
+            if current is None:
+                current = _PooledBrowser(await self._launcher())
+                self._current = current
+                BROWSER_LAUNCHES.labels(reason).inc()
+            current.uses += 1
+            current.active += 1
+            return current
+
+    async def _release(self, pooled: _PooledBrowser):
+        pooled.active -= 1
+        if pooled is not self._current and pooled.active == 0:
+            await self._retire(pooled)
+
+    @asynccontextmanager
+    async def context(self, **options) -> AsyncIterator[object]:
+        """A new browser context, closed on exit. `options` go to Browser.new_context."""
+        self._ensure_loop_state()
+        async with self._semaphore:
+            pooled = await self._acquire()
+            try:
+                context = await pooled.browser.new_context(**options)
+            except Exception:
+                # The browser died between the health check and now; retry once on a fresh one
+                await self._release(pooled)
+                pooled = await self._acquire(failed=pooled)
+                try:
+                    context = await pooled.browser.new_context(**options)
+                except Exception:
+                    await self._release(pooled)
+                    raise
+            BROWSER_CONTEXTS_ACTIVE.inc()
+            try:
+                yield context
+            finally:
+                BROWSER_CONTEXTS_ACTIVE.dec()
+                try:
+                    await context.close()
+                except Exception as e:
+                    print(f"[Browser] Error closing context: {e!r}")
+                await self._release(pooled)
+
+    async def close(self):
+        if self._current is not None:
+            current, self._current = self._current, None
+            await current.browser.close()
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+
+
+browser_pool = BrowserPool()
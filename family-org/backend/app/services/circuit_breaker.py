@@ -0,0 +1,79 @@
+import time
+from typing import Awaitable, Callable
+from .metrics import CIRCUIT_STATE, CIRCUIT_SHORT_CIRCUITS
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitBreaker:
+    """Fails fast while a backend is down instead of letting every caller wait for a timeout.
+
+    After `failure_threshold` consecutive failures the circuit opens and
+    `allow()` returns False. Once `recovery_time` seconds have passed, the
+    next caller runs the health `probe` (half-open) while everyone else keeps
+    failing fast; a healthy probe closes the circuit, an unhealthy one keeps
+    it open for another `recovery_time`.
+    """
+
+    def __init__(self, name: str, probe: Callable[[], Awaitable[bool]],
+                 failure_threshold: int, recovery_time: float):
+        self.name = name
+        self._probe = probe
+        self._failure_threshold = failure_threshold
+        self._recovery_time = recovery_time
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._set_state(CLOSED)
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    def _set_state(self, state: str):
+        if getattr(self, "_state", None) not in (None, state):
+            print(f"[Circuit] {self.name} circuit is now {state}")
+        self._state = state
+        CIRCUIT_STATE.labels(self.name).set(_STATE_VALUES[state])
+
+    def _open(self):
+        self._opened_at = time.monotonic()
+        self._set_state(OPEN)
+
+    def _short_circuit(self) -> bool:
+        CIRCUIT_SHORT_CIRCUITS.labels(self.name).inc()
+        return False
+
+    async def allow(self) -> bool:
+        """Whether a call may go ahead now."""
+        if self._state == CLOSED:
+            return True
+        if self._probing or time.monotonic() - self._opened_at < self._recovery_time:
+            return self._short_circuit()
+
+        self._probing = True
+        self._set_state(HALF_OPEN)
+        try:
+            healthy = await self._probe()
+        except Exception:
+            healthy = False
+        finally:
+            self._probing = False
+        if healthy:
+            self.record_success()
+            return True
+        self._open()
+        return self._short_circuit()
+
+    def record_success(self):
+        self._failures = 0
+        if self._state != CLOSED:
+            self._set_state(CLOSED)
+
+    def record_failure(self):
+        self._failures += 1
+        if self._state == CLOSED and self._failures >= self._failure_threshold:
+            self._open()
@@ -1,9 +1,18 @@
 import hashlib
-from datetime import datetime
-from playwright.async_api import async_playwright
+import json
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from cryptography.fernet import InvalidToken
 from sqlalchemy.orm import Session
+from ..config import settings
 from ..models import User, Chore
-from .encryption import decrypt
+from ..timeutil import utcnow
+from .encryption import encrypt, decrypt
+from .browser_pool import browser_pool
+from .metrics import GO4SCHOOLS_SESSIONS
+
+LOGIN_URL = "https://www.go4schools.com/students/"
+HOMEWORK_URL = "https://www.go4schools.com/students/homework.aspx"
 
 
 def _make_source_id(subject: str, title: str, due: str) -> str:
@@ -11,42 +20,107 @@ def _make_source_id(subject: str, title: str, due: str) -> str:
     return hashlib.sha256(raw.encode()).hexdigest()[:16]
 
 
+def load_session(user: User) -> Optional[dict]:
+    """The browser storage state saved at the user's last login, or None if missing, expired or unreadable."""
+    if not user.go4schools_session or not user.go4schools_session_expires_at:
+        return None
+    if user.go4schools_session_expires_at <= utcnow():
+        return None
+    try:
+        return json.loads(decrypt(user.go4schools_session))
+    except (InvalidToken, ValueError):
+        return None
+
+
+def session_expiry(state: dict) -> datetime:
+    """When a storage state stops being worth trying: its first Go4Schools cookie expiry, capped by the TTL."""
+    expires_at = utcnow() + timedelta(seconds=settings.GO4SCHOOLS_SESSION_TTL)
+    for cookie in state.get("cookies", []):
+        expires = cookie.get("expires", -1)  # -1 for session cookies
+        if expires > 0 and "go4schools" in cookie.get("domain", ""):
+            expires_at = min(expires_at, datetime.fromtimestamp(expires, timezone.utc).replace(tzinfo=None))
+    return expires_at
+
+
+def clear_session(user: User):
+    user.go4schools_session = None
+    user.go4schools_session_expires_at = None
+
+
+async def _save_session(user: User, context):
+    state = await context.storage_state()
+    user.go4schools_session = encrypt(json.dumps(state))
+    user.go4schools_session_expires_at = session_expiry(state)
+
+
+async def _signed_out(page) -> bool:
+    return "sign in" in (await page.title()).lower()
+
+
+async def _login(page, email: str, password: str) -> bool:
+    """Sign in through the student login form. Returns False if the credentials were rejected."""
+    # Navigate to student login
+    await page.goto(LOGIN_URL, timeout=30000)
+
+    # Fill login form
+    await page.fill('input[type="email"]', email)
+    await page.fill('input[type="password"]', password)
+    await page.click("#go-sign-in-button")
+
+    # Wait for navigation after login
+    await page.wait_for_load_state("networkidle", timeout=15000)
+
+    # Check for login failure
+    return not await _signed_out(page)
+
+
 async def scrape_homework(user: User, db: Session) -> dict:
     """Log into Go4Schools and scrape homework for a user.
 
+    The browser storage state of a successful login is saved encrypted on
+    the user and reused by later scrapes until it expires, so they go
+    straight to the homework page. If Go4Schools no longer accepts it,
+    the scrape logs in again. Session changes are left for the caller to
+    commit.
+
     Returns dict with keys: synced (int), error (str|None)
     """
     email = user.go4schools_email
     password = decrypt(user.go4schools_password)
+    state = load_session(user)
 
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True)
-        page = await browser.new_page()
+    # A fresh context per scrape keeps each child's login separate on the shared browser
+    async with browser_pool.context(storage_state=state) as context:
+        page = await context.new_page()
 
         try:
-            # Navigate to student login
-            await page.goto("https://www.go4schools.com/students/", timeout=30000)
-
-            # Fill login form
-            await page.fill('input[type="email"]', email)
-            await page.fill('input[type="password"]', password)
-            await page.click("#go-sign-in-button")
+            signed_in = False
+            if state:
+                await page.goto(HOMEWORK_URL, timeout=30000)
+                await page.wait_for_load_state("networkidle", timeout=15000)
+                signed_in = not await _signed_out(page)
+                GO4SCHOOLS_SESSIONS.labels("reused" if signed_in else "expired").inc()
+            elif user.go4schools_session:
+                GO4SCHOOLS_SESSIONS.labels("expired").inc()  # past its expiry, or unreadable
+            else:
+                GO4SCHOOLS_SESSIONS.labels("login").inc()
 
-            # Wait for navigation after login
-            await page.wait_for_load_state("networkidle", timeout=15000)
+            if not signed_in:
+                if not await _login(page, email, password):
+                    clear_session(user)
+                    return {"synced": 0, "error": "Login failed — check your email and password"}
 
-            # Check for login failure
-            if "sign in" in (await page.title()).lower():
-                return {"synced": 0, "error": "Login failed — check your email and password"}
+                # Navigate to homework page
+                homework_link = page.locator('a:has-text("Homework"), a[href*="homework"]').first
+                if await homework_link.count() > 0:
+                    await homework_link.click()
+                    await page.wait_for_load_state("networkidle", timeout=15000)
+                else:
+                    await page.goto(HOMEWORK_URL, timeout=30000)
+                    await page.wait_for_load_state("networkidle", timeout=15000)
 
-            # Navigate to homework page
-            homework_link = page.locator('a:has-text("Homework"), a[href*="homework"]').first
-            if await homework_link.count() > 0:
-                await homework_link.click()
-                await page.wait_for_load_state("networkidle", timeout=15000)
-            else:
-                await page.goto("https://www.go4schools.com/students/homework.aspx", timeout=30000)
-                await page.wait_for_load_state("networkidle", timeout=15000)
+            # Saved on every scrape, as Go4Schools may have refreshed the cookies
+            await _save_session(user, context)
 
             # Scrape homework items from table or card layout
             homework_items = []
@@ -109,5 +183,3 @@ async def scrape_homework(user: User, db: Session) -> dict:
 
         except Exception as e:
             return {"synced": 0, "error": str(e)[:200]}
-        finally:
-            await browser.close()
@@ -0,0 +1,43 @@
+import json
+import threading
+from functools import lru_cache
+import httplib2
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient import discovery_cache
+from googleapiclient.discovery import build_from_document
+
+HTTP_TIMEOUT = 30
+
+_local = threading.local()
+
+
+@lru_cache(maxsize=None)
+def _discovery_document(api: str, version: str) -> dict:
+    """Parse the discovery document shipped with google-api-python-client once per process."""
+    content = discovery_cache.get_static_doc(api, version)
+    if content is None:
+        raise ValueError(f"No bundled discovery document for {api} {version}")
+    return json.loads(content)
+
+
+def _transport() -> httplib2.Http:
+    """Per-thread HTTP transport; keeps connections to googleapis.com alive between calls.
+
+    httplib2 is not thread safe, so each worker thread gets its own instance.
+    """
+    http = getattr(_local, "http", None)
+    if http is None:
+        http = httplib2.Http(timeout=HTTP_TIMEOUT)
+        _local.http = http
+    return http
+
+
+def build_service(api: str, version: str, credentials):
+    """Drop-in replacement for `googleapiclient.discovery.build`.
+
+    Uses the cached discovery document and the calling thread's shared
+    transport instead of loading the document and opening a new connection
+    for every service object.
+    """
+    http = AuthorizedHttp(credentials, http=_transport())
+    return build_from_document(_discovery_document(api, version), http=http)
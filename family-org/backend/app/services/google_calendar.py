@@ -0,0 +1,183 @@
+import asyncio
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Optional
+from googleapiclient.errors import HttpError
+from sqlalchemy.orm import Session
+from ..config import settings
+from ..database import dialect_insert
+from ..models import Event, GoogleSyncState
+from .metrics import track_call
+
+PAGE_SIZE = 250
+HIDDEN_VISIBILITY = ("private", "confidential")
+# Columns refreshed when an existing event changes (ownership stays with the first syncer)
+UPSERT_COLUMNS = ("summary", "start_time", "end_time", "location", "calendar_id", "etag")
+
+
+@dataclass
+class CalendarChanges:
+    """Events fetched for one calendar, grouped by API page."""
+    calendar_id: str
+    pages: list = field(default_factory=list)
+    next_sync_token: Optional[str] = None
+    full_sync: bool = False
+    time_min: Optional[str] = None
+
+
+def get_sync_state(db: Session, user_id: int, resource_id: str, resource_type: str = "calendar") -> GoogleSyncState:
+    state = db.query(GoogleSyncState).filter(
+        GoogleSyncState.user_id == user_id,
+        GoogleSyncState.resource_type == resource_type,
+        GoogleSyncState.resource_id == resource_id,
+    ).first()
+    if not state:
+        state = GoogleSyncState(user_id=user_id, resource_type=resource_type, resource_id=resource_id)
+        db.add(state)
+    return state
+
+
+def fetch_calendar_changes(service, calendar_id: str, sync_token: Optional[str] = None) -> CalendarChanges:
+    """Fetch changed events for a calendar, following every page.
+
+    With a sync token only changes since the last sync are returned (including
+    cancellations). Without one, or when Google rejects the token with 410 Gone,
+    all upcoming events are fetched and the caller should treat the result as a
+    full resync.
+    """
+    if sync_token:
+        try:
+            return _list_events(service, calendar_id, syncToken=sync_token)
+        except HttpError as e:
+            if e.resp.status != 410:
+                raise
+            print(f"[Calendar] Sync token expired for {calendar_id}, running full resync")
+
+    time_min = datetime.now(timezone.utc).isoformat()
+    changes = _list_events(service, calendar_id, timeMin=time_min)
+    changes.full_sync = True
+    changes.time_min = time_min
+    return changes
+
+
+async def fetch_all_calendars(service_factory, sync_tokens: dict, concurrency: Optional[int] = None) -> dict:
+    """Fetch changes for several calendars concurrently.
+
+    `sync_tokens` maps calendar ID to its stored sync token (or None). Each
+    fetch runs in a worker thread with its own service object from
+    `service_factory`, at most `concurrency` at a time, so total time is
+    bounded by the slowest calendar rather than the sum. Returns calendar ID
+    to `CalendarChanges`, or to the exception raised for that calendar.
+    """
+    semaphore = asyncio.Semaphore(concurrency or settings.GOOGLE_SYNC_CONCURRENCY)
+
+    async def fetch_one(calendar_id: str, sync_token: Optional[str]):
+        async with semaphore:
+            with track_call("google", "calendar.events.list"):
+                return await asyncio.to_thread(
+                    lambda: fetch_calendar_changes(service_factory(), calendar_id, sync_token)
+                )
+
+    calendar_ids = list(sync_tokens)
+    results = await asyncio.gather(
+        *(fetch_one(cal_id, sync_tokens[cal_id]) for cal_id in calendar_ids),
+        return_exceptions=True,
+    )
+    return dict(zip(calendar_ids, results))
+
+
+def _list_events(service, calendar_id: str, **params) -> CalendarChanges:
+    changes = CalendarChanges(calendar_id=calendar_id)
+    page_token = None
+    while True:
+        result = service.events().list(
+            calendarId=calendar_id,
+            singleEvents=True,
+            maxResults=PAGE_SIZE,
+            pageToken=page_token,
+            **params
+        ).execute()
+        changes.pages.append(result.get("items", []))
+        page_token = result.get("nextPageToken")
+        if not page_token:
+            changes.next_sync_token = result.get("nextSyncToken")
+            return changes
+
+
+def _event_row(user_id: int, calendar_id: str, g_event: dict) -> dict:
+    return {
+        "google_event_id": g_event["id"],
+        "summary": g_event.get("summary", "(No Title)"),
+        "start_time": g_event["start"].get("dateTime", g_event["start"].get("date")),
+        "end_time": g_event["end"].get("dateTime", g_event["end"].get("date")),
+        "location": g_event.get("location"),
+        "calendar_id": calendar_id,
+        "etag": g_event.get("etag") or g_event.get("updated"),
+        "user_id": user_id,
+    }
+
+
+def upsert_events(db: Session, rows: list) -> int:
+    """Insert or update a page of events in one statement.
+
+    Rows whose stored etag matches are left untouched. Returns the number of
+    rows actually written.
+    """
+    if not rows:
+        return 0
+    insert = dialect_insert(db)
+    stmt = insert(Event).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Event.google_event_id],
+        set_={col: stmt.excluded[col] for col in UPSERT_COLUMNS},
+        where=Event.etag.is_distinct_from(stmt.excluded.etag),
+    )
+    return db.execute(stmt).rowcount
+
+
+def apply_calendar_changes(db: Session, user_id: int, changes: CalendarChanges, state: GoogleSyncState) -> dict:
+    """Write fetched changes to the events table and advance the sync token.
+
+    Each page is upserted with a single statement. Cancelled and
+    private/confidential events are removed. On a full resync, upcoming events
+    of this calendar that Google no longer returned are removed too. Does not
+    commit.
+    """
+    upserted = 0
+    removed_ids = set()
+    seen_ids = set()
+
+    for page in changes.pages:
+        rows = {}
+        for g_event in page:
+            event_id = g_event["id"]
+            if g_event.get("status") == "cancelled" or g_event.get("visibility", "default") in HIDDEN_VISIBILITY:
+                removed_ids.add(event_id)
+                rows.pop(event_id, None)
+                continue
+            seen_ids.add(event_id)
+            removed_ids.discard(event_id)
+            # Keyed by ID: one statement can't touch the same conflicting row twice
+            rows[event_id] = _event_row(user_id, changes.calendar_id, g_event)
+        upserted += upsert_events(db, list(rows.values()))
+
+    deleted = 0
+    if removed_ids:
+        deleted += db.query(Event).filter(
+            Event.user_id == user_id,
+            Event.google_event_id.in_(removed_ids),
+        ).delete(synchronize_session=False)
+
+    if changes.full_sync:
+        stale = db.query(Event).filter(
+            Event.user_id == user_id,
+            Event.calendar_id == changes.calendar_id,
+            Event.start_time >= changes.time_min,
+        )
+        if seen_ids:
+            stale = stale.filter(Event.google_event_id.notin_(seen_ids))
+        deleted += stale.delete(synchronize_session=False)
+
+    state.sync_token = changes.next_sync_token
+    state.last_synced_at = datetime.now(timezone.utc)
+    return {"upserted": upserted, "deleted": deleted}
@@ -0,0 +1,177 @@
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Optional
+from sqlalchemy.orm import Session
+from ..database import dialect_insert
+from ..models import Chore
+from .google_calendar import get_sync_state
+from .metrics import track_call
+
+TASKLIST = "@default"
+PAGE_SIZE = 100
+BATCH_SIZE = 50  # Google recommends at most 50 calls per batch request
+# Columns refreshed when a task changes remotely
+UPSERT_COLUMNS = (
+    "title", "description", "due_date", "is_completed", "last_completed_at",
+    "google_task_status", "google_task_etag",
+)
+
+
+@dataclass
+class TaskChanges:
+    """Tasks updated since the last cursor, grouped by API page."""
+    pages: list = field(default_factory=list)
+    cursor: Optional[str] = None
+
+
+def _parse_time(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def fetch_task_changes(service, updated_min: Optional[str] = None, tasklist: str = TASKLIST) -> TaskChanges:
+    """Fetch tasks modified since `updated_min`, following every page.
+
+    Completed, hidden and deleted tasks are included so local chores can follow
+    them. The returned cursor is the newest `updated` timestamp seen, so the
+    next call only asks for later changes.
+    """
+    changes = TaskChanges(cursor=updated_min)
+    page_token = None
+    while True:
+        result = service.tasks().list(
+            tasklist=tasklist,
+            updatedMin=updated_min,
+            showCompleted=True,
+            showDeleted=True,
+            showHidden=True,
+            maxResults=PAGE_SIZE,
+            pageToken=page_token,
+        ).execute()
+        items = result.get("items", [])
+        changes.pages.append(items)
+        for task in items:
+            if task.get("updated") and (changes.cursor is None or task["updated"] > changes.cursor):
+                changes.cursor = task["updated"]
+        page_token = result.get("nextPageToken")
+        if not page_token:
+            return changes
+
+
+def _chore_row(user_id: int, task: dict) -> dict:
+    completed = task.get("status") == "completed"
+    return {
+        "google_task_id": task["id"],
+        "title": (task.get("title") or "(No Title)")[:200],
+        "description": (task.get("notes") or "")[:500] or None,
+        "due_date": _parse_time(task.get("due")),
+        "is_completed": completed,
+        "last_completed_at": _parse_time(task.get("completed")) if completed else None,
+        "google_task_status": task.get("status"),
+        "google_task_etag": task.get("etag") or task.get("updated"),
+        "source": "google_tasks",
+        "frequency": "once",
+        "is_bonus": False,
+        "points": 3,
+        "personal": True,
+        "assignee_id": user_id,
+    }
+
+
+def upsert_task_chores(db: Session, rows: list) -> int:
+    """Insert or update a page of tasks as chores in one statement, skipping unchanged etags."""
+    if not rows:
+        return 0
+    insert = dialect_insert(db)
+    stmt = insert(Chore).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Chore.google_task_id],
+        set_={col: stmt.excluded[col] for col in UPSERT_COLUMNS},
+        where=Chore.google_task_etag.is_distinct_from(stmt.excluded.google_task_etag),
+    )
+    return db.execute(stmt).rowcount
+
+
+def apply_task_changes(db: Session, user_id: int, changes: TaskChanges, state) -> dict:
+    """Write pulled tasks to the chores table and advance the cursor. Does not commit."""
+    upserted = 0
+    removed_ids = set()
+    for page in changes.pages:
+        rows = {}
+        for task in page:
+            if task.get("deleted"):
+                removed_ids.add(task["id"])
+                rows.pop(task["id"], None)
+                continue
+            removed_ids.discard(task["id"])
+            rows[task["id"]] = _chore_row(user_id, task)
+        upserted += upsert_task_chores(db, list(rows.values()))
+
+    deleted = 0
+    if removed_ids:
+        deleted = db.query(Chore).filter(
+            Chore.assignee_id == user_id,
+            Chore.google_task_id.in_(removed_ids),
+        ).delete(synchronize_session=False)
+
+    state.sync_token = changes.cursor
+    state.last_synced_at = datetime.now(timezone.utc)
+    return {"upserted": upserted, "deleted": deleted}
+
+
+def push_local_completions(db: Session, service, user_id: int, tasklist: str = TASKLIST) -> int:
+    """Send chores completed or reopened locally back to Google Tasks.
+
+    Changes go out as batch requests of up to BATCH_SIZE patches. Each
+    successful patch records the new remote status and etag on the chore.
+    Does not commit. Returns the number of tasks updated.
+    """
+    chores = db.query(Chore).filter(
+        Chore.assignee_id == user_id,
+        Chore.google_task_id.isnot(None),
+    ).all()
+    pending = {
+        c.google_task_id: c for c in chores
+        if c.is_completed != (c.google_task_status == "completed")
+    }
+    if not pending:
+        return 0
+
+    pushed = 0
+
+    def on_response(request_id, response, exception):
+        nonlocal pushed
+        if exception is not None:
+            print(f"[Tasks] Could not update task {request_id}: {exception}")
+            return
+        chore = pending[request_id]
+        chore.google_task_status = response.get("status")
+        chore.google_task_etag = response.get("etag") or response.get("updated")
+        pushed += 1
+
+    task_ids = list(pending)
+    for start in range(0, len(task_ids), BATCH_SIZE):
+        batch = service.new_batch_http_request(callback=on_response)
+        for task_id in task_ids[start:start + BATCH_SIZE]:
+            if pending[task_id].is_completed:
+                body = {"status": "completed"}
+            else:
+                body = {"status": "needsAction", "completed": None}
+            batch.add(service.tasks().patch(tasklist=tasklist, task=task_id, body=body), request_id=task_id)
+        batch.execute()
+    return pushed
+
+
+def sync_tasks(db: Session, service, user_id: int) -> dict:
+    """Two-way sync of a user's default task list. Does not commit."""
+    state = get_sync_state(db, user_id, TASKLIST, resource_type="tasks")
+    # Push first so a pull of stale remote state can't undo a local completion
+    with track_call("google", "tasks.patch"):
+        pushed = push_local_completions(db, service, user_id)
+    db.flush()
+    with track_call("google", "tasks.list"):
+        changes = fetch_task_changes(service, state.sync_token)
+    result = apply_task_changes(db, user_id, changes, state)
+    result["pushed"] = pushed
+    return result
@@ -0,0 +1,126 @@
+import asyncio
+from datetime import timedelta
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+from sqlalchemy.orm import Session
+from ..config import settings
+from ..database import SessionLocal
+from ..models import User
+from ..timeutil import utcnow
+from .metrics import track_call
+
+TOKEN_URI = "https://oauth2.googleapis.com/token"
+SCOPES = ["https://www.googleapis.com/auth/calendar.readonly", "https://www.googleapis.com/auth/tasks"]
+
+# Refresh on demand when a token has less than this left
+REFRESH_MARGIN = timedelta(minutes=5)
+# The background pass refreshes anything expiring within this window
+BACKGROUND_WINDOW = timedelta(minutes=15)
+# Users share this many refresh locks, so the lock table never grows
+LOCK_STRIPES = 16
+
+
+class GoogleTokenManager:
+    """Hands out valid Google credentials per user.
+
+    Credentials are cached in memory and refreshed ahead of expiry, either on
+    demand or by the worker's scheduled `refresh_expiring` pass, so callers
+    rarely wait on Google's token endpoint. Refreshes for the same user are
+    serialised (by one of a fixed set of striped locks) so concurrent callers
+    share a single refresh. Refreshed tokens are written back to the user row
+    so other processes pick them up.
+    """
+
+    def __init__(self):
+        self._credentials: dict[int, Credentials] = {}
+        self._locks: list[asyncio.Lock] = []
+        self._loop = None
+
+    def _lock_for(self, user_id: int) -> asyncio.Lock:
+        # asyncio locks belong to one event loop, so the stripes are recreated for a new one
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._locks = [asyncio.Lock() for _ in range(LOCK_STRIPES)]
+            self._loop = loop
+        return self._locks[user_id % LOCK_STRIPES]
+
+    @staticmethod
+    def _is_fresh(creds: Credentials, margin: timedelta) -> bool:
+        return bool(creds.token) and creds.expiry is not None and creds.expiry - margin > utcnow()
+
+    @staticmethod
+    def _from_user(user: User) -> Credentials:
+        creds = Credentials(
+            token=user.google_access_token,
+            refresh_token=user.google_refresh_token,
+            token_uri=TOKEN_URI,
+            client_id=settings.GOOGLE_CLIENT_ID,
+            client_secret=settings.GOOGLE_CLIENT_SECRET,
+            scopes=SCOPES,
+        )
+        creds.expiry = user.google_token_expiry
+        return creds
+
+    async def get_credentials(self, db: Session, user: User, margin: timedelta = REFRESH_MARGIN) -> Credentials:
+        """Return credentials valid for at least `margin`, refreshing if needed.
+
+        Raises google.auth.exceptions.RefreshError if Google rejects the refresh token.
+        """
+        creds, _ = await self._get_credentials(db, user, margin)
+        return creds
+
+    async def _get_credentials(self, db: Session, user: User, margin: timedelta) -> tuple[Credentials, bool]:
+        """`get_credentials`, also saying whether this call refreshed the token with Google."""
+        cached = self._credentials.get(user.id)
+        if cached and self._is_fresh(cached, margin):
+            return cached, False
+
+        async with self._lock_for(user.id):
+            # Another caller may have refreshed while we waited
+            cached = self._credentials.get(user.id)
+            if cached and self._is_fresh(cached, margin):
+                return cached, False
+
+            # Another process may already have stored a fresh token
+            db.refresh(user)
+            creds = self._from_user(user)
+            refreshed = not self._is_fresh(creds, margin)
+            if refreshed:
+                with track_call("google", "oauth.token_refresh"):
+                    await asyncio.to_thread(creds.refresh, Request())
+                user.google_access_token = creds.token
+                user.google_token_expiry = creds.expiry
+                db.commit()
+                print(f"[Tokens] Refreshed Google token for {user.email}")
+
+            self._credentials[user.id] = creds
+            return creds, refreshed
+
+    def forget(self, user_id: int):
+        """Drop cached credentials, e.g. after the user re-authorises."""
+        self._credentials.pop(user_id, None)
+
+    async def refresh_expiring(self, window: timedelta = BACKGROUND_WINDOW) -> int:
+        """Refresh every stored token that expires within `window`. Returns how many were refreshed."""
+        db = SessionLocal()
+        refreshed = 0
+        try:
+            horizon = utcnow() + window
+            users = db.query(User).filter(
+                User.google_refresh_token.isnot(None),
+                (User.google_token_expiry.is_(None)) | (User.google_token_expiry <= horizon),
+            ).all()
+            for user in users:
+                try:
+                    _, did_refresh = await self._get_credentials(db, user, window)
+                    refreshed += did_refresh
+                except Exception as e:
+                    db.rollback()
+                    self.forget(user.id)
+                    print(f"[Tokens] Could not refresh token for {user.email}: {e}")
+        finally:
+            db.close()
+        return refreshed
+
+
+token_manager = GoogleTokenManager()
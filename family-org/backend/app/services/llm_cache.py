@@ -0,0 +1,133 @@
+import asyncio
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional
+from ..config import settings
+from ..database import SessionLocal, dialect_insert
+from ..models import LLMCacheEntry
+from ..timeutil import utcnow
+from .metrics import LLM_CACHE_REQUESTS
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def cache_key(model: str, prompt: str) -> str:
+    """Hash of the model and the prompt with whitespace collapsed.
+
+    Prompts are built from indented f-strings, so only the words matter.
+    """
+    normalised = _WHITESPACE.sub(" ", prompt).strip()
+    return hashlib.sha256(f"{model}\n{normalised}".encode()).hexdigest()
+
+
+class LLMCache:
+    """Two-level cache of LLM replies: a per-process LRU in front of the llm_cache table.
+
+    The table is shared by the API and every worker, so a reply computed
+    once is reused everywhere until its TTL runs out. Entries use their own
+    short sessions and never touch the caller's transaction. Async callers
+    use `aget`/`aput`, which keep the table's queries off the event loop.
+    """
+
+    def __init__(self, max_memory: Optional[int] = None, ttl: Optional[int] = None):
+        self._max_memory = max_memory or settings.LLM_CACHE_MEMORY_SIZE
+        self._ttl = timedelta(seconds=ttl or settings.LLM_CACHE_TTL)
+        self._memory: OrderedDict[str, tuple] = OrderedDict()  # key -> (response, expires_at)
+        self._lock = threading.Lock()
+
+    def _remember(self, key: str, response: str, expires_at: datetime):
+        with self._lock:
+            self._memory[key] = (response, expires_at)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self._max_memory:
+                self._memory.popitem(last=False)
+
+    def _memory_get(self, key: str, now: datetime) -> Optional[str]:
+        with self._lock:
+            hit = self._memory.get(key)
+            if hit and hit[1] > now:
+                self._memory.move_to_end(key)
+                LLM_CACHE_REQUESTS.labels("memory").inc()
+                return hit[0]
+        return None
+
+    def _db_get(self, key: str, now: datetime) -> Optional[str]:
+        db = SessionLocal()
+        try:
+            entry = db.query(LLMCacheEntry).filter(
+                LLMCacheEntry.key == key,
+                LLMCacheEntry.expires_at > now,
+            ).first()
+        finally:
+            db.close()
+        if entry is None:
+            LLM_CACHE_REQUESTS.labels("miss").inc()
+            return None
+        self._remember(key, entry.response, entry.expires_at)
+        LLM_CACHE_REQUESTS.labels("db").inc()
+        return entry.response
+
+    def _db_put(self, key: str, model: str, response: str, now: datetime, expires_at: datetime):
+        db = SessionLocal()
+        try:
+            insert = dialect_insert(db)
+            stmt = insert(LLMCacheEntry).values(
+                key=key, model=model, response=response, created_at=now, expires_at=expires_at,
+            )
+            db.execute(stmt.on_conflict_do_update(
+                index_elements=[LLMCacheEntry.key],
+                set_={"response": stmt.excluded.response, "created_at": now, "expires_at": expires_at},
+            ))
+            db.commit()
+        finally:
+            db.close()
+
+    def get(self, model: str, prompt: str) -> Optional[str]:
+        key = cache_key(model, prompt)
+        now = utcnow()
+        hit = self._memory_get(key, now)
+        return hit if hit is not None else self._db_get(key, now)
+
+    def put(self, model: str, prompt: str, response: str):
+        key = cache_key(model, prompt)
+        now = utcnow()
+        expires_at = now + self._ttl
+        self._remember(key, response, expires_at)
+        self._db_put(key, model, response, now, expires_at)
+
+    async def aget(self, model: str, prompt: str) -> Optional[str]:
+        """`get` for async code: a memory hit returns at once, the table is read in a thread."""
+        key = cache_key(model, prompt)
+        now = utcnow()
+        hit = self._memory_get(key, now)
+        return hit if hit is not None else await asyncio.to_thread(self._db_get, key, now)
+
+    async def aput(self, model: str, prompt: str, response: str):
+        """`put` for async code, writing the table in a thread."""
+        key = cache_key(model, prompt)
+        now = utcnow()
+        expires_at = now + self._ttl
+        self._remember(key, response, expires_at)
+        await asyncio.to_thread(self._db_put, key, model, response, now, expires_at)
+
+    def prune(self) -> int:
+        """Delete expired rows from the table. Returns how many were removed."""
+        db = SessionLocal()
+        try:
+            deleted = db.query(LLMCacheEntry).filter(
+                LLMCacheEntry.expires_at <= utcnow()
+            ).delete(synchronize_session=False)
+            db.commit()
+            return deleted
+        finally:
+            db.close()
+
+    def clear_memory(self):
+        with self._lock:
+            self._memory.clear()
+
+
+llm_cache = LLMCache()
@@ -0,0 +1,148 @@
+import time
+from contextlib import contextmanager
+from prometheus_client import Counter, Gauge, Histogram
+from .query_stats import track_queries
+from .tracing import span
+
+# Syncs and scrapes take seconds to minutes, so the default buckets stop too early
+SLOW_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+# -- Worker --
+
+MESSAGES_CONSUMED = Counter(
+    "worker_messages_consumed_total", "Messages taken off a queue", ["queue", "type"])
+MESSAGES_FAILED = Counter(
+    "worker_messages_failed_total", "Messages whose processing failed", ["queue", "type", "outcome"])
+MESSAGE_DURATION = Histogram(
+    "worker_message_duration_seconds", "Time spent processing a message", ["type"], buckets=SLOW_BUCKETS)
+QUEUE_LAG = Histogram(
+    "worker_queue_lag_seconds", "Time a message waited in its queue before being consumed", ["queue"],
+    buckets=SLOW_BUCKETS)
+QUEUE_DEPTH = Gauge(
+    "worker_queue_depth", "Messages ready in a queue", ["queue"])
+
+JOB_RUNS = Counter(
+    "worker_job_runs_total", "Scheduled job runs", ["job", "outcome"])
+JOB_DURATION = Histogram(
+    "worker_job_duration_seconds", "Scheduled job run time", ["job"], buckets=SLOW_BUCKETS)
+
+# -- External services --
+
+EXTERNAL_CALL_DURATION = Histogram(
+    "external_call_duration_seconds", "Latency of calls to external services", ["service", "operation"],
+    buckets=SLOW_BUCKETS)
+EXTERNAL_CALL_FAILURES = Counter(
+    "external_call_failures_total", "Failed calls to external services", ["service", "operation"])
+
+LLM_FIRST_TOKEN = Histogram(
+    "llm_time_to_first_token_seconds", "Time until a streamed LLM reply produced its first token",
+    buckets=SLOW_BUCKETS)
+CIRCUIT_STATE = Gauge(
+    "circuit_breaker_state", "Circuit breaker state: 0 closed, 1 half-open (probing), 2 open", ["name"])
+CIRCUIT_SHORT_CIRCUITS = Counter(
+    "circuit_breaker_short_circuits_total", "Calls refused because the circuit was open", ["name"])
+LLM_CACHE_REQUESTS = Counter(
+    "llm_cache_requests_total", "LLM cache lookups by result (memory hit, db hit or miss)", ["result"])
+BROWSER_LAUNCHES = Counter(
+    "browser_launches_total", "Chromium launches by the worker's browser pool, by reason (start, recycle, crash)",
+    ["reason"])
+BROWSER_CONTEXTS_ACTIVE = Gauge("browser_contexts_active", "Browser contexts currently handed out by the pool")
+GO4SCHOOLS_SESSIONS = Counter(
+    "go4schools_sessions_total", "How Go4Schools scrapes got signed in (reused, expired then login, or login)",
+    ["result"])
+PREP_RULE_DECISIONS = Counter(
+    "prep_rule_decisions_total", "Events checked against the preparation rules, by decision (no_prep, tasks or llm)",
+    ["decision"])
+
+
+@contextmanager
+def track_call(service: str, operation: str):
+    """Time a call to an external service, counting it as failed if it raises. Also traced as a span."""
+    started = time.perf_counter()
+    try:
+        with span(f"{service} {operation}"):
+            yield
+    except Exception:
+        EXTERNAL_CALL_FAILURES.labels(service, operation).inc()
+        raise
+    finally:
+        EXTERNAL_CALL_DURATION.labels(service, operation).observe(time.perf_counter() - started)
+
+
+# -- API --
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total", "HTTP requests handled", ["method", "route", "status"])
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Time to handle an HTTP request", ["method", "route"])
+HTTP_REQUEST_DB_TIME = Histogram(
+    "http_request_db_seconds", "Time spent in SQL queries per HTTP request", ["method", "route"])
+HTTP_RESPONSE_SIZE = Histogram(
+    "http_response_size_bytes", "HTTP response body size", ["method", "route"],
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576))
+HTTP_REQUEST_QUERIES = Histogram(
+    "http_request_queries", "SQL queries run per HTTP request", ["method", "route"],
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200))
+HTTP_N_PLUS_ONE = Counter(
+    "http_n_plus_one_suspects_total", "Requests that repeated one SQL statement shape too often",
+    ["method", "route"])
+HTTP_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "HTTP requests currently being handled")
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, SQL usage, response size and in-flight count per route.
+
+    Routes are labelled by their path template (e.g. `/chores/{chore_id}/complete`)
+    so label cardinality stays fixed; requests matching no route share the
+    "unmatched" label. Responses carry X-DB-Query-Count and X-DB-Time-Ms
+    headers, and requests that repeat a statement shape N_PLUS_ONE_THRESHOLD
+    times are logged as N+1 suspects.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        size = 0
+        queries = None
+
+        async def send_wrapper(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                # Streaming bodies may query after this point; the headers count what ran before
+                message = {**message, "headers": [
+                    *message.get("headers", []),
+                    (b"x-db-query-count", str(queries.count).encode()),
+                    (b"x-db-time-ms", f"{queries.duration * 1000:.1f}".encode()),
+                ]}
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            with track_queries() as queries:
+                await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - started
+            HTTP_IN_FLIGHT.dec()
+            route = scope.get("route")
+            labels = (scope["method"], getattr(route, "path", "unmatched"))
+            HTTP_REQUESTS.labels(*labels, str(status)).inc()
+            HTTP_REQUEST_DURATION.labels(*labels).observe(duration)
+            HTTP_REQUEST_DB_TIME.labels(*labels).observe(queries.duration)
+            HTTP_REQUEST_QUERIES.labels(*labels).observe(queries.count)
+            HTTP_RESPONSE_SIZE.labels(*labels).observe(size)
+            suspects = queries.n_plus_one_suspects()
+            if suspects:
+                HTTP_N_PLUS_ONE.labels(*labels).inc()
+                for shape, n in suspects:
+                    print(f"[DB] Possible N+1 in {labels[0]} {labels[1]}: {n}x {shape[:200]}")
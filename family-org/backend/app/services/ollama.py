@@ -0,0 +1,151 @@
+import asyncio
+import json
+import time
+from typing import AsyncIterator, Optional
+import httpx
+from ..config import settings
+from .metrics import track_call, EXTERNAL_CALL_DURATION, EXTERNAL_CALL_FAILURES, LLM_FIRST_TOKEN
+from .circuit_breaker import CircuitBreaker
+
+HEALTH_TIMEOUT = 2  # seconds
+
+
+class OllamaClient:
+    """Async client for Ollama's generate API, shared by the whole process.
+
+    Reuses pooled HTTP connections, caps concurrent generations with a
+    semaphore so a family-wide pass can't swamp the model server, and asks
+    Ollama to keep the model loaded between calls. The client and semaphore
+    belong to one event loop and are recreated if used from another.
+
+    A circuit breaker tracks consecutive failures. While Ollama is down,
+    `generate` returns None at once, so callers fall back to heuristics
+    without waiting for a timeout. Recovery is detected by probing
+    /api/tags.
+    """
+
+    def __init__(self, host: Optional[str] = None, concurrency: Optional[int] = None,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        self._host = host or settings.OLLAMA_HOST
+        self._concurrency = concurrency or settings.OLLAMA_CONCURRENCY
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop = None
+        self.breaker = CircuitBreaker(
+            "ollama", self.is_healthy,
+            failure_threshold=settings.OLLAMA_FAILURE_THRESHOLD,
+            recovery_time=settings.OLLAMA_RECOVERY_TIME,
+        )
+
+    def _ensure_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            self._client = httpx.AsyncClient(
+                base_url=self._host,
+                timeout=httpx.Timeout(settings.OLLAMA_TIMEOUT, connect=5),
+                limits=httpx.Limits(max_connections=self._concurrency, max_keepalive_connections=self._concurrency),
+                transport=self._transport,
+            )
+            self._semaphore = asyncio.Semaphore(self._concurrency)
+            self._loop = loop
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def is_healthy(self, model: Optional[str] = None) -> bool:
+        """Whether Ollama answers quickly and has the model available."""
+        model = model or settings.OLLAMA_MODEL
+        if ":" not in model:
+            model += ":latest"
+        try:
+            response = await self._ensure_client().get("/api/tags", timeout=HEALTH_TIMEOUT)
+            response.raise_for_status()
+            return any(m.get("name") == model for m in response.json().get("models", []))
+        except Exception as e:
+            print(f"[Ollama] Health check failed: {e!r}")
+            return False
+
+    async def generate(self, prompt: str, model: Optional[str] = None) -> Optional[str]:
+        """Return the model's full reply to `prompt`, or None if Ollama failed, timed out or is down."""
+        if not await self.breaker.allow():
+            return None
+        client = self._ensure_client()
+        model = model or settings.OLLAMA_MODEL
+        async with self._semaphore:
+            # The circuit may have opened while this call waited for a slot
+            if not await self.breaker.allow():
+                return None
+            started = time.perf_counter()
+            try:
+                with track_call("ollama", "generate"):
+                    response = await client.post("/api/generate", json={
+                        "model": model,
+                        "prompt": prompt,
+                        "stream": False,
+                        "keep_alive": settings.OLLAMA_KEEP_ALIVE,
+                    })
+                    response.raise_for_status()
+                body = response.json()
+            except Exception as e:
+                self.breaker.record_failure()
+                print(f"[Ollama] Error after {time.perf_counter() - started:.1f}s: {e!r}")
+                return None
+        self.breaker.record_success()
+        # Ollama reports durations in nanoseconds; load time shows a cold model
+        print(f"[Ollama] {model} replied in {time.perf_counter() - started:.1f}s "
+              f"(load {body.get('load_duration', 0) / 1e9:.1f}s, {body.get('eval_count', 0)} tokens)")
+        return (body.get("response") or "").strip()
+
+    async def stream(self, prompt: str, model: Optional[str] = None) -> AsyncIterator[str]:
+        """Yield the model's reply to `prompt` piece by piece as Ollama generates it.
+
+        Yields nothing if Ollama is down. Raises if the request fails or the
+        reply ends before Ollama marks it done, so callers never mistake a
+        partial reply for a whole one.
+        """
+        if not await self.breaker.allow():
+            return
+        client = self._ensure_client()
+        model = model or settings.OLLAMA_MODEL
+        async with self._semaphore:
+            started = time.perf_counter()
+            first_token = True
+            done = False
+            try:
+                # Timed by hand rather than with track_call: its span must not stay current across yields
+                async with client.stream("POST", "/api/generate", json={
+                    "model": model,
+                    "prompt": prompt,
+                    "stream": True,
+                    "keep_alive": settings.OLLAMA_KEEP_ALIVE,
+                }) as response:
+                    response.raise_for_status()
+                    async for line in response.aiter_lines():
+                        if not line:
+                            continue
+                        chunk = json.loads(line)
+                        if chunk.get("response"):
+                            if first_token:
+                                LLM_FIRST_TOKEN.observe(time.perf_counter() - started)
+                                first_token = False
+                            yield chunk["response"]
+                        if chunk.get("done"):
+                            done = True
+                            break
+                if not done:
+                    raise httpx.RemoteProtocolError("Ollama stream ended before the reply was done")
+            except Exception as e:
+                self.breaker.record_failure()
+                EXTERNAL_CALL_FAILURES.labels("ollama", "generate_stream").inc()
+                print(f"[Ollama] Stream error after {time.perf_counter() - started:.1f}s: {e!r}")
+                raise
+            finally:
+                EXTERNAL_CALL_DURATION.labels("ollama", "generate_stream").observe(time.perf_counter() - started)
+        self.breaker.record_success()
+
+
+ollama = OllamaClient()
@@ -0,0 +1,131 @@
+import re
+try:
+    from re import _parser as _sre  # Python 3.11+
+except ImportError:
+    import sre_parse as _sre
+from dataclasses import dataclass
+from typing import Optional
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from ..models import PrepRule
+from .metrics import PREP_RULE_DECISIONS
+
+# Built-in rules, checked after the household's own rules on equal priority:
+# (pattern, is_regex, tasks, priority). `{name}` in a task is filled from the
+# regex group of that name.
+DEFAULT_RULES = [
+    (r"(?P<name>[^']+)'s\b.*\bbirthday", True, ["Buy birthday card for {name}", "Buy present for {name}"], 10),
+    ("birthday", False, ["Buy birthday card", "Buy present"], 0),
+    ("dentist, doctor, gp, hospital", False, ["Prepare any paperwork or questions"], 0),
+    ("interview, presentation", False, ["Prepare notes and materials"], 0),
+    ("standup, stand-up, scrum, focus time, out of office", False, [], 0),
+]
+
+_PLACEHOLDER = re.compile(r"\{(\w+)\}")
+MAX_PATTERN_LENGTH = 200
+
+
+def _check_regex(parsed, in_repeat: bool = False):
+    """Reject regex features that break the combined pre-filter or can backtrack for ages.
+
+    Backreferences count groups, which the combined pattern renumbers, and a
+    repeat inside another repeat (e.g. `(a+)+`) can take exponential time on
+    a near miss; the worker runs every rule against every event.
+    """
+    for op, av in parsed:
+        if op in (_sre.GROUPREF, _sre.GROUPREF_EXISTS):
+            raise re.error("backreferences are not supported")
+        if op in (_sre.MAX_REPEAT, _sre.MIN_REPEAT):
+            _, high, sub = av
+            if in_repeat and high > 1:
+                raise re.error("nested repeats are not supported")
+            _check_regex(sub, in_repeat or high > 1)
+        elif op is _sre.SUBPATTERN:
+            _check_regex(av[-1], in_repeat)
+        elif op is _sre.BRANCH:
+            for branch in av[1]:
+                _check_regex(branch, in_repeat)
+        elif op in (_sre.ASSERT, _sre.ASSERT_NOT):
+            _check_regex(av[1], in_repeat)
+
+
+def compile_pattern(pattern: str, is_regex: bool) -> re.Pattern:
+    """Compile a rule's pattern, case-insensitively. Raises re.error for a bad or unsafe regex."""
+    if len(pattern) > MAX_PATTERN_LENGTH:
+        raise re.error(f"longer than {MAX_PATTERN_LENGTH} characters")
+    if is_regex:
+        _check_regex(_sre.parse(pattern))
+    else:
+        keywords = [k.strip() for k in pattern.split(",") if k.strip()]
+        if not keywords:
+            raise re.error("no keywords given")
+        pattern = r"\b(?:" + "|".join(re.escape(k) for k in keywords) + r")\b"
+    return re.compile(pattern, re.IGNORECASE)
+
+
+@dataclass
+class CompiledRule:
+    regex: re.Pattern
+    tasks: list[str]
+    priority: int
+
+    def apply(self, summary: str) -> Optional[list[str]]:
+        match = self.regex.search(summary)
+        if match is None:
+            return None
+        groups = {k: v.strip() for k, v in match.groupdict().items() if v}
+        return [_PLACEHOLDER.sub(lambda m: groups.get(m.group(1), m.group(0)), task) for task in self.tasks]
+
+
+class PrepRuleEngine:
+    """Decides from rules alone whether an event needs preparation, so most events skip the LLM.
+
+    `decide` returns [] for "no preparation needed", the tasks of the first
+    matching rule, or None to ask the LLM. Rules are compiled once and
+    recompiled only when the prep_rules table changes; a single combined
+    pattern rejects events no rule mentions in one scan.
+    """
+
+    def __init__(self):
+        self._rules: list[CompiledRule] = []
+        self._any: Optional[re.Pattern] = None
+        self._fingerprint = None
+        self._compile([])
+
+    def _compile(self, stored: list[PrepRule]):
+        rules = []
+        for rule in stored:
+            try:
+                rules.append(CompiledRule(compile_pattern(rule.pattern, rule.is_regex), list(rule.tasks or []),
+                                          rule.priority))
+            except re.error as e:
+                print(f"[Rules] Skipping prep rule {rule.id} ({rule.pattern!r}): {e}")
+        for pattern, is_regex, tasks, priority in DEFAULT_RULES:
+            rules.append(CompiledRule(compile_pattern(pattern, is_regex), tasks, priority))
+        rules.sort(key=lambda r: -r.priority)  # stable, so stored rules win ties
+        try:
+            self._any = re.compile("|".join(f"(?:{r.regex.pattern})" for r in rules), re.IGNORECASE)
+        except re.error:
+            self._any = None  # e.g. two rules share a group name; just try each rule in turn
+        self._rules = rules
+
+    def refresh(self, db: Session):
+        """Recompile if rules were added or removed since the last call. One cheap query."""
+        fingerprint = tuple(db.query(
+            func.count(PrepRule.id), func.max(PrepRule.id), func.max(PrepRule.created_at)).one())
+        if fingerprint != self._fingerprint:
+            self._compile(db.query(PrepRule).order_by(PrepRule.id).all())
+            self._fingerprint = fingerprint
+
+    def decide(self, summary: str) -> Optional[list[str]]:
+        if self._any is None or self._any.search(summary):
+            for rule in self._rules:
+                tasks = rule.apply(summary)
+                if tasks is not None:
+                    PREP_RULE_DECISIONS.labels("tasks" if tasks else "no_prep").inc()
+                    return tasks
+        PREP_RULE_DECISIONS.labels("llm").inc()
+        return None
+
+
+prep_rules = PrepRuleEngine()
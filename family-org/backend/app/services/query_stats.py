@@ -0,0 +1,103 @@
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Optional
+from sqlalchemy import event
+from ..config import settings
+
+_current: ContextVar[Optional["QueryStats"]] = ContextVar("query_stats", default=None)
+
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_PARAM_LIST = re.compile(r"\(\s*(?:\?|%\(\w+\)s)(?:\s*,\s*(?:\?|%\(\w+\)s))*\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=1024)
+def statement_shape(statement: str) -> str:
+    """Reduce a SQL statement to its shape: literals and expanded IN lists become `?`."""
+    shape = _LITERAL.sub("?", statement)
+    shape = _PARAM_LIST.sub("(?)", shape)
+    return _WHITESPACE.sub(" ", shape).strip()
+
+
+@dataclass
+class QueryStats:
+    """SQL statements run and time spent in the database within a `track_queries` block."""
+    count: int = 0
+    duration: float = 0.0  # seconds
+    shapes: Counter = field(default_factory=Counter)
+
+    def n_plus_one_suspects(self, threshold: Optional[int] = None) -> list:
+        """(shape, count) of statements repeated at least `threshold` times, most repeated first.
+
+        The same SELECT issued over and over with different parameters is the
+        signature of a lazy load or lookup inside a loop.
+        """
+        threshold = threshold or settings.N_PLUS_ONE_THRESHOLD
+        return [(shape, n) for shape, n in self.shapes.most_common() if n >= threshold]
+
+
+@contextmanager
+def track_queries():
+    """Collect stats for queries run in this context, including threads it hands work to.
+
+    FastAPI runs sync endpoints and dependencies in a thread pool with a copy
+    of the request's context, so one block around a request sees all of its
+    queries.
+    """
+    stats = QueryStats()
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def expect_queries(max_count: Optional[int] = None, n_plus_one_threshold: Optional[int] = None):
+    """Fail with AssertionError if the block runs too many queries or repeats a statement shape.
+
+    For tests, e.g. `with expect_queries(max_count=5): client.get("/dashboard/kiosk")`.
+    """
+    with track_queries() as stats:
+        yield stats
+    if max_count is not None and stats.count > max_count:
+        shapes = "\n".join(f"  {n}x {shape}" for shape, n in stats.shapes.most_common())
+        raise AssertionError(f"Expected at most {max_count} queries, ran {stats.count}:\n{shapes}")
+    suspects = stats.n_plus_one_suspects(n_plus_one_threshold)
+    if suspects:
+        shapes = "\n".join(f"  {n}x {shape}" for shape, n in suspects)
+        raise AssertionError(f"Possible N+1 queries:\n{shapes}")
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    started = conn.info.get("query_started")
+    if stats is None or not started:
+        return
+    stats.count += 1
+    stats.duration += time.perf_counter() - started.pop()
+    stats.shapes[statement_shape(statement)] += 1
+
+
+def _handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute; drop its start time
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("query_started"):
+        conn.info["query_started"].pop()
+
+
+def instrument_engine(engine):
+    """Attach the query tracking hooks to an engine. Costs almost nothing outside `track_queries`."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
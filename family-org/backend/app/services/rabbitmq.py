@@ -1,13 +1,217 @@
+import asyncio
 import aio_pika
 import json
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import Optional
+from aio_pika.pool import Pool
 from ..config import settings
+from .tracing import TRACEPARENT, current_traceparent, span
 
-async def send_sync_message(message_type: str, data: dict, routing_key: str = "sync_queue"):
-    connection = await aio_pika.connect_robust(settings.RABBITMQ_URL)
-    async with connection:
-        channel = await connection.channel()
-        message_body = json.dumps({"type": message_type, "data": data})
-        await channel.default_exchange.publish(
-            aio_pika.Message(body=message_body.encode()),
-            routing_key=routing_key
-        )
+CHANNEL_POOL_SIZE = 4
+SYNC_QUEUE = "sync_queue"
+# User-triggered syncs use SYNC_QUEUE; scheduled fan-outs go to a separate lane
+# with its own consumer so a nightly backlog can't delay a "sync now".
+SYNC_LANES = {"interactive": SYNC_QUEUE, "batch": f"{SYNC_QUEUE}.batch"}
+
+
+def _build_message(message_type: str, data: dict) -> aio_pika.Message:
+    message_body = json.dumps({"type": message_type, "data": data})
+    traceparent = current_traceparent()
+    # The timestamp lets consumers measure how long the message sat in the queue
+    return aio_pika.Message(
+        body=message_body.encode(),
+        timestamp=datetime.now(timezone.utc),
+        headers={TRACEPARENT: traceparent} if traceparent else None,
+    )
+
+
+class RabbitPublisher:
+    """Long-lived publisher shared by the whole process.
+
+    Keeps one robust connection and a small pool of channels with publisher
+    confirms, so a publish is a frame on an open channel rather than a new
+    TCP + AMQP handshake. Starts lazily on first use if `start` wasn't called.
+    """
+
+    def __init__(self, url: Optional[str] = None, pool_size: int = CHANNEL_POOL_SIZE):
+        self._url = url or settings.RABBITMQ_URL
+        self._pool_size = pool_size
+        self._connection = None
+        self._channels: Optional[Pool] = None
+        self._lock = asyncio.Lock()
+
+    async def start(self):
+        async with self._lock:
+            if self._connection is not None and not self._connection.is_closed:
+                return
+            self._connection = await aio_pika.connect_robust(self._url)
+            self._channels = Pool(self._open_channel, max_size=self._pool_size)
+
+    async def _open_channel(self):
+        return await self._connection.channel(publisher_confirms=True)
+
+    async def close(self):
+        async with self._lock:
+            if self._channels is not None:
+                await self._channels.close()
+                self._channels = None
+            if self._connection is not None:
+                await self._connection.close()
+                self._connection = None
+
+    @asynccontextmanager
+    async def channel(self):
+        """Borrow a pooled channel, e.g. to declare queues or get messages."""
+        if self._channels is None:
+            await self.start()
+        async with self._channels.acquire() as channel:
+            yield channel
+
+    async def publish_message(self, message: aio_pika.Message, routing_key: str):
+        async with self.channel() as channel:
+            await channel.default_exchange.publish(message, routing_key=routing_key)
+
+    async def publish(self, message_type: str, data: dict, routing_key: str = SYNC_QUEUE):
+        await self.publish_batch([(message_type, data)], routing_key=routing_key)
+
+    async def publish_batch(self, messages: list, routing_key: str = SYNC_QUEUE):
+        """Publish (message_type, data) pairs on one channel, waiting for all confirms together."""
+        if not messages:
+            return
+        with span("rabbitmq.publish", routing_key=routing_key, messages=len(messages)):
+            async with self.channel() as channel:
+                await asyncio.gather(*(
+                    channel.default_exchange.publish(_build_message(message_type, data), routing_key=routing_key)
+                    for message_type, data in messages
+                ))
+
+
+publisher = RabbitPublisher()
+
+
+async def send_sync_message(message_type: str, data: dict, routing_key: str = SYNC_QUEUE):
+    await publisher.publish(message_type, data, routing_key=routing_key)
+
+
+async def send_sync_messages(messages: list, routing_key: str = SYNC_QUEUE):
+    await publisher.publish_batch(messages, routing_key=routing_key)
+
+
+# -- Retries and dead-lettering --
+#
+# A failed message is republished to `<queue>.retry.<delay>s`, a queue with no
+# consumers whose TTL dead-letters it back onto `<queue>` once the delay has
+# passed. Delays grow exponentially per attempt; after SYNC_MAX_ATTEMPTS the
+# message is parked on `<queue>.dead` for inspection and replay.
+
+def retry_delays() -> list:
+    """Delay in seconds before each retry; attempt n waits retry_delays()[n - 1]."""
+    return [settings.SYNC_RETRY_BASE_DELAY * 4 ** i for i in range(settings.SYNC_MAX_ATTEMPTS - 1)]
+
+
+def retry_queue_name(queue: str, delay: int) -> str:
+    return f"{queue}.retry.{delay}s"
+
+
+def dead_letter_queue_name(queue: str) -> str:
+    return f"{queue}.dead"
+
+
+async def declare_retry_queues(channel, queue: str):
+    for delay in retry_delays():
+        await channel.declare_queue(retry_queue_name(queue, delay), durable=True, arguments={
+            "x-message-ttl": delay * 1000,
+            "x-dead-letter-exchange": "",
+            "x-dead-letter-routing-key": queue,
+        })
+    await channel.declare_queue(dead_letter_queue_name(queue), durable=True)
+
+
+def _attempt(message) -> int:
+    return int((message.headers or {}).get("x-attempt", 1))
+
+
+async def dead_letter(message, queue: str, error: str):
+    headers = dict(message.headers or {})
+    headers.update({
+        "x-attempt": _attempt(message),
+        "x-error": error[:500],
+        "x-failed-at": datetime.now(timezone.utc).isoformat(),
+        "x-original-queue": queue,
+    })
+    await publisher.publish_message(
+        aio_pika.Message(body=message.body, headers=headers, delivery_mode=aio_pika.DeliveryMode.PERSISTENT),
+        routing_key=dead_letter_queue_name(queue),
+    )
+    print(f"[RabbitMQ] Dead-lettered message from {queue} after {headers['x-attempt']} attempts: {error}")
+
+
+async def retry_or_dead_letter(message, queue: str, error: Exception) -> bool:
+    """Schedule a delayed retry of a failed message, or dead-letter it after the last attempt.
+
+    Returns True if a retry was scheduled.
+    """
+    attempt = _attempt(message)
+    delays = retry_delays()
+    if attempt > len(delays):
+        await dead_letter(message, queue, str(error))
+        return False
+    headers = dict(message.headers or {})
+    headers["x-attempt"] = attempt + 1
+    headers["x-max-attempts"] = settings.SYNC_MAX_ATTEMPTS
+    await publisher.publish_message(
+        aio_pika.Message(body=message.body, headers=headers, delivery_mode=aio_pika.DeliveryMode.PERSISTENT),
+        routing_key=retry_queue_name(queue, delays[attempt - 1]),
+    )
+    print(f"[RabbitMQ] Retrying message from {queue} in {delays[attempt - 1]}s (attempt {attempt + 1})")
+    return True
+
+
+def _describe(message) -> dict:
+    headers = message.headers or {}
+    try:
+        body = json.loads(message.body.decode())
+    except ValueError:
+        body = {"raw": message.body.decode(errors="replace")}
+    return {
+        "type": body.get("type") if isinstance(body, dict) else None,
+        "data": body.get("data") if isinstance(body, dict) else body,
+        "attempts": headers.get("x-attempt"),
+        "error": headers.get("x-error"),
+        "failed_at": headers.get("x-failed-at"),
+        "original_queue": headers.get("x-original-queue"),
+    }
+
+
+async def peek_dead_letters(queue: str = SYNC_QUEUE, limit: int = 50) -> list:
+    """Return up to `limit` dead-lettered messages without removing them."""
+    messages = []
+    async with publisher.channel() as channel:
+        dlq = await channel.declare_queue(dead_letter_queue_name(queue), durable=True)
+        try:
+            for _ in range(limit):
+                message = await dlq.get(no_ack=False, fail=False)
+                if message is None:
+                    break
+                messages.append(message)
+            return [_describe(m) for m in messages]
+        finally:
+            for message in messages:
+                await message.nack(requeue=True)
+
+
+async def replay_dead_letters(queue: str = SYNC_QUEUE, limit: int = 50) -> int:
+    """Move up to `limit` dead-lettered messages back onto their queue with a fresh attempt count."""
+    replayed = 0
+    async with publisher.channel() as channel:
+        dlq = await channel.declare_queue(dead_letter_queue_name(queue), durable=True)
+        for _ in range(limit):
+            message = await dlq.get(no_ack=False, fail=False)
+            if message is None:
+                break
+            target = (message.headers or {}).get("x-original-queue", queue)
+            await channel.default_exchange.publish(aio_pika.Message(body=message.body), routing_key=target)
+            await message.ack()
+            replayed += 1
+    return replayed
@@ -0,0 +1,124 @@
+import asyncio
+import json
+import uuid
+from datetime import timedelta
+from typing import AsyncIterator, Optional
+from sqlalchemy.orm import Session
+from ..database import SessionLocal, dialect_insert
+from ..models import Alert, ScheduleAnalysis
+from ..timeutil import utcnow
+from .ai_agent import FamilyAIAgent
+from .sync_requests import request_sync
+
+# Worker message type that recomputes one user's analysis
+ANALYSIS_JOB = "schedule_analysis"
+# The worker recomputes hourly; anything older was missed and is refreshed on read
+MAX_AGE = timedelta(hours=2)
+
+
+def is_pending(analysis: ScheduleAnalysis) -> bool:
+    return analysis.requested_job_id is not None and analysis.requested_job_id != analysis.completed_job_id
+
+
+def is_stale(analysis: ScheduleAnalysis) -> bool:
+    return analysis.computed_at is None or utcnow() - analysis.computed_at > MAX_AGE
+
+
+def serialize(analysis: ScheduleAnalysis) -> dict:
+    return {
+        "user_id": analysis.user_id,
+        "busy": analysis.busy,
+        "message": analysis.message,
+        "event_count": analysis.event_count,
+        "chore_count": analysis.chore_count,
+        "alert_id": analysis.alert_id,
+        "computed_at": analysis.computed_at.isoformat() + "Z" if analysis.computed_at else None,
+        "stale": is_stale(analysis),
+        "status": "pending" if is_pending(analysis) else "ready",
+        "job_id": analysis.requested_job_id,
+    }
+
+
+async def request_analysis(db: Session, user_id: int) -> str:
+    """Queue a recompute of a user's analysis and return its job id.
+
+    The job is done once the row's completed_job_id equals the returned id.
+    Repeated requests share one queued run. If the message can't be
+    published the request is withdrawn and the error raised, so the row
+    isn't left pending.
+    """
+    job_id = uuid.uuid4().hex
+    previous = await asyncio.to_thread(_set_requested_job, db, user_id, job_id)
+    try:
+        await request_sync(db, ANALYSIS_JOB, user_id)
+    except Exception:
+        await asyncio.to_thread(_withdraw_requested_job, db, user_id, job_id, previous)
+        raise
+    return job_id
+
+
+def _set_requested_job(db: Session, user_id: int, job_id: str) -> Optional[str]:
+    """Point the user's row at `job_id`, creating it if needed. Returns the job it replaced."""
+    insert = dialect_insert(db)
+    db.execute(insert(ScheduleAnalysis).values(
+        user_id=user_id, event_count=0, chore_count=0, busy=False,
+    ).on_conflict_do_nothing(index_elements=[ScheduleAnalysis.user_id]))
+    previous = db.query(ScheduleAnalysis.requested_job_id).filter(ScheduleAnalysis.user_id == user_id).scalar()
+    db.query(ScheduleAnalysis).filter(ScheduleAnalysis.user_id == user_id).update(
+        {"requested_job_id": job_id}, synchronize_session=False)
+    db.commit()
+    return previous
+
+
+def _withdraw_requested_job(db: Session, user_id: int, job_id: str, previous: Optional[str]):
+    db.query(ScheduleAnalysis).filter(
+        ScheduleAnalysis.user_id == user_id,
+        ScheduleAnalysis.requested_job_id == job_id,
+    ).update({"requested_job_id": previous}, synchronize_session=False)
+    db.commit()
+    db.expire_all()
+
+
+def _complete_job(db: Session, user_id: int, job_id: Optional[str]):
+    if job_id:
+        db.query(ScheduleAnalysis).filter(ScheduleAnalysis.user_id == user_id).update(
+            {"completed_job_id": job_id}, synchronize_session=False)
+        db.commit()
+
+
+async def refresh_analysis(db: Session, user_id: int) -> Optional[Alert]:
+    """Recompute a user's analysis now, completing any recompute requested before it started."""
+    analysis = db.get(ScheduleAnalysis, user_id)
+    requested = analysis.requested_job_id if analysis else None
+    alert = await FamilyAIAgent(db).analyze_user_schedule(user_id)
+    _complete_job(db, user_id, requested)
+    return alert
+
+
+def _complete_and_reload(db: Session, user_id: int, job_id: Optional[str]) -> ScheduleAnalysis:
+    _complete_job(db, user_id, job_id)
+    db.expire_all()
+    return db.get(ScheduleAnalysis, user_id)
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def stream_analysis(user_id: int, refresh: bool = False) -> AsyncIterator[str]:
+    """Server-sent events for a user's analysis: `token` events while the LLM writes, then `done`.
+
+    A fresh stored analysis is sent straight away as `done` unless `refresh`
+    is set. Uses its own session, since it outlives the request's.
+    """
+    db = SessionLocal()
+    try:
+        analysis = await asyncio.to_thread(db.get, ScheduleAnalysis, user_id)
+        if analysis is None or refresh or is_stale(analysis):
+            requested = analysis.requested_job_id if analysis else None
+            async for token in FamilyAIAgent(db).stream_schedule_analysis(user_id):
+                yield _sse("token", {"text": token})
+            analysis = await asyncio.to_thread(_complete_and_reload, db, user_id, requested)
+        yield _sse("done", serialize(analysis))
+    finally:
+        db.close()
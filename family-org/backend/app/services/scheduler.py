@@ -0,0 +1,161 @@
+import asyncio
+import random
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Optional
+from croniter import croniter
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from ..config import settings
+from ..database import SessionLocal, engine, dialect_insert
+from ..models import ScheduledJob
+from ..timeutil import utcnow
+from .metrics import JOB_RUNS, JOB_DURATION
+from .tracing import span
+
+# Postgres advisory lock key held by the leading worker replica
+LEADER_LOCK_KEY = 0x66616d6f
+
+
+@dataclass
+class Job:
+    """A recurring coroutine run on a cron schedule (server local time)."""
+    name: str
+    schedule: str
+    func: Callable[[], Awaitable]
+    jitter: int = 0  # up to this many seconds are added to each run, to spread load
+
+    def next_run(self, after: datetime) -> datetime:
+        """Next run time in naive UTC strictly after `after` (naive UTC), including jitter."""
+        local = after.replace(tzinfo=timezone.utc).astimezone()
+        scheduled = croniter(self.schedule, local).get_next(datetime)
+        delay = timedelta(seconds=random.uniform(0, self.jitter)) if self.jitter else timedelta()
+        return scheduled.astimezone(timezone.utc).replace(tzinfo=None) + delay
+
+
+class Scheduler:
+    """Runs jobs at their scheduled times, once across all worker replicas.
+
+    Next-run times live in the scheduled_jobs table, so a restart keeps the
+    schedule instead of starting the clock again, and a run missed while no
+    worker was up happens once on the next tick. On Postgres only the replica
+    holding the leader advisory lock checks for due jobs; each run is also
+    claimed with a compare-and-set on next_run_at, so two replicas that both
+    think they lead still can't run the same slot twice.
+    """
+
+    def __init__(self, jobs: list, tick: Optional[int] = None):
+        self.jobs = {job.name: job for job in jobs}
+        self.tick = tick or settings.SCHEDULER_TICK
+        self._leader_conn = None
+        self._registered = False
+        self._running: dict[str, asyncio.Task] = {}
+
+    def _is_leader(self) -> bool:
+        if engine.dialect.name != "postgresql":
+            return True  # SQLite is only used by a single local process
+        if self._leader_conn is not None:
+            try:
+                self._leader_conn.execute(text("SELECT 1"))
+                return True
+            except Exception:
+                # Connection dropped, and the lock with it
+                self._leader_conn = None
+        conn = engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+        try:
+            acquired = conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": LEADER_LOCK_KEY}).scalar()
+        except Exception:
+            conn.close()
+            raise
+        if not acquired:
+            conn.close()
+            return False
+        # The lock lasts as long as this connection stays open
+        self._leader_conn = conn
+        print("[Scheduler] Became scheduler leader")
+        return True
+
+    def register(self, db: Session):
+        """Create rows for new jobs and reschedule jobs whose cron expression changed."""
+        now = utcnow()
+        existing = {row.name: row for row in db.query(ScheduledJob).filter(ScheduledJob.name.in_(self.jobs))}
+        insert = dialect_insert(db)
+        for job in self.jobs.values():
+            row = existing.get(job.name)
+            if row is None:
+                db.execute(insert(ScheduledJob).values(
+                    name=job.name, schedule=job.schedule, next_run_at=job.next_run(now),
+                ).on_conflict_do_nothing(index_elements=[ScheduledJob.name]))
+            elif row.schedule != job.schedule:
+                row.schedule = job.schedule
+                row.next_run_at = job.next_run(now)
+        db.commit()
+        self._registered = True
+
+    def _claim_due(self, db: Session, now: datetime) -> list:
+        """Move every due job's next_run_at forward; return the jobs this call won."""
+        due = db.query(ScheduledJob).filter(
+            ScheduledJob.name.in_(self.jobs),
+            ScheduledJob.next_run_at <= now,
+        ).all()
+        claimed = []
+        for row in due:
+            if row.name in self._running:
+                continue  # still running from last time; picked up on a later tick
+            job = self.jobs[row.name]
+            won = db.query(ScheduledJob).filter(
+                ScheduledJob.name == row.name,
+                ScheduledJob.next_run_at == row.next_run_at,
+            ).update({"next_run_at": job.next_run(now), "last_run_at": now}, synchronize_session=False)
+            db.commit()
+            if won:
+                claimed.append(job)
+        return claimed
+
+    async def run_due(self, now: Optional[datetime] = None) -> list:
+        """Start every due job this replica claims. Returns the started tasks."""
+        db = SessionLocal()
+        try:
+            if not self._registered:
+                self.register(db)
+            jobs = self._claim_due(db, now or utcnow())
+        finally:
+            db.close()
+        for job in jobs:
+            self._running[job.name] = asyncio.create_task(self._run(job))
+        return [self._running[job.name] for job in jobs]
+
+    async def _run(self, job: Job):
+        started = time.monotonic()
+        error = None
+        try:
+            with span(f"job {job.name}"):
+                await job.func()
+        except Exception as e:
+            error = str(e)[:500]
+            print(f"[Scheduler] Job {job.name} failed: {e}")
+        finally:
+            self._running.pop(job.name, None)
+        duration = time.monotonic() - started
+        JOB_DURATION.labels(job.name).observe(duration)
+        JOB_RUNS.labels(job.name, "failed" if error else "succeeded").inc()
+        db = SessionLocal()
+        try:
+            db.query(ScheduledJob).filter(ScheduledJob.name == job.name).update(
+                {"last_duration": duration, "last_error": error},
+                synchronize_session=False,
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    async def run(self):
+        """Check for due jobs every `tick` seconds, forever."""
+        while True:
+            try:
+                if self._is_leader():
+                    await self.run_due()
+            except Exception as e:
+                print(f"[Scheduler] Error checking scheduled jobs: {e}")
+            await asyncio.sleep(self.tick)
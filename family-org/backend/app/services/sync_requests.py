@@ -0,0 +1,169 @@
+import asyncio
+from datetime import timedelta
+from typing import Optional
+from sqlalchemy.orm import Session
+from ..database import dialect_insert
+from ..models import SyncRequest
+from ..timeutil import utcnow
+from .rabbitmq import SYNC_LANES, send_sync_messages, retry_delays
+
+# A request stuck this long (worker crash, lost message) no longer blocks new triggers
+STALE_AFTER = timedelta(minutes=30)
+
+
+def _stale_after(state: str) -> timedelta:
+    # A failed sync waits in a retry queue for up to the longest retry delay first
+    if state == "retrying":
+        return STALE_AFTER + timedelta(seconds=max(retry_delays(), default=0))
+    return STALE_AFTER
+
+
+def _claim(db: Session, sync_type: str, user_id: int, lane: str) -> bool:
+    """Record a trigger. Returns True if a new message needs publishing."""
+    now = utcnow()
+    insert = dialect_insert(db)
+    created = db.execute(
+        insert(SyncRequest)
+        .values(user_id=user_id, sync_type=sync_type, state="queued", lane=lane, rerun=False, updated_at=now)
+        .on_conflict_do_nothing(index_elements=[SyncRequest.user_id, SyncRequest.sync_type])
+    ).rowcount
+    if created:
+        return True
+
+    request = db.query(SyncRequest).filter(
+        SyncRequest.user_id == user_id,
+        SyncRequest.sync_type == sync_type,
+    ).with_for_update().first()
+    if request is None:
+        # Finished between our insert and select
+        db.add(SyncRequest(user_id=user_id, sync_type=sync_type, state="queued", lane=lane, rerun=False, updated_at=now))
+        return True
+    if request.updated_at < now - _stale_after(request.state):
+        request.state = "queued"
+        request.lane = lane
+        request.rerun = False
+        request.updated_at = now
+        return True
+    if request.state == "queued" and request.lane == "batch" and lane == "interactive":
+        # Jump the batch backlog; the batch message may still run once more later
+        request.lane = lane
+        request.updated_at = now
+        return True
+    if request.state == "running":
+        # Run once more after the current one, whatever happens in the meantime
+        request.rerun = True
+        if lane == "interactive":
+            request.lane = lane
+    # "retrying": the scheduled retry will pick up whatever changed
+    return False
+
+
+async def request_syncs(db: Session, requests: list, lane: str = "interactive") -> int:
+    """Queue (sync_type, user_id) syncs, skipping ones already queued.
+
+    A trigger for a sync that is currently running sets its rerun flag
+    instead, so any number of triggers collapse into at most one more run.
+    `lane` is "interactive" for user-triggered syncs or "batch" for
+    scheduled ones. Returns the number of messages published.
+    """
+    # The database work runs in a thread so callers on the event loop don't block it
+    to_publish = await asyncio.to_thread(_claim_all, db, requests, lane)
+    try:
+        await send_sync_messages(to_publish, routing_key=SYNC_LANES[lane])
+    except Exception:
+        await asyncio.to_thread(_unclaim, db, to_publish)
+        raise
+    return len(to_publish)
+
+
+def _claim_all(db: Session, requests: list, lane: str) -> list:
+    to_publish = []
+    for sync_type, user_id in requests:
+        if _claim(db, sync_type, user_id, lane):
+            to_publish.append((sync_type, {"user_id": user_id}))
+    db.commit()
+    return to_publish
+
+
+def _unclaim(db: Session, published: list):
+    # Don't let unpublished requests block later triggers
+    for sync_type, data in published:
+        db.query(SyncRequest).filter(
+            SyncRequest.user_id == data["user_id"],
+            SyncRequest.sync_type == sync_type,
+            SyncRequest.state == "queued",
+        ).delete(synchronize_session=False)
+    db.commit()
+
+
+async def request_sync(db: Session, sync_type: str, user_id: int, lane: str = "interactive") -> bool:
+    return await request_syncs(db, [(sync_type, user_id)], lane=lane) > 0
+
+
+async def try_request_syncs(db: Session, requests: list, lane: str = "interactive") -> int:
+    """`request_syncs` for follow-ups to work that is already committed: a broker outage is logged, not raised.
+
+    Unpublished requests are cleared by `request_syncs`, so the next trigger
+    queues them again.
+    """
+    try:
+        return await request_syncs(db, requests, lane=lane)
+    except Exception as e:
+        print(f"[Sync] Could not queue {', '.join(t for t, _ in requests)}: {e!r}")
+        return 0
+
+
+async def try_request_sync(db: Session, sync_type: str, user_id: int, lane: str = "interactive") -> bool:
+    return await try_request_syncs(db, [(sync_type, user_id)], lane=lane) > 0
+
+
+def start_sync(db: Session, sync_type: str, user_id: int):
+    """Mark a sync as running when the worker picks it up."""
+    insert = dialect_insert(db)
+    stmt = insert(SyncRequest).values(
+        user_id=user_id, sync_type=sync_type, state="running", rerun=False, updated_at=utcnow()
+    )
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[SyncRequest.user_id, SyncRequest.sync_type],
+        set_={"state": "running", "rerun": False, "updated_at": stmt.excluded.updated_at},
+    ))
+    db.commit()
+
+
+def finish_sync(db: Session, sync_type: str, user_id: int, succeeded: bool = True,
+                retrying: bool = False) -> Optional[str]:
+    """Clear a finished sync. If it was triggered again meanwhile, returns the lane to rerun it on.
+
+    A failure whose message was scheduled for retry (`retrying`) keeps the
+    request, so triggers keep collapsing into that retry; the retry also
+    covers any pending rerun. Call `forget_sync` if the message is
+    dead-lettered instead.
+    """
+    request = db.query(SyncRequest).filter(
+        SyncRequest.user_id == user_id,
+        SyncRequest.sync_type == sync_type,
+    ).with_for_update().first()
+    lane = None
+    if request and retrying:
+        request.state = "retrying"
+        request.rerun = False
+        request.updated_at = utcnow()
+    elif request and request.rerun and succeeded:
+        lane = request.lane or "interactive"
+        request.state = "queued"
+        request.lane = lane
+        request.rerun = False
+        request.updated_at = utcnow()
+    elif request:
+        db.delete(request)
+    db.commit()
+    return lane
+
+
+def forget_sync(db: Session, sync_type: str, user_id: int):
+    """Drop the request of a sync that won't run again, e.g. after dead-lettering."""
+    db.query(SyncRequest).filter(
+        SyncRequest.user_id == user_id,
+        SyncRequest.sync_type == sync_type,
+    ).delete(synchronize_session=False)
+    db.commit()
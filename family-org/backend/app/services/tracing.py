@@ -0,0 +1,253 @@
+import json
+import os
+import queue
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Optional
+import requests
+from ..config import settings
+
+# W3C trace context header, carried on HTTP requests and RabbitMQ messages
+TRACEPARENT = "traceparent"
+_TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+EXPORT_BATCH_SIZE = 100
+
+_current: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+_service_name = "api"
+
+
+def set_service_name(name: str):
+    """Name the process in exported spans, e.g. "worker"."""
+    global _service_name
+    _service_name = name
+
+
+def enabled() -> bool:
+    return bool(settings.TRACE_FILE or settings.TRACE_COLLECTOR_URL)
+
+
+def _new_id(n_bytes: int) -> str:
+    return os.urandom(n_bytes).hex()
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    start: float  # epoch seconds
+    attributes: dict = field(default_factory=dict)
+    end: Optional[float] = None
+    error: Optional[str] = None
+    service: str = "api"
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "service": self.service,
+            "start": self.start,
+            "duration_ms": round((self.end - self.start) * 1000, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class _NoopSpan:
+    """Stand-in yielded while tracing is off, so callers never need to check."""
+    trace_id = None
+    traceparent = None
+
+    def set(self, **attributes):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+def parse_traceparent(value) -> Optional[tuple]:
+    """Return (trace_id, parent_span_id) from a traceparent header, or None if absent or malformed."""
+    if not value:
+        return None
+    if isinstance(value, bytes):
+        value = value.decode("latin-1")
+    match = _TRACEPARENT_RE.match(value.strip().lower())
+    return match.groups() if match else None
+
+
+def current_traceparent() -> Optional[str]:
+    span_ = _current.get()
+    return span_.traceparent if span_ else None
+
+
+@contextmanager
+def span(name: str, traceparent: Optional[str] = None, **attributes):
+    """Time a block as a span, a child of the current span or of `traceparent`.
+
+    The span is current inside the block, so nested spans, tasks and threads
+    started from it (which copy the context) become its children.
+    """
+    if not enabled():
+        yield _NOOP
+        return
+    parent = _current.get()
+    remote = parse_traceparent(traceparent)
+    if remote:
+        trace_id, parent_id = remote
+    elif parent:
+        trace_id, parent_id = parent.trace_id, parent.span_id
+    else:
+        trace_id, parent_id = _new_id(16), None
+    span_ = Span(name, trace_id, _new_id(8), parent_id, time.time(), dict(attributes), service=_service_name)
+    token = _current.set(span_)
+    try:
+        yield span_
+    except BaseException as e:
+        span_.error = f"{type(e).__name__}: {e}"[:500]
+        raise
+    finally:
+        span_.end = time.time()
+        _current.reset(token)
+        exporter.export(span_)
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_payload(spans: list) -> dict:
+    """Encode spans as an OTLP/HTTP JSON export request, grouped by service."""
+    by_service = {}
+    for s in spans:
+        by_service.setdefault(s.service, []).append({
+            "traceId": s.trace_id,
+            "spanId": s.span_id,
+            "parentSpanId": s.parent_id or "",
+            "name": s.name,
+            "kind": 1,
+            "startTimeUnixNano": str(int(s.start * 1e9)),
+            "endTimeUnixNano": str(int(s.end * 1e9)),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in s.attributes.items()],
+            "status": {"code": 2, "message": s.error} if s.error else {"code": 1},
+        })
+    return {"resourceSpans": [
+        {
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": f"family-org-{service}"}}]},
+            "scopeSpans": [{"scope": {"name": "family-org"}, "spans": service_spans}],
+        }
+        for service, service_spans in by_service.items()
+    ]}
+
+
+class SpanExporter:
+    """Writes finished spans from a background thread so tracing never blocks a request.
+
+    Spans go to TRACE_FILE as JSON lines and/or to an OTLP/HTTP collector at
+    TRACE_COLLECTOR_URL (e.g. http://jaeger:4318). If the buffer fills up,
+    new spans are dropped.
+    """
+
+    def __init__(self, max_buffer: int = 10000):
+        self._queue = queue.Queue(maxsize=max_buffer)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def export(self, span_: Span):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+                    self._thread.start()
+        try:
+            self._queue.put_nowait(span_)
+        except queue.Full:
+            pass
+
+    def flush(self):
+        """Block until every span exported so far has been written."""
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < EXPORT_BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get(timeout=1))
+                except queue.Empty:
+                    break
+            try:
+                self._write(batch)
+            except Exception as e:
+                print(f"[Tracing] Could not export {len(batch)} spans: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write(self, batch: list):
+        if settings.TRACE_FILE:
+            with open(settings.TRACE_FILE, "a") as f:
+                f.writelines(json.dumps(s.to_dict()) + "\n" for s in batch)
+        if settings.TRACE_COLLECTOR_URL:
+            requests.post(
+                f"{settings.TRACE_COLLECTOR_URL.rstrip('/')}/v1/traces",
+                json=_otlp_payload(batch),
+                timeout=5,
+            ).raise_for_status()
+
+
+exporter = SpanExporter()
+
+
+class TracingMiddleware:
+    """ASGI middleware that runs each HTTP request in a span.
+
+    Continues the caller's trace when a traceparent header is sent and
+    returns the trace ID in an X-Trace-Id header for correlating logs.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not enabled():
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        incoming = headers.get(TRACEPARENT.encode(), b"").decode("latin-1")
+        with span(f"{scope['method']} {scope['path']}", traceparent=incoming) as request_span:
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    request_span.set(status=message["status"])
+                    message = {**message, "headers": [
+                        *message.get("headers", []),
+                        (b"x-trace-id", request_span.trace_id.encode()),
+                    ]}
+                await send(message)
+
+            await self.app(scope, receive, send_wrapper)
+            route = scope.get("route")
+            if route is not None:
+                # Name by template so spans of one endpoint group together
+                request_span.name = f"{scope['method']} {route.path}"
+                request_span.set(path=scope["path"])
@@ -0,0 +1,6 @@
+from datetime import datetime, timezone
+
+
+def utcnow() -> datetime:
+    """Current UTC time as a naive datetime, matching the DateTime columns and google-auth's expiry."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
@@ -2,206 +2,207 @@ import asyncio
 import aio_pika
 import json
 import calendar
+import time
 from datetime import datetime, timezone, timedelta
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
+from google.auth.exceptions import RefreshError
+from prometheus_client import start_http_server
 from sqlalchemy.orm import Session
 from .database import SessionLocal
 from .models import User, Chore, Event, Alert, ChoreCompletion
 from .config import settings
 from .services.ai_agent import FamilyAIAgent
+from .services.llm_cache import llm_cache
+from .services.rabbitmq import (
+    SYNC_LANES, publisher, send_sync_message,
+    declare_retry_queues, retry_or_dead_letter, dead_letter,
+)
+from .services.google_api import build_service
+from .services.google_tokens import token_manager
+from .services.google_calendar import get_sync_state, fetch_all_calendars, apply_calendar_changes
+from .services.google_tasks import sync_tasks
+from .services.sync_requests import (
+    request_syncs, try_request_sync, start_sync, finish_sync, forget_sync,
+)
+from .services.schedule_analysis import ANALYSIS_JOB, refresh_analysis
+from .services.scheduler import Job, Scheduler
+from .services.browser_pool import browser_pool
+from .services.metrics import (
+    MESSAGES_CONSUMED, MESSAGES_FAILED, MESSAGE_DURATION, QUEUE_LAG, QUEUE_DEPTH,
+    EXTERNAL_CALL_FAILURES, track_call,
+)
+from .services.tracing import TRACEPARENT, span, set_service_name
 
-async def reset_chores_task():
-    """Background task to reset chores and run AI analysis."""
-    while True:
-        try:
-            db: Session = SessionLocal()
-            now = datetime.now()
-            
-            today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-            
-            # Weekly: Reset at start of weekend (Saturday 00:00)
-            days_since_saturday = (now.weekday() - 5) % 7
-            last_saturday = today_start - timedelta(days=days_since_saturday)
-            
-            # Monthly: Reset at beginning of month
-            first_of_month = today_start.replace(day=1)
-
-            chores_to_reset = db.query(Chore).filter(Chore.is_completed == True).all()
-            reset_count = 0
-            
-            for chore in chores_to_reset:
-                if not chore.last_completed_at:
-                    continue
-                    
-                should_reset = False
-                if chore.frequency == "daily" and chore.last_completed_at < today_start:
-                    should_reset = True
-                elif chore.frequency == "weekly" and chore.last_completed_at < last_saturday:
-                    should_reset = True
-                elif chore.frequency == "monthly" and chore.last_completed_at < first_of_month:
-                    should_reset = True
-                
-                if should_reset:
-                    chore.is_completed = False
-                    reset_count += 1
-            
-            if reset_count > 0:
-                db.commit()
-                print(f"[Worker] Reset {reset_count} recurring chores.")
+GOOGLE_SYNC_TYPES = ("calendar_sync", "tasks_sync")
+LANE_OF_QUEUE = {queue: lane for lane, queue in SYNC_LANES.items()}
+# Syncs that can change a user's day, so their schedule analysis is refreshed afterwards
+ANALYSIS_TRIGGERS = ("calendar_sync", "tasks_sync", "go4schools_sync")
 
-            # Reset roster chore completions
-            daily_deleted = db.query(ChoreCompletion).filter(
-                ChoreCompletion.completed_at < today_start
-            ).join(Chore).filter(Chore.frequency == "daily").delete(synchronize_session=False)
+async def reset_chores():
+    """Reopen recurring chores whose period has rolled over."""
+    db: Session = SessionLocal()
+    try:
+        now = datetime.now()
 
-            weekly_deleted = db.query(ChoreCompletion).filter(
-                ChoreCompletion.completed_at < last_saturday
-            ).join(Chore).filter(Chore.frequency == "weekly").delete(synchronize_session=False)
+        today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
 
-            monthly_deleted = db.query(ChoreCompletion).filter(
-                ChoreCompletion.completed_at < first_of_month
-            ).join(Chore).filter(Chore.frequency == "monthly").delete(synchronize_session=False)
+        # Weekly: Reset at start of weekend (Saturday 00:00)
+        days_since_saturday = (now.weekday() - 5) % 7
+        last_saturday = today_start - timedelta(days=days_since_saturday)
 
-            completion_reset = daily_deleted + weekly_deleted + monthly_deleted
-            if completion_reset > 0:
-                db.commit()
-                print(f"[Worker] Deleted {completion_reset} stale chore completion records.")
-
-            # AI Schedule Analysis
-            agent = FamilyAIAgent(db)
-            users = db.query(User).all()
-            for user in users:
-                alert = agent.analyze_user_schedule(user.id)
-                if alert:
-                    print(f"[Worker] AI Alert generated for {user.email}: {alert.message}")
-                tasks = agent.generate_event_tasks(user.id)
-                if tasks:
-                    print(f"[Worker] AI created {len(tasks)} personal tasks for {user.email}")
-            
-            db.close()
-        except Exception as e:
-            print(f"[Worker] Error in reset_chores_task: {e}")
-            
-        # Run check every hour
-        await asyncio.sleep(3600)
+        # Monthly: Reset at beginning of month
+        first_of_month = today_start.replace(day=1)
+
+        chores_to_reset = db.query(Chore).filter(Chore.is_completed == True).all()
+        reset_count = 0
+
+        for chore in chores_to_reset:
+            if not chore.last_completed_at:
+                continue
+
+            should_reset = False
+            if chore.frequency == "daily" and chore.last_completed_at < today_start:
+                should_reset = True
+            elif chore.frequency == "weekly" and chore.last_completed_at < last_saturday:
+                should_reset = True
+            elif chore.frequency == "monthly" and chore.last_completed_at < first_of_month:
+                should_reset = True
+
+            if should_reset:
+                chore.is_completed = False
+                reset_count += 1
+
+        if reset_count > 0:
+            db.commit()
+            print(f"[Worker] Reset {reset_count} recurring chores.")
+
+        # Reset roster chore completions
+        daily_deleted = db.query(ChoreCompletion).filter(
+            ChoreCompletion.completed_at < today_start
+        ).join(Chore).filter(Chore.frequency == "daily").delete(synchronize_session=False)
+
+        weekly_deleted = db.query(ChoreCompletion).filter(
+            ChoreCompletion.completed_at < last_saturday
+        ).join(Chore).filter(Chore.frequency == "weekly").delete(synchronize_session=False)
+
+        monthly_deleted = db.query(ChoreCompletion).filter(
+            ChoreCompletion.completed_at < first_of_month
+        ).join(Chore).filter(Chore.frequency == "monthly").delete(synchronize_session=False)
+
+        completion_reset = daily_deleted + weekly_deleted + monthly_deleted
+        if completion_reset > 0:
+            db.commit()
+            print(f"[Worker] Deleted {completion_reset} stale chore completion records.")
+    finally:
+        db.close()
+
+async def run_ai_analysis():
+    """Family-wide AI pass: schedule analysis and event task suggestions for every user.
 
-async def process_sync(message_body: dict):
+    Loads everyone's data in a handful of queries; only users whose day
+    needs a new alert, and events without a cached answer, reach Ollama.
+    """
+    db: Session = SessionLocal()
+    try:
+        agent = FamilyAIAgent(db)
+        for alert in await agent.analyze_family_schedules():
+            print(f"[Worker] AI Alert generated for user {alert.user_id}: {alert.message}")
+        tasks = await agent.generate_family_event_tasks()
+        if tasks:
+            print(f"[Worker] AI created {len(tasks)} personal tasks")
+    finally:
+        db.close()
+
+async def process_sync(message_body: dict, lane: str = "interactive"):
+    """Run one sync message from `lane`. Raises on failures worth retrying."""
     msg_type = message_body.get("type")
     data = message_body.get("data")
     user_id = data.get("user_id")
 
     db: Session = SessionLocal()
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
-        db.close()
-        return
-
-    print(f"[Worker] Processing {msg_type} for user {user.email}")
-
-    # Create credentials from saved tokens
-    creds = Credentials(
-        token=user.google_access_token,
-        refresh_token=user.google_refresh_token,
-        token_uri="https://oauth2.googleapis.com/token",
-        client_id=settings.GOOGLE_CLIENT_ID,
-        client_secret=settings.GOOGLE_CLIENT_SECRET,
-        scopes=["https://www.googleapis.com/auth/calendar.readonly", "https://www.googleapis.com/auth/tasks"]
-    )
-
-    # Refresh token if expired
-    if creds.expired or not creds.valid:
-        from google.auth.transport.requests import Request
-        try:
-            creds.refresh(Request())
-            user.google_access_token = creds.token
-            db.commit()
-            print(f"[Worker] Refreshed Google token for {user.email}")
-        except Exception as e:
-            print(f"[Worker] Could not refresh token for {user.email}: {e}")
-            db.close()
+    user = None
+    succeeded = failed = False
+    try:
+        user = db.query(User).filter(User.id == user_id).first()
+        if not user:
             return
 
-    if msg_type == "calendar_sync":
-        try:
-            service = build('calendar', 'v3', credentials=creds)
-            
+        print(f"[Worker] Processing {msg_type} for user {user.email}")
+        start_sync(db, msg_type, user_id)
+
+        creds = None
+        if msg_type in GOOGLE_SYNC_TYPES:
+            try:
+                creds = await token_manager.get_credentials(db, user)
+            except RefreshError as e:
+                if getattr(e, "retryable", False):
+                    raise
+                # Revoked or expired refresh token: retrying won't help until the user signs in again
+                print(f"[Worker] Could not refresh token for {user.email}: {e}")
+                return
+
+        if msg_type == "calendar_sync":
             # Sync from all selected calendars, or default to primary
-            calendar_ids = user.synced_calendars if user.synced_calendars else ['primary']
+            # Deduplicated: a repeated ID would add its sync state twice and fail the commit
+            calendar_ids = list(dict.fromkeys(user.synced_calendars or [])) or ['primary']
             print(f"[Worker] Syncing {len(calendar_ids)} calendars: {calendar_ids}")
-            
+
+            states = {cal_id: get_sync_state(db, user_id, cal_id) for cal_id in calendar_ids}
+            db.commit()  # persist new states so a failed calendar's rollback can't drop them
+            fetched = await fetch_all_calendars(
+                lambda: build_service('calendar', 'v3', creds),
+                {cal_id: state.sync_token for cal_id, state in states.items()},
+            )
+
             total_synced = 0
-            for cal_id in calendar_ids:
+            total_deleted = 0
+            failed_calendars = []
+            for cal_id, changes in fetched.items():
+                if isinstance(changes, Exception):
+                    print(f"[Worker] Error syncing calendar {cal_id}: {changes}")
+                    failed_calendars.append(cal_id)
+                    continue
                 try:
-                    events_result = service.events().list(
-                        calendarId=cal_id, 
-                        maxResults=50, 
-                        singleEvents=True, 
-                        orderBy='startTime',
-                        timeMin=datetime.now(timezone.utc).isoformat()
-                    ).execute()
-                    events = events_result.get('items', [])
-                    print(f"[Worker] Found {len(events)} events in calendar {cal_id}")
-                    
-                    for g_event in events:
-                        # Visibility: 'private' or 'confidential' should be skipped
-                        visibility = g_event.get('visibility', 'default')
-                        if visibility in ['private', 'confidential']:
-                            continue
-
-                        start = g_event['start'].get('dateTime', g_event['start'].get('date'))
-                        end = g_event['end'].get('dateTime', g_event['end'].get('date'))
-                        
-                        event_id = g_event['id']
-                        db_event = db.query(Event).filter(Event.google_event_id == event_id).first()
-                        
-                        if not db_event:
-                            db_event = Event(
-                                google_event_id=event_id,
-                                summary=g_event.get('summary', '(No Title)'),
-                                start_time=start,
-                                end_time=end,
-                                location=g_event.get('location'),
-                                user_id=user_id
-                            )
-                            db.add(db_event)
-                        else:
-                            db_event.summary = g_event.get('summary', '(No Title)')
-                            db_event.start_time = start
-                            db_event.end_time = end
-                            db_event.location = g_event.get('location')
-                    
-                    total_synced += len(events)
+                    with span("calendar.apply", calendar_id=cal_id, full_sync=changes.full_sync):
+                        result = apply_calendar_changes(db, user_id, changes, states[cal_id])
+                        db.commit()
+                    kind = "full" if changes.full_sync else "incremental"
+                    print(f"[Worker] {kind.capitalize()} sync of calendar {cal_id}: "
+                          f"{result['upserted']} changed, {result['deleted']} removed")
+                    total_synced += result["upserted"]
+                    total_deleted += result["deleted"]
                 except Exception as e:
+                    db.rollback()
                     print(f"[Worker] Error syncing calendar {cal_id}: {e}")
-            
-            db.commit()
-            print(f"[Worker] Successfully synced {total_synced} total events for user {user.email}")
-            
+                    failed_calendars.append(cal_id)
+
+            print(f"[Worker] Successfully synced {total_synced} changed and {total_deleted} removed events for user {user.email}")
+
             # Broadcast update
-            from .services.rabbitmq import send_sync_message
             await send_sync_message("dashboard_refresh", {"user_id": user_id}, routing_key="broadcast_queue")
-        except Exception as e:
-            print(f"[Worker] Fatal error in calendar_sync: {e}")
+            if failed_calendars:
+                # Synced calendars keep their new tokens, so a retry only refetches the failed ones' changes
+                raise RuntimeError(f"calendar_sync failed for calendars {failed_calendars}")
+
+        elif msg_type == "tasks_sync":
+            # Runs in a thread: the Tasks API calls are blocking and this session is ours alone
+            with span("tasks.sync"):
+                result = await asyncio.to_thread(
+                    lambda: sync_tasks(db, build_service('tasks', 'v1', creds), user_id)
+                )
+                db.commit()
+            print(f"[Worker] Synced tasks for user {user.email}: {result['pushed']} pushed, "
+                  f"{result['upserted']} changed, {result['deleted']} removed")
 
-    elif msg_type == "tasks_sync":
-        try:
-            # ...
-            db.commit()
-            print(f"[Worker] Synced tasks for user {user.email}")
-            
             # Broadcast update
-            from .services.rabbitmq import send_sync_message
             await send_sync_message("dashboard_refresh", {"user_id": user_id}, routing_key="broadcast_queue")
-        except Exception as e:
-            print(f"[Worker] Error in tasks_sync: {e}")
 
-    elif msg_type == "go4schools_sync":
-        try:
+        elif msg_type == "go4schools_sync":
             from .services.go4schools import scrape_homework
-            result = await scrape_homework(user, db)
+            with track_call("go4schools", "scrape_homework"):
+                result = await scrape_homework(user, db)
             prefs = dict(user.preferences or {})
             if result["error"]:
+                EXTERNAL_CALL_FAILURES.labels("go4schools", "scrape_homework").inc()
                 prefs["go4schools_error"] = result["error"]
                 print(f"[Worker] Go4Schools error for {user.email}: {result['error']}")
             else:
@@ -212,32 +213,126 @@ async def process_sync(message_body: dict):
             db.add(user)
             db.commit()
 
-            from .services.rabbitmq import send_sync_message
             await send_sync_message("dashboard_refresh", {"user_id": user_id}, routing_key="broadcast_queue")
-        except Exception as e:
-            print(f"[Worker] Go4Schools fatal error: {e}")
 
-    db.close()
+        elif msg_type == ANALYSIS_JOB:
+            alert = await refresh_analysis(db, user_id)
+            if alert:
+                print(f"[Worker] AI Alert generated for {user.email}: {alert.message}")
+                await send_sync_message("dashboard_refresh", {"user_id": user_id}, routing_key="broadcast_queue")
 
-async def go4schools_daily_sync():
-    """Daily task to sync Go4Schools homework for all connected users."""
-    while True:
-        # Initial delay of 1 hour (offset from chore reset)
-        await asyncio.sleep(3600)
+        if msg_type in ANALYSIS_TRIGGERS:
+            # Best effort on the same lane: the sync itself is done and committed
+            await try_request_sync(db, ANALYSIS_JOB, user_id, lane=lane)
+        succeeded = True
+    except Exception:
+        db.rollback()
+        failed = True
+        raise
+    finally:
         try:
-            db: Session = SessionLocal()
-            users = db.query(User).filter(User.go4schools_email.isnot(None)).all()
-            for user in users:
-                from .services.rabbitmq import send_sync_message
-                await send_sync_message("go4schools_sync", {"user_id": user.id})
-                print(f"[Worker] Queued Go4Schools sync for {user.email}")
+            # A raised failure is retried by handle_message, which forgets the request if it dead-letters
+            rerun_lane = user and finish_sync(db, msg_type, user_id, succeeded, retrying=failed)
+            if rerun_lane:
+                print(f"[Worker] {msg_type} was triggered again while running, queueing another run")
+                await send_sync_message(msg_type, {"user_id": user_id}, routing_key=SYNC_LANES[rerun_lane])
+        finally:
             db.close()
-        except Exception as e:
-            print(f"[Worker] Error in go4schools_daily_sync: {e}")
-        # Wait remaining ~23 hours
-        await asyncio.sleep(82800)
+
+async def queue_go4schools_syncs():
+    """Queue a Go4Schools homework sync for every connected user on the batch lane."""
+    db: Session = SessionLocal()
+    try:
+        users = db.query(User).filter(User.go4schools_email.isnot(None)).all()
+        queued = await request_syncs(db, [("go4schools_sync", user.id) for user in users], lane="batch")
+        print(f"[Worker] Queued Go4Schools sync for {queued} of {len(users)} users")
+    finally:
+        db.close()
+
+async def prune_llm_cache():
+    """Drop expired LLM replies from the shared cache table."""
+    deleted = llm_cache.prune()
+    if deleted:
+        print(f"[Worker] Pruned {deleted} expired LLM cache entries")
+
+# Cron schedules are in the server's local time. Run times are stored in the
+# database, so every replica can start the scheduler and each run happens once.
+SCHEDULED_JOBS = [
+    Job("reset_chores", "0 * * * *", reset_chores, jitter=60),
+    Job("ai_analysis", "15 * * * *", run_ai_analysis, jitter=300),
+    Job("go4schools_sync", "0 17 * * *", queue_go4schools_syncs, jitter=600),
+    Job("refresh_google_tokens", "*/5 * * * *", token_manager.refresh_expiring, jitter=30),
+    Job("prune_llm_cache", "30 3 * * *", prune_llm_cache, jitter=300),
+]
+
+def forget_dead_letter(body: dict):
+    """Let new triggers queue a sync again once its message has been dead-lettered."""
+    user_id = (body.get("data") or {}).get("user_id")
+    if user_id is None:
+        return
+    db: Session = SessionLocal()
+    try:
+        forget_sync(db, str(body.get("type")), user_id)
+    finally:
+        db.close()
+
+async def handle_message(message, queue_name: str):
+    # If scheduling the retry itself fails, put the message back rather than lose it
+    async with message.process(requeue=True):
+        try:
+            body = json.loads(message.body.decode())
+            if not isinstance(body, dict):
+                raise ValueError("expected a JSON object")
+        except ValueError as e:
+            MESSAGES_FAILED.labels(queue_name, "invalid", "dead_lettered").inc()
+            await dead_letter(message, queue_name, f"Invalid message body: {e}")
+            return
+        msg_type = str(body.get("type"))
+        headers = message.headers or {}
+        MESSAGES_CONSUMED.labels(queue_name, msg_type).inc()
+        lag = None
+        # Retries carry an attempt header; their wait is mostly the deliberate retry delay
+        if message.timestamp and "x-attempt" not in headers:
+            lag = max(0.0, time.time() - message.timestamp.timestamp())
+            QUEUE_LAG.labels(queue_name).observe(lag)
+        started = time.perf_counter()
+        with span(f"process {msg_type}", traceparent=headers.get(TRACEPARENT), queue=queue_name,
+                  attempt=int(headers.get("x-attempt", 1)), queue_lag_ms=round((lag or 0) * 1000)):
+            try:
+                await process_sync(body, lane=LANE_OF_QUEUE.get(queue_name, "interactive"))
+            except Exception as e:
+                print(f"[Worker] {msg_type} failed: {e}")
+                retried = await retry_or_dead_letter(message, queue_name, e)
+                MESSAGES_FAILED.labels(queue_name, msg_type, "retried" if retried else "dead_lettered").inc()
+                if not retried:
+                    forget_dead_letter(body)
+            finally:
+                MESSAGE_DURATION.labels(msg_type).observe(time.perf_counter() - started)
+
+async def consume(connection, queue_name: str):
+    """Process messages from one queue, one at a time."""
+    channel = await connection.channel()
+    await channel.set_qos(prefetch_count=1)
+    queue = await channel.declare_queue(queue_name)
+    async with queue.iterator() as queue_iter:
+        async for message in queue_iter:
+            await handle_message(message, queue_name)
+
+async def monitor_queue_depth(connection, interval: int = 15):
+    """Keep the queue depth gauges current for every sync lane."""
+    channel = await connection.channel()
+    while True:
+        for queue_name in SYNC_LANES.values():
+            try:
+                queue = await channel.declare_queue(queue_name, passive=True)
+                QUEUE_DEPTH.labels(queue_name).set(queue.declaration_result.message_count)
+            except Exception as e:
+                print(f"[Worker] Could not read depth of {queue_name}: {e}")
+                channel = await connection.channel()
+        await asyncio.sleep(interval)
 
 async def main():
+    set_service_name("worker")
     for i in range(10):
         try:
             connection = await aio_pika.connect_robust(settings.RABBITMQ_URL)
@@ -250,17 +345,23 @@ async def main():
         return
 
     channel = await connection.channel()
-    queue = await channel.declare_queue("sync_queue")
+    for queue_name in SYNC_LANES.values():
+        await channel.declare_queue(queue_name)
+        await declare_retry_queues(channel, queue_name)
+    await publisher.start()
 
-    # Start recurring reset task
-    asyncio.create_task(reset_chores_task())
-    asyncio.create_task(go4schools_daily_sync())
+    asyncio.create_task(Scheduler(SCHEDULED_JOBS).run())
+    asyncio.create_task(monitor_queue_depth(connection))
+    start_http_server(settings.WORKER_METRICS_PORT)
+    print(f"[Worker] Serving metrics on port {settings.WORKER_METRICS_PORT}")
 
-    async with queue.iterator() as queue_iter:
-        async for message in queue_iter:
-            async with message.process():
-                body = json.loads(message.body.decode())
-                await process_sync(body)
+    # Interactive syncs get their own consumers, so they never wait behind the batch backlog
+    consumers = [consume(connection, SYNC_LANES["interactive"]) for _ in range(settings.SYNC_INTERACTIVE_CONSUMERS)]
+    consumers.append(consume(connection, SYNC_LANES["batch"]))
+    try:
+        await asyncio.gather(*consumers)
+    finally:
+        await browser_pool.close()
 
 if __name__ == "__main__":
     asyncio.run(main())
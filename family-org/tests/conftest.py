@@ -0,0 +1,11 @@
+import os
+import sys
+import tempfile
+
+# Unit tests import the backend package directly and run against a throwaway
+# SQLite database instead of the Postgres container.
+BACKEND_DIR = os.path.join(os.path.dirname(__file__), "..", "backend")
+sys.path.insert(0, os.path.abspath(BACKEND_DIR))
+
+_db_file = os.path.join(tempfile.mkdtemp(), "family_org_test.db")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_db_file}")
@@ -0,0 +1,190 @@
+"""In-memory stand-ins for the Google APIs used by the sync worker."""
+import copy
+import time
+from datetime import datetime, timedelta
+import httplib2
+from googleapiclient.errors import HttpError
+
+EPOCH = datetime(2030, 1, 1)
+
+
+class _Request:
+    def __init__(self, fn, kwargs):
+        self._fn = fn
+        self._kwargs = kwargs
+
+    def execute(self):
+        return self._fn(**self._kwargs)
+
+
+def _http_error(status, message):
+    body = f'{{"error": {{"code": {status}, "message": "{message}"}}}}'.encode()
+    return HttpError(httplib2.Response({"status": status}), body)
+
+
+class FakeCalendarService:
+    """Mimics `build('calendar', 'v3')` for `events().list` with sync tokens.
+
+    Every mutation bumps a version counter; a sync token is the version at the
+    time it was issued, so an incremental list returns events changed since.
+    """
+
+    def __init__(self):
+        self.version = 0
+        self.calendars = {}  # calendar_id -> {event_id: (version, event)}
+        self.expired_tokens = set()
+        self.failing_calendars = set()
+        self.list_calls = []
+        self.latency = 0.0  # seconds slept per list call, to exercise concurrency
+
+    # -- test helpers --
+
+    def put_event(self, calendar_id, event_id, summary, start="2030-01-01T10:00:00+00:00",
+                  end="2030-01-01T11:00:00+00:00", **extra):
+        self.version += 1
+        event = {
+            "id": event_id,
+            "status": "confirmed",
+            "summary": summary,
+            "start": {"dateTime": start},
+            "end": {"dateTime": end},
+            "etag": f'"{self.version}"',
+            "updated": (EPOCH + timedelta(seconds=self.version)).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            **extra,
+        }
+        self.calendars.setdefault(calendar_id, {})[event_id] = (self.version, event)
+
+    def cancel_event(self, calendar_id, event_id):
+        self.version += 1
+        _, event = self.calendars[calendar_id][event_id]
+        event = {"id": event_id, "status": "cancelled", "etag": f'"{self.version}"'}
+        self.calendars[calendar_id][event_id] = (self.version, event)
+
+    def drop_event(self, calendar_id, event_id):
+        """Remove an event without leaving a tombstone (only visible to full syncs)."""
+        self.calendars[calendar_id].pop(event_id)
+
+    # -- API surface --
+
+    def events(self):
+        return self
+
+    def list(self, **kwargs):
+        return _Request(self._list, kwargs)
+
+    def _list(self, calendarId, syncToken=None, pageToken=None, maxResults=250, timeMin=None, **_):
+        self.list_calls.append({"calendarId": calendarId, "syncToken": syncToken, "pageToken": pageToken})
+        time.sleep(self.latency)
+        if calendarId in self.failing_calendars:
+            raise _http_error(500, "Backend Error")
+        if syncToken in self.expired_tokens:
+            raise _http_error(410, "Gone")
+
+        entries = sorted(self.calendars.get(calendarId, {}).values(), key=lambda e: e[0])
+        if syncToken:
+            since = int(syncToken)
+            items = [e for v, e in entries if v > since]
+        else:
+            items = [e for v, e in entries if e["status"] != "cancelled"]
+            if timeMin:
+                items = [e for e in items if e["start"]["dateTime"] >= timeMin]
+
+        offset = int(pageToken or 0)
+        page = items[offset:offset + maxResults]
+        result = {"items": copy.deepcopy(page)}
+        if offset + maxResults < len(items):
+            result["nextPageToken"] = str(offset + maxResults)
+        else:
+            result["nextSyncToken"] = str(self.version)
+        return result
+
+
+class _Batch:
+    def __init__(self, service, callback):
+        self._service = service
+        self._callback = callback
+        self._requests = []
+
+    def add(self, request, request_id=None, callback=None):
+        self._requests.append((request_id or str(len(self._requests)), request, callback or self._callback))
+
+    def execute(self):
+        self._service.batch_sizes.append(len(self._requests))
+        for request_id, request, callback in self._requests:
+            try:
+                response, exception = request.execute(), None
+            except HttpError as e:
+                response, exception = None, e
+            callback(request_id, response, exception)
+
+
+class FakeTasksService:
+    """Mimics `build('tasks', 'v1')` for list with `updatedMin`, patch and batch requests."""
+
+    def __init__(self):
+        self.clock = 0
+        self.store = {}  # task_id -> task
+        self.list_calls = []
+        self.batch_sizes = []
+
+    def _tick(self):
+        self.clock += 1
+        return (EPOCH + timedelta(seconds=self.clock)).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+    # -- test helpers --
+
+    def put_task(self, task_id, title, status="needsAction", **extra):
+        updated = self._tick()
+        self.store[task_id] = {
+            "id": task_id,
+            "title": title,
+            "status": status,
+            "updated": updated,
+            "etag": f'"{updated}"',
+            **({"completed": updated} if status == "completed" else {}),
+            **extra,
+        }
+
+    def delete_task(self, task_id):
+        updated = self._tick()
+        self.store[task_id].update(deleted=True, updated=updated, etag=f'"{updated}"')
+
+    # -- API surface --
+
+    def tasks(self):
+        return self
+
+    def list(self, **kwargs):
+        return _Request(self._list, kwargs)
+
+    def patch(self, **kwargs):
+        return _Request(self._patch, kwargs)
+
+    def new_batch_http_request(self, callback=None):
+        return _Batch(self, callback)
+
+    def _list(self, tasklist, updatedMin=None, pageToken=None, maxResults=100, **_):
+        self.list_calls.append({"tasklist": tasklist, "updatedMin": updatedMin, "pageToken": pageToken})
+        items = sorted(self.store.values(), key=lambda t: t["updated"])
+        if updatedMin:
+            items = [t for t in items if t["updated"] >= updatedMin]
+        offset = int(pageToken or 0)
+        result = {"items": copy.deepcopy(items[offset:offset + maxResults])}
+        if offset + maxResults < len(items):
+            result["nextPageToken"] = str(offset + maxResults)
+        return result
+
+    def _patch(self, tasklist, task, body):
+        if task not in self.store:
+            raise _http_error(404, "Not Found")
+        current = self.store[task]
+        for key, value in body.items():
+            if value is None:
+                current.pop(key, None)
+            else:
+                current[key] = value
+        updated = self._tick()
+        current.update(updated=updated, etag=f'"{updated}"')
+        if current["status"] == "completed":
+            current.setdefault("completed", updated)
+        return copy.deepcopy(current)
@@ -0,0 +1,55 @@
+import unittest
+
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+from sqlalchemy import text
+
+from app.database import get_db
+from app.services.metrics import MetricsMiddleware
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def make_app():
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/metrics-test/{item_id}")
+    def read_item(item_id: int, db=Depends(get_db)):
+        for _ in range(3):
+            db.execute(text("SELECT 1"))
+        return {"item_id": item_id, "padding": "x" * 100}
+
+    return app
+
+
+class TestApiMetrics(unittest.TestCase):
+    def setUp(self):
+        self.client = TestClient(make_app())
+
+    def test_requests_are_labelled_by_route_template(self):
+        labels = {"method": "GET", "route": "/metrics-test/{item_id}"}
+        before = sample("http_requests_total", status="200", **labels)
+
+        self.client.get("/metrics-test/1")
+        self.client.get("/metrics-test/2")
+
+        self.assertEqual(sample("http_requests_total", status="200", **labels) - before, 2)
+        self.assertGreater(sample("http_response_size_bytes_sum", **labels), 100)
+        self.assertGreater(sample("http_request_db_seconds_sum", **labels), 0)
+        self.assertEqual(sample("http_requests_in_flight"), 0)
+
+    def test_unknown_paths_share_one_label(self):
+        before = sample("http_requests_total", method="GET", route="unmatched", status="404")
+
+        self.client.get("/no-such-page/123")
+        self.client.get("/no-such-page/456")
+
+        self.assertEqual(sample("http_requests_total", method="GET", route="unmatched", status="404") - before, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,129 @@
+import asyncio
+import unittest
+
+from prometheus_client import REGISTRY
+
+from app.services.browser_pool import BrowserPool
+
+
+def launches(reason):
+    return REGISTRY.get_sample_value("browser_launches_total", {"reason": reason}) or 0
+
+
+class FakeContext:
+    def __init__(self, browser):
+        self.browser = browser
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+        self.browser.open_contexts -= 1
+
+
+class FakeBrowser:
+    def __init__(self, fail_contexts=0):
+        self.connected = True
+        self.closed = False
+        self.open_contexts = 0
+        self.peak = 0
+        self.fail_contexts = fail_contexts
+
+    def is_connected(self):
+        return self.connected
+
+    async def new_context(self, **options):
+        if self.fail_contexts:
+            self.fail_contexts -= 1
+            raise RuntimeError("Target closed")
+        self.open_contexts += 1
+        self.peak = max(self.peak, self.open_contexts)
+        return FakeContext(self)
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeLauncher:
+    def __init__(self, **browser_options):
+        self.browsers = []
+        self.browser_options = browser_options
+
+    async def __call__(self):
+        browser = FakeBrowser(**self.browser_options)
+        self.browser_options = {}
+        self.browsers.append(browser)
+        return browser
+
+
+class TestBrowserPool(unittest.TestCase):
+    def test_contexts_share_one_browser_up_to_the_cap(self):
+        launcher = FakeLauncher()
+        pool = BrowserPool(concurrency=2, max_uses=100, launcher=launcher)
+        contexts = []
+
+        async def scrape():
+            async with pool.context() as context:
+                contexts.append(context)
+                await asyncio.sleep(0.01)
+
+        async def run():
+            await asyncio.gather(*(scrape() for _ in range(6)))
+            await pool.close()
+
+        asyncio.run(run())
+
+        self.assertEqual(len(launcher.browsers), 1)
+        self.assertEqual(launcher.browsers[0].peak, 2)
+        self.assertTrue(all(c.closed for c in contexts))
+        self.assertTrue(launcher.browsers[0].closed)
+
+    def test_browser_is_recycled_after_max_uses(self):
+        launcher = FakeLauncher()
+        pool = BrowserPool(concurrency=1, max_uses=2, launcher=launcher)
+        before = launches("recycle")
+
+        async def run():
+            for _ in range(5):
+                async with pool.context():
+                    pass
+
+        asyncio.run(run())
+
+        self.assertEqual(len(launcher.browsers), 3)
+        self.assertEqual([b.closed for b in launcher.browsers], [True, True, False])
+        self.assertEqual(launches("recycle") - before, 2)
+
+    def test_retired_browser_waits_for_its_open_contexts(self):
+        launcher = FakeLauncher()
+        pool = BrowserPool(concurrency=2, max_uses=1, launcher=launcher)
+
+        async def run():
+            async with pool.context():
+                async with pool.context():
+                    self.assertFalse(launcher.browsers[0].closed)
+                self.assertFalse(launcher.browsers[0].closed)
+            self.assertTrue(launcher.browsers[0].closed)
+
+        asyncio.run(run())
+
+    def test_dead_browser_is_relaunched(self):
+        launcher = FakeLauncher(fail_contexts=1)
+        pool = BrowserPool(concurrency=1, max_uses=100, launcher=launcher)
+        before = launches("crash")
+
+        async def run():
+            # The first browser can't open a context, so the pool retries on a new one
+            async with pool.context() as context:
+                self.assertIs(context.browser, launcher.browsers[1])
+            launcher.browsers[1].connected = False
+            async with pool.context() as context:
+                self.assertIs(context.browser, launcher.browsers[2])
+
+        asyncio.run(run())
+
+        self.assertEqual(len(launcher.browsers), 3)
+        self.assertEqual(launches("crash") - before, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,166 @@
+import asyncio
+import time
+import unittest
+from unittest import mock
+
+from googleapiclient.errors import HttpError
+
+from app.database import engine, SessionLocal
+from app.models import Base, User, Event, GoogleSyncState
+from app.services.google_calendar import (
+    get_sync_state, fetch_calendar_changes, fetch_all_calendars, apply_calendar_changes
+)
+from fakes import FakeCalendarService
+
+
+class TestIncrementalCalendarSync(unittest.TestCase):
+    def setUp(self):
+        Base.metadata.create_all(bind=engine)
+        self.db = SessionLocal()
+        user = User(google_id="cal-sync", email="cal-sync@example.com", name="Cal Sync")
+        self.db.add(user)
+        self.db.commit()
+        self.user_id = user.id
+        self.google = FakeCalendarService()
+
+    def tearDown(self):
+        self.db.close()
+        Base.metadata.drop_all(bind=engine)
+
+    def sync(self, calendar_id="primary"):
+        state = get_sync_state(self.db, self.user_id, calendar_id)
+        changes = fetch_calendar_changes(self.google, calendar_id, state.sync_token)
+        result = apply_calendar_changes(self.db, self.user_id, changes, state)
+        self.db.commit()
+        return changes, result
+
+    def summaries(self):
+        return sorted(e.summary for e in self.db.query(Event).all())
+
+    def test_first_sync_is_full_and_follows_pages(self):
+        for i in range(300):
+            self.google.put_event("primary", f"ev{i}", f"Event {i}")
+
+        changes, result = self.sync()
+
+        self.assertTrue(changes.full_sync)
+        self.assertEqual(len(changes.pages), 2)
+        self.assertEqual(result["upserted"], 300)
+        self.assertEqual(self.db.query(Event).count(), 300)
+
+    def test_repeat_sync_only_transfers_changes(self):
+        self.google.put_event("primary", "a", "Swimming")
+        self.google.put_event("primary", "b", "Dentist")
+        self.sync()
+
+        self.google.put_event("primary", "b", "Dentist (moved)")
+        changes, result = self.sync()
+
+        self.assertFalse(changes.full_sync)
+        self.assertEqual(self.google.list_calls[-1]["syncToken"], "2")
+        self.assertEqual(result["upserted"], 1)
+        self.assertEqual(self.summaries(), ["Dentist (moved)", "Swimming"])
+
+        _, result = self.sync()
+        self.assertEqual(result, {"upserted": 0, "deleted": 0})
+
+    def test_cancelled_and_private_events_are_removed(self):
+        self.google.put_event("primary", "a", "Swimming")
+        self.google.put_event("primary", "b", "Dentist")
+        self.sync()
+
+        self.google.cancel_event("primary", "a")
+        self.google.put_event("primary", "b", "Dentist", visibility="private")
+        _, result = self.sync()
+
+        self.assertEqual(result["deleted"], 2)
+        self.assertEqual(self.db.query(Event).count(), 0)
+
+    def test_expired_token_falls_back_to_full_resync(self):
+        self.google.put_event("primary", "a", "Swimming")
+        self.google.put_event("primary", "b", "Dentist")
+        self.sync()
+
+        self.google.drop_event("primary", "a")
+        self.google.expired_tokens.add(get_sync_state(self.db, self.user_id, "primary").sync_token)
+        changes, result = self.sync()
+
+        self.assertTrue(changes.full_sync)
+        self.assertEqual(result["deleted"], 1)
+        self.assertEqual(self.summaries(), ["Dentist"])
+        self.assertEqual(get_sync_state(self.db, self.user_id, "primary").sync_token, str(self.google.version))
+
+    def test_full_resync_skips_unchanged_rows(self):
+        self.google.put_event("primary", "a", "Swimming")
+        self.google.put_event("primary", "b", "Dentist")
+        self.sync()
+
+        self.google.put_event("primary", "b", "Dentist (moved)")
+        self.google.expired_tokens.add(get_sync_state(self.db, self.user_id, "primary").sync_token)
+        changes, result = self.sync()
+
+        self.assertTrue(changes.full_sync)
+        self.assertEqual(result["upserted"], 1)
+        self.assertEqual(self.summaries(), ["Dentist (moved)", "Swimming"])
+
+    def test_sync_tokens_are_tracked_per_calendar(self):
+        self.google.put_event("primary", "a", "Swimming")
+        self.google.put_event("school", "b", "Parents evening")
+        self.sync("primary")
+        self.sync("school")
+
+        self.google.put_event("school", "c", "Sports day")
+        changes, result = self.sync("primary")
+        self.assertFalse(changes.full_sync)
+        self.assertEqual(result["upserted"], 0)
+
+        _, result = self.sync("school")
+        self.assertEqual(result["upserted"], 1)
+        self.assertEqual(self.db.query(Event).filter(Event.calendar_id == "school").count(), 2)
+
+    def test_calendars_are_fetched_concurrently(self):
+        calendar_ids = [f"cal{i}" for i in range(5)]
+        for cal_id in calendar_ids:
+            self.google.put_event(cal_id, f"{cal_id}-ev", f"Club {cal_id}")
+        self.google.latency = 0.2
+
+        started = time.perf_counter()
+        fetched = asyncio.run(fetch_all_calendars(lambda: self.google, dict.fromkeys(calendar_ids), concurrency=5))
+        elapsed = time.perf_counter() - started
+
+        self.assertLess(elapsed, 0.6)
+        self.assertEqual(sorted(fetched), calendar_ids)
+        self.assertTrue(all(len(c.pages[0]) == 1 for c in fetched.values()))
+
+    def test_failed_calendar_does_not_block_others(self):
+        self.google.put_event("primary", "a", "Swimming")
+        self.google.failing_calendars.add("school")
+
+        fetched = asyncio.run(fetch_all_calendars(lambda: self.google, {"primary": None, "school": None}))
+
+        self.assertIsInstance(fetched["school"], HttpError)
+        self.assertEqual(len(fetched["primary"].pages[0]), 1)
+
+    def test_repeated_calendar_ids_sync_once(self):
+        from app import worker
+        user = self.db.get(User, self.user_id)
+        user.synced_calendars = ["primary", "school", "primary"]
+        self.db.commit()
+        self.google.put_event("primary", "a", "Swimming")
+        self.google.put_event("school", "b", "Parents evening")
+
+        async def no_broadcast(*args, **kwargs):
+            pass
+
+        with mock.patch.object(worker.token_manager, "get_credentials", mock.AsyncMock()), \
+                mock.patch.object(worker, "build_service", lambda *args: self.google), \
+                mock.patch.object(worker, "send_sync_message", no_broadcast), \
+                mock.patch.object(worker, "try_request_sync", mock.AsyncMock()):
+            asyncio.run(worker.process_sync({"type": "calendar_sync", "data": {"user_id": self.user_id}}))
+
+        self.assertEqual(self.db.query(GoogleSyncState).count(), 2)
+        self.assertEqual(self.summaries(), ["Parents evening", "Swimming"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import asyncio
+import json
+import re
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+from app.database import engine, SessionLocal
+from app.models import Base, User, Event, Chore
+from app.services import ai_agent
+from app.services.ai_agent import FamilyAIAgent, EVENT_BATCH_SIZE
+from app.services.llm_cache import llm_cache
+
+
+class FakeModel:
+    """Answers batch prompts with a keyed object and single prompts with an array."""
+
+    def __init__(self, broken_batches=False):
+        self.broken_batches = broken_batches
+        self.prompts = []
+
+    async def __call__(self, prompt, model=None):
+        self.prompts.append(prompt)
+        numbered = re.findall(r'^(\d+)\. "(.*)"$', prompt, re.MULTILINE)
+        if numbered:
+            if self.broken_batches:
+                return "<think>hmm</think> Sorry, here are some ideas..."
+            return json.dumps({n: [f"Prepare for {summary}"] for n, summary in numbered})
+        summary = re.search(r'^Event: "(.*)"$', prompt, re.MULTILINE).group(1)
+        return f'```json\n["Prepare for {summary}"]\n```'
+
+
+class TestEventBatching(unittest.TestCase):
+    def setUp(self):
+        Base.metadata.create_all(bind=engine)
+        llm_cache.clear_memory()
+        self.db = SessionLocal()
+        self.user = User(google_id="batch", email="batch@example.com", name="Batch")
+        self.db.add(self.user)
+        self.db.flush()
+        start = datetime.now() + timedelta(days=10)
+        # Recurring events share a summary and are only asked about once
+        summaries = [f"Batch event {i}" for i in range(EVENT_BATCH_SIZE + 2)] + ["Batch event 0"]
+        for i, summary in enumerate(summaries):
+            self.db.add(Event(google_event_id=f"batch-{i}", summary=summary, user_id=self.user.id,
+                              start_time=(start + timedelta(hours=i)).isoformat()))
+        self.db.commit()
+
+    def tearDown(self):
+        self.db.close()
+        Base.metadata.drop_all(bind=engine)
+
+    def run_pass(self, fake):
+        with mock.patch.object(ai_agent.ollama, "generate", fake):
+            return asyncio.run(FamilyAIAgent(self.db).generate_family_event_tasks())
+
+    def test_events_are_asked_in_batches(self):
+        fake = FakeModel()
+        created = self.run_pass(fake)
+
+        self.assertEqual(len(fake.prompts), 2)
+        self.assertEqual(len(created), EVENT_BATCH_SIZE + 3)
+        self.assertEqual(
+            self.db.query(Chore).filter(Chore.title == "Prepare for Batch event 11").count(), 1)
+
+    def test_batch_answers_are_cached_per_event(self):
+        self.run_pass(FakeModel())
+        fake = FakeModel()
+        self.run_pass(fake)
+        self.assertEqual(fake.prompts, [])
+
+    def test_unparseable_batch_falls_back_to_single_prompts(self):
+        fake = FakeModel(broken_batches=True)
+        created = self.run_pass(fake)
+
+        unique_events = EVENT_BATCH_SIZE + 2
+        self.assertEqual(len(fake.prompts), 2 + unique_events)
+        self.assertEqual(len(created), unique_events + 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
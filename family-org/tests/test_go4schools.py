@@ -0,0 +1,172 @@
+import asyncio
+import time
+import unittest
+from datetime import timedelta
+from unittest import mock
+
+from prometheus_client import REGISTRY
+
+from app.database import engine, SessionLocal
+from app.models import Base, User
+from app.services import go4schools
+from app.services.browser_pool import BrowserPool
+from app.services.encryption import encrypt
+from app.services.go4schools import HOMEWORK_URL, load_session, session_expiry
+from app.timeutil import utcnow
+
+
+class FakeSite:
+    """Go4Schools as seen through Playwright: a cookie is valid until the site forgets it."""
+
+    def __init__(self, password="secret"):
+        self.password = password
+        self.valid_cookies = set()
+        self.logins = 0
+        self.issued = 0
+
+    async def launch(self):
+        return FakeBrowser(self)
+
+
+class FakeBrowser:
+    def __init__(self, site):
+        self.site = site
+
+    def is_connected(self):
+        return True
+
+    async def new_context(self, storage_state=None):
+        cookies = {c["value"] for c in (storage_state or {}).get("cookies", [])}
+        return FakeContext(self.site, cookies)
+
+    async def close(self):
+        pass
+
+
+class FakeContext:
+    def __init__(self, site, cookies):
+        self.site = site
+        self.cookies = cookies
+
+    async def new_page(self):
+        return FakePage(self)
+
+    async def storage_state(self):
+        return {"cookies": [{"name": "auth", "value": v, "domain": "www.go4schools.com", "expires": -1}
+                            for v in self.cookies], "origins": []}
+
+    async def close(self):
+        pass
+
+
+class FakeLocator:
+    first = property(lambda self: self)
+
+    async def count(self):
+        return 0
+
+
+class FakePage:
+    def __init__(self, context):
+        self.context = context
+        self.url = "about:blank"
+        self.fields = {}
+
+    async def goto(self, url, timeout=None):
+        self.url = url
+
+    async def fill(self, selector, value):
+        self.fields[selector] = value
+
+    async def click(self, selector):
+        site = self.context.site
+        if self.fields.get('input[type="password"]') == site.password:
+            site.logins += 1
+            site.issued += 1
+            cookie = f"cookie-{site.issued}"
+            site.valid_cookies.add(cookie)
+            self.context.cookies = {cookie}
+            self.url = HOMEWORK_URL
+
+    async def wait_for_load_state(self, state, timeout=None):
+        pass
+
+    async def title(self):
+        if self.context.cookies & self.context.site.valid_cookies:
+            return "Homework"
+        return "Sign in"
+
+    def locator(self, selector):
+        return FakeLocator()
+
+
+class TestGo4SchoolsSessions(unittest.TestCase):
+    def setUp(self):
+        Base.metadata.create_all(bind=engine)
+        self.db = SessionLocal()
+        self.user = User(google_id="kid", email="kid@example.com", name="Kid",
+                         go4schools_email="kid@school.org", go4schools_password=encrypt("secret"))
+        self.db.add(self.user)
+        self.db.commit()
+        self.site = FakeSite()
+        patcher = mock.patch.object(go4schools, "browser_pool", BrowserPool(launcher=self.site.launch))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.db.close()
+        Base.metadata.drop_all(bind=engine)
+
+    def scrape(self):
+        result = asyncio.run(go4schools.scrape_homework(self.user, self.db))
+        self.db.commit()
+        return result
+
+    def test_session_is_saved_encrypted_and_reused(self):
+        self.assertEqual(self.scrape(), {"synced": 0, "error": None})
+        self.assertNotIn("cookie-1", self.user.go4schools_session)
+        self.assertEqual(load_session(self.user)["cookies"][0]["value"], "cookie-1")
+
+        self.scrape()
+        self.scrape()
+        self.assertEqual(self.site.logins, 1)
+
+    def test_rejected_session_falls_back_to_login(self):
+        self.scrape()
+        self.site.valid_cookies.clear()
+
+        self.assertEqual(self.scrape()["error"], None)
+        self.assertEqual(self.site.logins, 2)
+        self.assertEqual(load_session(self.user)["cookies"][0]["value"], "cookie-2")
+
+    def test_expired_session_is_not_tried(self):
+        self.scrape()
+        self.user.go4schools_session_expires_at = utcnow() - timedelta(minutes=1)
+        before = REGISTRY.get_sample_value("go4schools_sessions_total", {"result": "expired"}) or 0
+
+        self.scrape()
+        self.assertEqual(self.site.logins, 2)
+        self.assertEqual(REGISTRY.get_sample_value("go4schools_sessions_total", {"result": "expired"}), before + 1)
+
+    def test_failed_login_clears_the_session(self):
+        self.scrape()
+        self.site.valid_cookies.clear()
+        self.site.password = "changed"
+
+        self.assertIn("Login failed", self.scrape()["error"])
+        self.assertIsNone(self.user.go4schools_session)
+
+    def test_expiry_follows_the_earliest_site_cookie(self):
+        soon = time.time() + 600
+        state = {"cookies": [
+            {"domain": ".go4schools.com", "expires": soon},
+            {"domain": ".example.com", "expires": time.time() + 60},
+            {"domain": "www.go4schools.com", "expires": -1},
+        ]}
+        self.assertAlmostEqual((session_expiry(state) - utcnow()).total_seconds(), 600, delta=5)
+        # Without dated cookies the TTL decides, and it outlasts the gap between nightly scrapes
+        self.assertGreater(session_expiry({"cookies": []}), utcnow() + timedelta(hours=25))
+
+
+if __name__ == "__main__":
+    unittest.main()
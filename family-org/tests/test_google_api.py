@@ -0,0 +1,53 @@
+import threading
+import unittest
+from unittest import mock
+
+from google.oauth2.credentials import Credentials
+
+from app.services import google_api
+from app.services.google_api import build_service
+
+
+def transport_of(service):
+    # The service's AuthorizedHttp wraps the shared httplib2 transport
+    return service._http.http
+
+
+class TestBuildService(unittest.TestCase):
+    def setUp(self):
+        google_api._discovery_document.cache_clear()
+        self.addCleanup(google_api._discovery_document.cache_clear)
+        self.credentials = Credentials(token="token")
+
+    def test_discovery_document_is_loaded_once(self):
+        get_static_doc = mock.Mock(wraps=google_api.discovery_cache.get_static_doc)
+        with mock.patch.object(google_api.discovery_cache, "get_static_doc", get_static_doc), \
+                mock.patch.object(google_api.json, "loads", wraps=google_api.json.loads) as loads:
+            for _ in range(3):
+                service = build_service("calendar", "v3", self.credentials)
+                self.assertTrue(hasattr(service, "events"))
+
+        get_static_doc.assert_called_once_with("calendar", "v3")
+        self.assertEqual(loads.call_count, 1)
+
+    def test_each_thread_reuses_its_own_transport(self):
+        transports = {}
+
+        def build_twice(name):
+            first = transport_of(build_service("tasks", "v1", self.credentials))
+            second = transport_of(build_service("calendar", "v3", self.credentials))
+            transports[name] = (first, second)
+
+        threads = [threading.Thread(target=build_twice, args=(name,)) for name in ("a", "b")]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        for first, second in transports.values():
+            self.assertIs(first, second)
+        self.assertIsNot(transports["a"][0], transports["b"][0])
+
+
+if __name__ == "__main__":
+    unittest.main()
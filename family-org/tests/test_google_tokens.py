@@ -0,0 +1,83 @@
+import asyncio
+import time
+import unittest
+from datetime import timedelta
+from unittest import mock
+
+from google.oauth2.credentials import Credentials
+
+from app.database import engine, SessionLocal
+from app.models import Base, User
+from app.services.google_tokens import GoogleTokenManager
+from app.timeutil import utcnow
+
+
+def fake_refresh(creds, request):
+    time.sleep(0.05)
+    creds.token = f"token-{fake_refresh.calls}"
+    creds.expiry = utcnow() + timedelta(hours=1)
+    fake_refresh.calls += 1
+
+
+class TestGoogleTokenManager(unittest.TestCase):
+    def setUp(self):
+        Base.metadata.create_all(bind=engine)
+        self.db = SessionLocal()
+        self.user = User(google_id="tokens", email="tokens@example.com", name="Tokens",
+                         google_access_token="stale", google_refresh_token="refresh",
+                         google_token_expiry=utcnow() - timedelta(minutes=1))
+        self.db.add(self.user)
+        self.db.commit()
+        self.manager = GoogleTokenManager()
+        fake_refresh.calls = 0
+        patcher = mock.patch.object(Credentials, "refresh", fake_refresh)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.db.close()
+        Base.metadata.drop_all(bind=engine)
+
+    def test_concurrent_callers_share_one_refresh(self):
+        async def fetch_many():
+            return await asyncio.gather(*(self.manager.get_credentials(self.db, self.user) for _ in range(5)))
+
+        results = asyncio.run(fetch_many())
+
+        self.assertEqual(fake_refresh.calls, 1)
+        self.assertTrue(all(creds is results[0] for creds in results))
+        self.db.refresh(self.user)
+        self.assertEqual(self.user.google_access_token, "token-0")
+        self.assertIsNotNone(self.user.google_token_expiry)
+
+    def test_valid_token_is_served_from_cache(self):
+        self.user.google_access_token = "fresh"
+        self.user.google_token_expiry = utcnow() + timedelta(hours=1)
+        self.db.commit()
+
+        creds = asyncio.run(self.manager.get_credentials(self.db, self.user))
+
+        self.assertEqual(creds.token, "fresh")
+        self.assertEqual(fake_refresh.calls, 0)
+
+    def test_background_pass_refreshes_expiring_tokens(self):
+        self.user.google_token_expiry = utcnow() + timedelta(minutes=10)
+        self.db.commit()
+
+        refreshed = asyncio.run(self.manager.refresh_expiring())
+
+        self.assertEqual(refreshed, 1)
+        self.assertEqual(fake_refresh.calls, 1)
+
+    def test_background_pass_only_counts_real_refreshes(self):
+        asyncio.run(self.manager.refresh_expiring())
+        # The row looks close to expiry again, but this process holds a fresh token
+        self.user.google_token_expiry = utcnow() + timedelta(minutes=10)
+        self.db.commit()
+
+        self.assertEqual(asyncio.run(self.manager.refresh_expiring()), 0)
+        self.assertEqual(fake_refresh.calls, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
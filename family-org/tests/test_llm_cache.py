@@ -0,0 +1,113 @@
+import asyncio
+import threading
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+from prometheus_client import REGISTRY
+
+from app.database import engine, SessionLocal
+from app.models import Base, User, Event, LLMCacheEntry
+from app.services import ai_agent
+from app.services.ai_agent import FamilyAIAgent
+from app.services.llm_cache import LLMCache, cache_key, llm_cache
+from app.timeutil import utcnow
+
+
+def cache_hits(result):
+    return REGISTRY.get_sample_value("llm_cache_requests_total", {"result": result}) or 0.0
+
+
+class TestLLMCache(unittest.TestCase):
+    def setUp(self):
+        Base.metadata.create_all(bind=engine)
+        self.cache = LLMCache(max_memory=2, ttl=3600)
+
+    def tearDown(self):
+        Base.metadata.drop_all(bind=engine)
+
+    def test_key_ignores_whitespace_but_not_model(self):
+        self.assertEqual(cache_key("m", "  Hello\n   world "), cache_key("m", "Hello world"))
+        self.assertNotEqual(cache_key("m", "Hello"), cache_key("other", "Hello"))
+
+    def test_memory_then_database_then_miss(self):
+        self.cache.put("m", "prompt", "reply")
+        memory_before, db_before = cache_hits("memory"), cache_hits("db")
+
+        self.assertEqual(self.cache.get("m", "prompt"), "reply")
+        self.cache.clear_memory()
+        self.assertEqual(self.cache.get("m", "prompt"), "reply")
+        self.assertIsNone(self.cache.get("m", "other prompt"))
+
+        self.assertEqual(cache_hits("memory") - memory_before, 1)
+        self.assertEqual(cache_hits("db") - db_before, 1)
+
+    def test_expired_entries_miss_and_are_pruned(self):
+        self.cache.put("m", "prompt", "reply")
+        self.cache.clear_memory()
+        db = SessionLocal()
+        db.query(LLMCacheEntry).update({"expires_at": utcnow() - timedelta(seconds=1)})
+        db.commit()
+        db.close()
+
+        self.assertIsNone(self.cache.get("m", "prompt"))
+        self.assertEqual(self.cache.prune(), 1)
+
+    def test_async_access_keeps_the_database_off_the_event_loop(self):
+        threads = []
+        db_get, db_put = self.cache._db_get, self.cache._db_put
+
+        def record(method):
+            def wrapper(*args):
+                threads.append(threading.current_thread())
+                return method(*args)
+            return wrapper
+
+        async def run():
+            await self.cache.aput("m", "prompt", "reply")
+            self.cache.clear_memory()
+            return await self.cache.aget("m", "prompt")
+
+        with mock.patch.object(self.cache, "_db_get", record(db_get)), \
+                mock.patch.object(self.cache, "_db_put", record(db_put)):
+            self.assertEqual(asyncio.run(run()), "reply")
+        self.assertEqual(len(threads), 2)
+        self.assertNotIn(threading.main_thread(), threads)
+
+    def test_memory_is_bounded(self):
+        for i in range(3):
+            self.cache.put("m", f"prompt {i}", f"reply {i}")
+        self.assertEqual(len(self.cache._memory), 2)
+
+
+class TestAgentUsesCache(unittest.TestCase):
+    def setUp(self):
+        Base.metadata.create_all(bind=engine)
+        llm_cache.clear_memory()
+        self.db = SessionLocal()
+        self.user = User(google_id="cache", email="cache@example.com", name="Cache")
+        self.db.add(self.user)
+        self.db.flush()
+        start = datetime.now() + timedelta(days=10)
+        for i in range(3):
+            self.db.add(Event(google_event_id=f"cache-{i}", summary=f"Cached event {i}", user_id=self.user.id,
+                              start_time=(start + timedelta(hours=i)).isoformat()))
+        self.db.commit()
+
+    def tearDown(self):
+        self.db.close()
+        Base.metadata.drop_all(bind=engine)
+
+    def test_second_pass_skips_the_model(self):
+        fake = mock.AsyncMock(return_value='["Pack a bag"]')
+        with mock.patch.object(ai_agent.ollama, "generate", fake):
+            asyncio.run(FamilyAIAgent(self.db).generate_family_event_tasks())
+            first_pass = fake.await_count
+            asyncio.run(FamilyAIAgent(self.db).generate_family_event_tasks())
+
+        self.assertGreater(first_pass, 0)
+        self.assertEqual(fake.await_count, first_pass)
+
+
+if __name__ == "__main__":
+    unittest.main()
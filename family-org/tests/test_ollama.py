@@ -0,0 +1,155 @@
+import asyncio
+import json
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+import httpx
+from prometheus_client import REGISTRY
+
+from app.database import engine, SessionLocal
+from app.models import Base, User, Event, Chore
+from app.services import ai_agent
+from app.services.ai_agent import FamilyAIAgent
+from app.services.llm_cache import llm_cache
+from app.services.ollama import OllamaClient
+
+
+class FakeOllama:
+    """Mock transport that answers after a delay and records peak concurrency."""
+
+    def __init__(self, reply="[]", delay=0.05, status=200):
+        self.reply = reply
+        self.delay = delay
+        self.status = status
+        self.requests = []
+        self.in_flight = 0
+        self.peak = 0
+
+    async def __call__(self, request):
+        self.requests.append(json.loads(request.content))
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        return httpx.Response(self.status, json={"response": self.reply, "eval_count": 3})
+
+    def client(self, concurrency=2):
+        return OllamaClient(host="http://ollama.test", concurrency=concurrency,
+                            transport=httpx.MockTransport(self))
+
+
+class TestOllamaClient(unittest.TestCase):
+    def test_concurrency_is_bounded(self):
+        fake = FakeOllama(reply=" hi ")
+        client = fake.client(concurrency=2)
+
+        async def many():
+            try:
+                return await asyncio.gather(*(client.generate(f"prompt {i}") for i in range(6)))
+            finally:
+                await client.close()
+
+        replies = asyncio.run(many())
+
+        self.assertEqual(replies, ["hi"] * 6)
+        self.assertEqual(fake.peak, 2)
+        self.assertEqual(fake.requests[0]["keep_alive"], "30m")
+        self.assertFalse(fake.requests[0]["stream"])
+
+    def test_errors_return_none(self):
+        client = FakeOllama(status=500).client()
+        self.assertIsNone(asyncio.run(client.generate("prompt")))
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def make_client(self, handler):
+        client = OllamaClient(host="http://ollama.test", transport=httpx.MockTransport(handler))
+        client.breaker._recovery_time = 0.05
+        return client
+
+    def test_opens_after_repeated_failures_and_fails_fast(self):
+        calls = []
+
+        def handler(request):
+            calls.append(request.url.path)
+            return httpx.Response(503)
+
+        client = self.make_client(handler)
+
+        async def run():
+            return [await client.generate("prompt") for _ in range(6)]
+
+        self.assertEqual(asyncio.run(run()), [None] * 6)
+        self.assertEqual(calls, ["/api/generate"] * 3)
+        self.assertEqual(client.breaker.state, "open")
+        self.assertGreaterEqual(
+            REGISTRY.get_sample_value("circuit_breaker_short_circuits_total", {"name": "ollama"}), 3)
+
+    def test_recovers_after_a_healthy_probe(self):
+        healthy = False
+        calls = []
+
+        def handler(request):
+            calls.append(request.url.path)
+            if request.url.path == "/api/tags":
+                return httpx.Response(200, json={"models": [{"name": "deepseek-r1:latest"}]})
+            if not healthy:
+                return httpx.Response(503)
+            return httpx.Response(200, json={"response": "ok"})
+
+        client = self.make_client(handler)
+
+        async def run():
+            nonlocal healthy
+            for _ in range(3):
+                await client.generate("prompt")
+            self.assertEqual(client.breaker.state, "open")
+            healthy = True
+            await asyncio.sleep(0.06)
+            return await client.generate("prompt")
+
+        self.assertEqual(asyncio.run(run()), "ok")
+        self.assertEqual(client.breaker.state, "closed")
+        self.assertEqual(calls[-2:], ["/api/tags", "/api/generate"])
+
+    def test_probe_requires_the_model(self):
+        def handler(request):
+            return httpx.Response(200, json={"models": [{"name": "some-other-model:7b"}]})
+
+        client = self.make_client(handler)
+        self.assertFalse(asyncio.run(client.is_healthy("deepseek-r1")))
+
+
+class TestAgentParallelism(unittest.TestCase):
+    def setUp(self):
+        Base.metadata.create_all(bind=engine)
+        llm_cache.clear_memory()
+        self.db = SessionLocal()
+        self.user = User(google_id="ai", email="ai@example.com", name="Ai")
+        self.db.add(self.user)
+        self.db.flush()
+        start = datetime.now() + timedelta(days=10)
+        for i in range(6):
+            self.db.add(Event(google_event_id=f"ai-{i}", summary=f"Party {i}", user_id=self.user.id,
+                              start_time=(start + timedelta(hours=i)).isoformat()))
+        self.db.commit()
+
+    def tearDown(self):
+        self.db.close()
+        Base.metadata.drop_all(bind=engine)
+
+    def test_event_suggestions_run_concurrently(self):
+        fake = FakeOllama(reply='["Buy a card"]', delay=0.1)
+        with mock.patch.object(ai_agent, "ollama", fake.client(concurrency=3)):
+            created = asyncio.run(FamilyAIAgent(self.db).generate_family_event_tasks())
+
+        self.assertEqual(len(created), 6)
+        self.assertEqual(fake.peak, 3)
+        self.assertEqual(self.db.query(Chore).filter(Chore.source == "ai").count(), 6)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,152 @@
+import asyncio
+import unittest
+from types import SimpleNamespace
+from datetime import datetime, timedelta
+from unittest import mock
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+from app.database import engine, SessionLocal
+from app.models import Base, User, Event, Chore, PrepRule
+from app.routers import settings as settings_router
+from app.routers.auth import get_me
+from app.services import ai_agent
+from app.services.ai_agent import FamilyAIAgent
+from app.services.llm_cache import llm_cache
+from app.services.prep_rules import PrepRuleEngine
+
+
+def decisions(decision):
+    return REGISTRY.get_sample_value("prep_rule_decisions_total", {"decision": decision}) or 0
+
+
+class TestPrepRuleEngine(unittest.TestCase):
+    def setUp(self):
+        Base.metadata.create_all(bind=engine)
+        self.db = SessionLocal()
+        self.rules = PrepRuleEngine()
+        self.rules.refresh(self.db)
+
+    def tearDown(self):
+        self.db.close()
+        Base.metadata.drop_all(bind=engine)
+
+    def test_default_rules(self):
+        self.assertEqual(self.rules.decide("Sarah's Birthday Party"),
+                         ["Buy birthday card for Sarah", "Buy present for Sarah"])
+        self.assertEqual(self.rules.decide("Birthday drinks"), ["Buy birthday card", "Buy present"])
+        self.assertEqual(self.rules.decide("Team standup"), [])
+        self.assertEqual(self.rules.decide("Dentist appointment"), ["Prepare any paperwork or questions"])
+        # Keywords match whole words only
+        self.assertIsNone(self.rules.decide("GPU driver upgrade"))
+        self.assertIsNone(self.rules.decide("Football practice"))
+
+    def test_stored_backreference_rule_is_skipped(self):
+        # Written before rules were validated; it must not break the other rules
+        self.db.add(PrepRule(pattern=r"(\w+) \1", is_regex=True, tasks=["Never"]))
+        self.db.commit()
+        self.rules.refresh(self.db)
+
+        self.assertIsNone(self.rules.decide("bye bye"))
+        self.assertEqual(self.rules.decide("Team standup"), [])
+
+    def test_household_rules_are_picked_up_and_win_ties(self):
+        self.db.add(PrepRule(pattern="dentist", tasks=["Book time off school"]))
+        self.db.add(PrepRule(pattern=r"^swim(ming)? (lesson|gala)", is_regex=True, tasks=["Pack swim kit"]))
+        self.db.commit()
+        self.rules.refresh(self.db)
+
+        self.assertEqual(self.rules.decide("Dentist appointment"), ["Book time off school"])
+        self.assertEqual(self.rules.decide("Swimming lesson"), ["Pack swim kit"])
+
+    def test_hit_rate_metrics(self):
+        before = {d: decisions(d) for d in ("no_prep", "tasks", "llm")}
+
+        for summary in ("Team standup", "Hospital visit", "Hospital visit", "Parents evening"):
+            self.rules.decide(summary)
+
+        self.assertEqual(decisions("no_prep") - before["no_prep"], 1)
+        self.assertEqual(decisions("tasks") - before["tasks"], 2)
+        self.assertEqual(decisions("llm") - before["llm"], 1)
+
+
+class TestRulesGateTheLLM(unittest.TestCase):
+    def setUp(self):
+        Base.metadata.create_all(bind=engine)
+        llm_cache.clear_memory()
+        self.db = SessionLocal()
+        user = User(google_id="rules", email="rules@example.com", name="Rules")
+        self.db.add(user)
+        self.db.flush()
+        start = datetime.now() + timedelta(days=10)
+        for i, summary in enumerate(["Team standup", "Tom's birthday", "Parents evening"]):
+            self.db.add(Event(google_event_id=f"rules-{i}", summary=summary, user_id=user.id,
+                              start_time=(start + timedelta(hours=i)).isoformat()))
+        self.db.commit()
+        patcher = mock.patch.object(ai_agent, "prep_rules", PrepRuleEngine())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.db.close()
+        Base.metadata.drop_all(bind=engine)
+
+    def test_only_unmatched_events_reach_the_llm(self):
+        llm = mock.AsyncMock(return_value='["Write questions for teachers"]')
+        with mock.patch.object(ai_agent.ollama, "generate", llm):
+            asyncio.run(FamilyAIAgent(self.db).generate_family_event_tasks())
+
+        self.assertEqual(llm.await_count, 1)
+        self.assertIn("Parents evening", llm.await_args.args[0])
+        titles = {c.title for c in self.db.query(Chore).filter(Chore.source == "ai")}
+        self.assertEqual(titles, {"Buy birthday card for Tom", "Buy present for Tom",
+                                  "Write questions for teachers"})
+
+    def test_llm_failure_adds_nothing(self):
+        self.db.query(Event).filter(Event.summary != "Parents evening").delete()
+        self.db.commit()
+        with mock.patch.object(ai_agent.ollama, "generate", mock.AsyncMock(return_value=None)):
+            created = asyncio.run(FamilyAIAgent(self.db).generate_family_event_tasks())
+        self.assertEqual(created, [])
+
+
+class TestPrepRuleEndpoints(unittest.TestCase):
+    def setUp(self):
+        Base.metadata.create_all(bind=engine)
+        self.user = SimpleNamespace(id=1, role="parent")
+        app = FastAPI()
+        app.include_router(settings_router.router)
+        app.dependency_overrides[get_me] = lambda: self.user
+        self.client = TestClient(app)
+
+    def tearDown(self):
+        Base.metadata.drop_all(bind=engine)
+
+    def test_create_list_delete(self):
+        created = self.client.post("/settings/prep-rules", json={
+            "pattern": "swimming, gala", "tasks": [" Pack swim kit ", ""], "priority": 5})
+        self.assertEqual(created.status_code, 200)
+        self.assertEqual(created.json()["tasks"], ["Pack swim kit"])
+
+        self.assertEqual([r["pattern"] for r in self.client.get("/settings/prep-rules").json()], ["swimming, gala"])
+        self.assertEqual(self.client.delete(f"/settings/prep-rules/{created.json()['id']}").status_code, 200)
+        self.assertEqual(self.client.get("/settings/prep-rules").json(), [])
+
+    def test_invalid_or_unsafe_regex_is_rejected(self):
+        for pattern in ("(unclosed", r"(a+)+$", r"(\w+) \1", "x" * 201):
+            response = self.client.post("/settings/prep-rules", json={"pattern": pattern, "is_regex": True})
+            self.assertEqual(response.status_code, 400, pattern)
+
+    def test_only_parents_can_change_rules(self):
+        created = self.client.post("/settings/prep-rules", json={"pattern": "swimming"}).json()
+        self.user.role = "member"
+
+        self.assertEqual(self.client.post("/settings/prep-rules", json={"pattern": "gala"}).status_code, 403)
+        self.assertEqual(self.client.delete(f"/settings/prep-rules/{created['id']}").status_code, 403)
+        self.assertEqual(len(self.client.get("/settings/prep-rules").json()), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
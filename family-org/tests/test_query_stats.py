@@ -0,0 +1,81 @@
+import unittest
+
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+from app.database import engine, SessionLocal, get_db
+from app.models import Base, User, Chore
+from app.services.metrics import MetricsMiddleware
+from app.services.query_stats import expect_queries, statement_shape, track_queries
+
+
+def make_app():
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/query-stats/assignees")
+    def assignees(db=Depends(get_db)):
+        # Deliberate N+1: one user lookup per chore
+        return [c.assignee.name for c in db.query(Chore).all()]
+
+    return app
+
+
+class TestQueryStats(unittest.TestCase):
+    def setUp(self):
+        Base.metadata.create_all(bind=engine)
+        self.db = SessionLocal()
+        for i in range(6):
+            user = User(google_id=f"qs-{i}", email=f"qs{i}@example.com", name=f"User {i}")
+            self.db.add(user)
+            self.db.flush()
+            self.db.add(Chore(title=f"Chore {i}", assignee_id=user.id))
+        self.db.commit()
+
+    def tearDown(self):
+        self.db.close()
+        Base.metadata.drop_all(bind=engine)
+
+    def test_shape_ignores_literals_and_in_list_length(self):
+        self.assertEqual(
+            statement_shape("SELECT * FROM users WHERE id IN (?, ?, ?) AND name = 'a'"),
+            statement_shape("SELECT *\n FROM users WHERE id IN (?) AND name = 'bob'"),
+        )
+        self.assertEqual(statement_shape("SELECT * FROM users_1 LIMIT 10"), "SELECT * FROM users_1 LIMIT ?")
+
+    def test_lazy_loads_in_a_loop_are_flagged(self):
+        session = SessionLocal()
+        try:
+            with track_queries() as stats:
+                [c.assignee.name for c in session.query(Chore).all()]
+        finally:
+            session.close()
+
+        self.assertEqual(stats.count, 7)
+        [(shape, repeats)] = stats.n_plus_one_suspects()
+        self.assertEqual(repeats, 6)
+        self.assertIn("FROM users", shape)
+
+    def test_expect_queries_fails_on_n_plus_one(self):
+        session = SessionLocal()
+        try:
+            with self.assertRaises(AssertionError):
+                with expect_queries():
+                    [c.assignee.name for c in session.query(Chore).all()]
+            with self.assertRaises(AssertionError):
+                with expect_queries(max_count=1):
+                    session.query(User).all()
+                    session.query(Chore).all()
+        finally:
+            session.close()
+
+    def test_response_reports_query_count(self):
+        response = TestClient(make_app()).get("/query-stats/assignees")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["x-db-query-count"], "7")
+        self.assertIn("x-db-time-ms", response.headers)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+import asyncio
+import json
+import unittest
+from unittest import mock
+
+from app.services import rabbitmq
+from app.services.rabbitmq import RabbitPublisher
+
+
+class FakeExchange:
+    def __init__(self, channel):
+        self.channel = channel
+
+    async def publish(self, message, routing_key):
+        if self.channel.fail_next:
+            self.channel.fail_next = False
+            raise ConnectionError("channel closed by broker")
+        self.channel.connection.published.append((routing_key, json.loads(message.body)))
+
+
+class FakeChannel:
+    def __init__(self, connection, publisher_confirms):
+        self.connection = connection
+        self.publisher_confirms = publisher_confirms
+        self.default_exchange = FakeExchange(self)
+        self.fail_next = False
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeConnection:
+    def __init__(self):
+        self.channels = []
+        self.published = []
+        self.is_closed = False
+
+    async def channel(self, publisher_confirms=False):
+        channel = FakeChannel(self, publisher_confirms)
+        self.channels.append(channel)
+        return channel
+
+    async def close(self):
+        self.is_closed = True
+
+
+class TestRabbitPublisher(unittest.TestCase):
+    def setUp(self):
+        self.connections = []
+
+        async def connect_robust(url):
+            self.connections.append(FakeConnection())
+            return self.connections[-1]
+
+        patcher = mock.patch.object(rabbitmq.aio_pika, "connect_robust", connect_robust)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.publisher = RabbitPublisher(url="amqp://rabbit.test", pool_size=2)
+
+    def run_with_publisher(self, coro_fn):
+        async def run():
+            try:
+                return await coro_fn()
+            finally:
+                await self.publisher.close()
+        return asyncio.run(run())
+
+    def test_starts_lazily_with_confirmed_channels(self):
+        async def publish():
+            self.assertEqual(self.connections, [])
+            await self.publisher.publish("calendar_sync", {"user_id": 1})
+
+        self.run_with_publisher(publish)
+
+        self.assertEqual(len(self.connections), 1)
+        connection = self.connections[0]
+        self.assertEqual(connection.published, [("sync_queue", {"type": "calendar_sync", "data": {"user_id": 1}})])
+        self.assertTrue(all(c.publisher_confirms for c in connection.channels))
+
+    def test_channels_are_reused(self):
+        async def publish():
+            for user_id in range(10):
+                await self.publisher.publish("calendar_sync", {"user_id": user_id})
+
+        self.run_with_publisher(publish)
+
+        self.assertEqual(len(self.connections), 1)
+        self.assertEqual(len(self.connections[0].channels), 1)
+        self.assertEqual(len(self.connections[0].published), 10)
+
+    def test_channel_goes_back_to_the_pool_after_an_error(self):
+        self.publisher = RabbitPublisher(url="amqp://rabbit.test", pool_size=1)
+
+        async def publish():
+            async with self.publisher.channel() as channel:
+                channel.fail_next = True
+            with self.assertRaises(ConnectionError):
+                await self.publisher.publish("calendar_sync", {"user_id": 1})
+            # With a single channel, this would wait forever had the failed publish kept it
+            await asyncio.wait_for(self.publisher.publish("calendar_sync", {"user_id": 2}), timeout=1)
+
+        self.run_with_publisher(publish)
+
+        self.assertEqual(len(self.connections[0].channels), 1)
+        self.assertEqual(self.connections[0].published, [("sync_queue", {"type": "calendar_sync", "data": {"user_id": 2}})])
+
+    def test_publish_batch_sends_every_message(self):
+        messages = [("tasks_sync", {"user_id": i}) for i in range(25)]
+
+        self.run_with_publisher(lambda: self.publisher.publish_batch(messages, routing_key="sync_queue.batch"))
+
+        published = self.connections[0].published
+        self.assertEqual(len(published), 25)
+        self.assertEqual({key for key, _ in published}, {"sync_queue.batch"})
+        self.assertEqual(sorted(d["data"]["user_id"] for _, d in published), list(range(25)))
+        self.assertEqual(len(self.connections[0].channels), 1)
+
+    def test_close_releases_the_connection_and_channels(self):
+        self.run_with_publisher(lambda: self.publisher.publish("calendar_sync", {"user_id": 1}))
+
+        connection = self.connections[0]
+        self.assertTrue(connection.is_closed)
+        self.assertTrue(all(c.closed for c in connection.channels))
+
+        # A closed publisher reconnects on the next publish
+        self.run_with_publisher(lambda: self.publisher.publish("calendar_sync", {"user_id": 2}))
+        self.assertEqual(len(self.connections), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,298 @@
+import asyncio
+import json
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+import httpx
+
+from app.database import engine, SessionLocal
+from app.models import Base, User, Chore, Alert, ScheduleAnalysis, LLMCacheEntry
+from app.routers import dashboard
+from app.routers.auth import get_me
+from app.services import ai_agent, sync_requests
+from app.services.ai_agent import FamilyAIAgent
+from app.services.llm_cache import llm_cache
+from app.services.ollama import OllamaClient
+from app.services.query_stats import expect_queries
+from app.services.schedule_analysis import request_analysis, refresh_analysis, serialize
+
+
+class TestScheduleAnalysis(unittest.TestCase):
+    def setUp(self):
+        Base.metadata.create_all(bind=engine)
+        llm_cache.clear_memory()
+        self.db = SessionLocal()
+        self.user = User(google_id="busy", email="busy@example.com", name="Busy", threshold_preference=2.0)
+        self.db.add(self.user)
+        self.db.flush()
+        for i in range(4):
+            self.db.add(Chore(title=f"Chore {i}", assignee_id=self.user.id))
+        self.db.commit()
+        self.user_id = self.user.id
+
+        self.published = []
+
+        async def capture(messages, routing_key="sync_queue"):
+            self.published.extend(messages)
+
+        self.llm = mock.AsyncMock(return_value="Pace yourself today.")
+        for patcher in (mock.patch.object(sync_requests, "send_sync_messages", capture),
+                        mock.patch.object(ai_agent.ollama, "generate", self.llm)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.db.close()
+        Base.metadata.drop_all(bind=engine)
+
+    def test_refresh_stores_analysis_and_alerts_once(self):
+        first = asyncio.run(refresh_analysis(self.db, self.user_id))
+        second = asyncio.run(refresh_analysis(self.db, self.user_id))
+
+        self.assertIsNotNone(first)
+        self.assertIsNone(second)
+        self.assertEqual(self.llm.await_count, 1)
+        self.assertEqual(self.db.query(Alert).count(), 1)
+        analysis = serialize(self.db.get(ScheduleAnalysis, self.user_id))
+        self.assertTrue(analysis["busy"])
+        self.assertEqual(analysis["chore_count"], 4)
+        self.assertEqual(analysis["message"], "Pace yourself today.")
+        self.assertEqual(analysis["alert_id"], first.id)
+        self.assertFalse(analysis["stale"])
+
+    def test_recompute_job_completes(self):
+        job_id = asyncio.run(request_analysis(self.db, self.user_id))
+        self.assertEqual(self.published, [("schedule_analysis", {"user_id": self.user_id})])
+        self.assertEqual(serialize(self.db.get(ScheduleAnalysis, self.user_id))["status"], "pending")
+
+        worker_db = SessionLocal()
+        asyncio.run(refresh_analysis(worker_db, self.user_id))
+        worker_db.close()
+
+        self.db.expire_all()
+        analysis = serialize(self.db.get(ScheduleAnalysis, self.user_id))
+        self.assertEqual(analysis["status"], "ready")
+        self.assertEqual(analysis["job_id"], job_id)
+
+    def test_endpoint_serves_stored_analysis_without_computing(self):
+        asyncio.run(refresh_analysis(self.db, self.user_id))
+        self.llm.reset_mock()
+        app = FastAPI()
+        app.include_router(dashboard.router)
+        client = TestClient(app)
+
+        response = client.get(f"/dashboard/ai-analysis/{self.user_id}")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["message"], "Pace yourself today.")
+        self.assertEqual(response.json()["status"], "ready")
+        self.assertEqual(self.llm.await_count, 0)
+        self.assertEqual(self.published, [])
+
+    def test_endpoint_queues_missing_or_stale_analysis(self):
+        app = FastAPI()
+        app.include_router(dashboard.router)
+        client = TestClient(app)
+
+        response = client.get(f"/dashboard/ai-analysis/{self.user_id}")
+        self.assertEqual(response.json()["status"], "pending")
+        self.assertIsNone(response.json()["computed_at"])
+
+        # A second read while the job is queued doesn't queue another
+        client.get(f"/dashboard/ai-analysis/{self.user_id}")
+        self.assertEqual(len(self.published), 1)
+        self.assertEqual(client.get("/dashboard/ai-analysis/9999").status_code, 404)
+
+    def test_read_survives_a_broker_outage(self):
+        async def broken(messages, routing_key="sync_queue"):
+            raise ConnectionError("broker down")
+
+        app = FastAPI()
+        app.include_router(dashboard.router)
+        client = TestClient(app)
+        with mock.patch.object(sync_requests, "send_sync_messages", broken):
+            response = client.get(f"/dashboard/ai-analysis/{self.user_id}")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["status"], "ready")
+        self.db.expire_all()
+        self.assertIsNone(self.db.get(ScheduleAnalysis, self.user_id).requested_job_id)
+
+        # Once the broker is back, the next read queues the recompute
+        self.assertEqual(client.get(f"/dashboard/ai-analysis/{self.user_id}").json()["status"], "pending")
+        self.assertEqual(len(self.published), 1)
+
+    def test_sync_follow_up_stays_on_its_lane(self):
+        routed = []
+
+        async def capture(messages, routing_key="sync_queue"):
+            routed.extend((t, routing_key) for t, _ in messages)
+
+        async def scrape(user, db):
+            return {"synced": 0, "error": None}
+
+        async def no_broadcast(*args, **kwargs):
+            pass
+
+        from app import worker
+        from app.services import go4schools
+        self.user.go4schools_email = "kid@school.org"
+        self.db.commit()
+        with mock.patch.object(sync_requests, "send_sync_messages", capture), \
+                mock.patch.object(go4schools, "scrape_homework", scrape), \
+                mock.patch.object(worker, "send_sync_message", no_broadcast):
+            asyncio.run(worker.process_sync(
+                {"type": "go4schools_sync", "data": {"user_id": self.user_id}}, lane="batch"))
+
+        self.assertEqual(routed, [("schedule_analysis", "sync_queue.batch")])
+
+
+class TestFamilyAnalysis(unittest.TestCase):
+    def setUp(self):
+        Base.metadata.create_all(bind=engine)
+        llm_cache.clear_memory()
+        self.db = SessionLocal()
+        self.llm = mock.AsyncMock(return_value="Pace yourself today.")
+        patcher = mock.patch.object(ai_agent.ollama, "generate", self.llm)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.db.close()
+        Base.metadata.drop_all(bind=engine)
+
+    def add_user(self, name, chores=0, threshold=2.0):
+        user = User(google_id=name, email=f"{name}@example.com", name=name, threshold_preference=threshold)
+        self.db.add(user)
+        self.db.flush()
+        self.db.add_all([Chore(title=f"{name} chore {i}", assignee_id=user.id) for i in range(chores)])
+        self.db.commit()
+        return user.id
+
+    def test_only_busy_users_without_an_alert_reach_the_llm(self):
+        busy = self.add_user("busy", chores=4)
+        alerted = self.add_user("alerted", chores=4)
+        quiet = self.add_user("quiet", chores=1)
+        self.db.add(Alert(user_id=alerted, message="Already warned."))
+        self.db.add(ScheduleAnalysis(user_id=quiet, event_count=0, chore_count=0, busy=False,
+                                     requested_job_id="job-1"))
+        self.db.commit()
+
+        created = asyncio.run(FamilyAIAgent(self.db).analyze_family_schedules())
+
+        self.assertEqual([a.user_id for a in created], [busy])
+        self.assertEqual(self.llm.await_count, 1)
+        rows = {a.user_id: serialize(a) for a in self.db.query(ScheduleAnalysis)}
+        self.assertEqual(rows[busy]["message"], "Pace yourself today.")
+        self.assertEqual(rows[alerted]["message"], "Already warned.")
+        self.assertFalse(rows[quiet]["busy"])
+        self.assertEqual(rows[quiet]["chore_count"], 1)
+        self.assertEqual(rows[quiet]["status"], "ready")
+        self.assertFalse(any(row["stale"] for row in rows.values()))
+
+    def test_queries_do_not_grow_with_users(self):
+        for i in range(8):
+            self.add_user(f"user{i}", chores=1)
+        agent = FamilyAIAgent(self.db)
+
+        for _ in range(2):  # first pass creates the analysis rows, the second updates them
+            with expect_queries(max_count=10, n_plus_one_threshold=3):
+                asyncio.run(agent.analyze_family_schedules())
+                asyncio.run(agent.generate_family_event_tasks())
+
+        self.assertEqual(self.llm.await_count, 0)
+        self.assertEqual(self.db.query(ScheduleAnalysis).count(), 8)
+
+def ndjson_stream(tokens):
+    lines = [json.dumps({"response": t, "done": False}) for t in tokens]
+    lines.append(json.dumps({"response": "", "done": True}))
+    return "\n".join(lines) + "\n"
+
+
+def sse_events(body):
+    events = []
+    for block in body.strip().split("\n\n"):
+        event, data = block.split("\n")
+        events.append((event[len("event: "):], json.loads(data[len("data: "):])))
+    return events
+
+
+class TestStreamingAnalysis(unittest.TestCase):
+    def setUp(self):
+        Base.metadata.create_all(bind=engine)
+        llm_cache.clear_memory()
+        db = SessionLocal()
+        user = User(google_id="stream", email="stream@example.com", name="Stream", threshold_preference=1.0)
+        db.add(user)
+        db.flush()
+        db.add_all([Chore(title="Laundry", assignee_id=user.id), Chore(title="Dishes", assignee_id=user.id)])
+        db.commit()
+        self.user_id = user.id
+        db.close()
+
+        self.tokens = ["Two ", "chores ", "today."]
+        self.body = lambda: ndjson_stream(self.tokens)
+        transport = httpx.MockTransport(lambda request: httpx.Response(200, text=self.body()))
+        patcher = mock.patch.object(ai_agent, "ollama", OllamaClient(host="http://ollama.test", transport=transport))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.app = FastAPI()
+        self.app.include_router(dashboard.router)
+        self.app.dependency_overrides[get_me] = lambda: SimpleNamespace(id=self.user_id, role="parent")
+        self.client = TestClient(self.app)
+
+    def tearDown(self):
+        Base.metadata.drop_all(bind=engine)
+
+    def test_requires_sign_in(self):
+        self.app.dependency_overrides.clear()
+        response = self.client.get(f"/dashboard/ai-analysis/{self.user_id}/stream?refresh=true")
+        self.assertEqual(response.status_code, 401)
+
+    def test_tokens_are_relayed_then_stored(self):
+        response = self.client.get(f"/dashboard/ai-analysis/{self.user_id}/stream")
+
+        self.assertEqual(response.headers["content-type"], "text/event-stream; charset=utf-8")
+        events = sse_events(response.text)
+        self.assertEqual([e for e, _ in events], ["token", "token", "token", "done"])
+        self.assertEqual("".join(d["text"] for e, d in events if e == "token"), "Two chores today.")
+        done = events[-1][1]
+        self.assertEqual(done["message"], "Two chores today.")
+        self.assertTrue(done["busy"])
+        self.assertEqual(done["status"], "ready")
+
+    def test_fresh_analysis_is_sent_without_generating(self):
+        self.client.get(f"/dashboard/ai-analysis/{self.user_id}/stream")
+        self.tokens = ["Should ", "not ", "appear"]
+
+        events = sse_events(self.client.get(f"/dashboard/ai-analysis/{self.user_id}/stream").text)
+
+        self.assertEqual([e for e, _ in events], ["done"])
+        self.assertEqual(events[0][1]["message"], "Two chores today.")
+
+    def test_falls_back_when_the_model_is_silent(self):
+        self.tokens = []
+        events = sse_events(self.client.get(f"/dashboard/ai-analysis/{self.user_id}/stream").text)
+
+        self.assertEqual(events[0], ("token", {"text": "Busy day! 0 events and 2 tasks remaining."}))
+        self.assertEqual(events[-1][1]["message"], "Busy day! 0 events and 2 tasks remaining.")
+
+    def test_a_broken_off_reply_is_not_stored(self):
+        # Ollama went away before sending the `done` line
+        self.body = lambda: "".join(json.dumps({"response": t, "done": False}) + "\n" for t in ["Busy day, ", "take"])
+        events = sse_events(self.client.get(f"/dashboard/ai-analysis/{self.user_id}/stream").text)
+
+        fallback = "Busy day! 0 events and 2 tasks remaining."
+        self.assertEqual(events[-2], ("token", {"text": fallback}))
+        self.assertEqual(events[-1][1]["message"], fallback)
+        db = SessionLocal()
+        self.assertEqual([a.message for a in db.query(Alert).all()], [fallback])
+        self.assertEqual(db.query(LLMCacheEntry).count(), 0)
+        db.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
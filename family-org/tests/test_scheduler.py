@@ -0,0 +1,108 @@
+import asyncio
+import unittest
+from datetime import datetime, timedelta
+
+from app.database import engine, SessionLocal
+from app.models import Base, ScheduledJob
+from app.services.scheduler import Job, Scheduler
+from app.timeutil import utcnow
+
+
+class TestScheduler(unittest.TestCase):
+    def setUp(self):
+        Base.metadata.create_all(bind=engine)
+        self.db = SessionLocal()
+        self.runs = []
+
+    def tearDown(self):
+        self.db.close()
+        Base.metadata.drop_all(bind=engine)
+
+    def make_job(self, name="nightly", schedule="0 3 * * *", fail=False):
+        async def func():
+            self.runs.append(name)
+            if fail:
+                raise RuntimeError("boom")
+        return Job(name, schedule, func)
+
+    def run_due(self, *schedulers, now=None):
+        async def tick():
+            tasks = []
+            for scheduler in schedulers:
+                tasks += await scheduler.run_due(now)
+            await asyncio.gather(*tasks)
+        asyncio.run(tick())
+
+    def make_due(self, name="nightly"):
+        row = self.db.get(ScheduledJob, name)
+        row.next_run_at = utcnow() - timedelta(minutes=1)
+        self.db.commit()
+
+    def test_new_job_waits_for_its_first_slot(self):
+        scheduler = Scheduler([self.make_job()])
+        self.run_due(scheduler)
+
+        self.assertEqual(self.runs, [])
+        row = self.db.get(ScheduledJob, "nightly")
+        self.assertGreater(row.next_run_at, utcnow())
+
+    def test_due_job_runs_once_across_replicas(self):
+        job = self.make_job()
+        first, second = Scheduler([job]), Scheduler([job])
+        first.register(self.db)
+        self.make_due()
+
+        self.run_due(first, second)
+
+        self.assertEqual(self.runs, ["nightly"])
+        self.db.expire_all()
+        row = self.db.get(ScheduledJob, "nightly")
+        self.assertGreater(row.next_run_at, utcnow())
+        self.assertIsNotNone(row.last_run_at)
+        self.assertIsNone(row.last_error)
+
+    def test_missed_runs_collapse_into_one(self):
+        scheduler = Scheduler([self.make_job(schedule="*/5 * * * *")])
+        scheduler.register(self.db)
+        row = self.db.get(ScheduledJob, "nightly")
+        row.next_run_at = utcnow() - timedelta(days=1)
+        self.db.commit()
+
+        self.run_due(scheduler)
+        self.run_due(scheduler)
+
+        self.assertEqual(self.runs, ["nightly"])
+
+    def test_failure_is_recorded_and_job_stays_scheduled(self):
+        scheduler = Scheduler([self.make_job(fail=True)])
+        scheduler.register(self.db)
+        self.make_due()
+
+        self.run_due(scheduler)
+
+        self.db.expire_all()
+        row = self.db.get(ScheduledJob, "nightly")
+        self.assertEqual(row.last_error, "boom")
+        self.assertGreater(row.next_run_at, utcnow())
+
+    def test_changed_schedule_is_recomputed(self):
+        Scheduler([self.make_job(schedule="0 3 1 1 *")]).register(self.db)
+        Scheduler([self.make_job(schedule="*/5 * * * *")]).register(self.db)
+
+        self.db.expire_all()
+        row = self.db.get(ScheduledJob, "nightly")
+        self.assertEqual(row.schedule, "*/5 * * * *")
+        self.assertLessEqual(row.next_run_at, utcnow() + timedelta(minutes=5))
+
+    def test_next_run_adds_jitter_within_bounds(self):
+        job = Job("jittered", "0 * * * *", None, jitter=120)
+        after = datetime(2024, 1, 1, 10, 30)
+        plain = Job("plain", "0 * * * *", None).next_run(after)
+
+        for _ in range(20):
+            delay = job.next_run(after) - plain
+            self.assertTrue(timedelta() <= delay <= timedelta(seconds=120))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+import asyncio
+import unittest
+from datetime import timedelta
+from unittest import mock
+
+from app.database import engine, SessionLocal
+from app.models import Base, User, SyncRequest
+from app.services import sync_requests
+from app.services.sync_requests import request_sync, try_request_sync, start_sync, finish_sync, forget_sync
+
+
+class TestSyncRequestCoalescing(unittest.TestCase):
+    def setUp(self):
+        Base.metadata.create_all(bind=engine)
+        self.db = SessionLocal()
+        user = User(google_id="dedup", email="dedup@example.com", name="Dedup")
+        self.db.add(user)
+        self.db.commit()
+        self.user_id = user.id
+        self.published = []
+
+        async def capture(messages, routing_key="sync_queue"):
+            self.published.extend((t, routing_key) for t, _ in messages)
+
+        patcher = mock.patch.object(sync_requests, "send_sync_messages", capture)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.db.close()
+        Base.metadata.drop_all(bind=engine)
+
+    def trigger(self, sync_type="calendar_sync", lane="interactive"):
+        return asyncio.run(request_sync(self.db, sync_type, self.user_id, lane=lane))
+
+    def test_repeated_triggers_collapse_while_queued(self):
+        self.assertTrue(self.trigger())
+        self.assertFalse(self.trigger())
+        self.assertFalse(self.trigger())
+        self.assertEqual(len(self.published), 1)
+
+    def test_sync_types_are_independent(self):
+        self.trigger("calendar_sync")
+        self.trigger("go4schools_sync")
+        self.assertEqual([t for t, _ in self.published], ["calendar_sync", "go4schools_sync"])
+
+    def test_lanes_route_to_separate_queues(self):
+        self.trigger("go4schools_sync", lane="batch")
+        self.trigger("calendar_sync")
+        self.assertEqual(self.published, [("go4schools_sync", "sync_queue.batch"), ("calendar_sync", "sync_queue")])
+
+    def test_interactive_trigger_jumps_queued_batch_sync(self):
+        self.assertTrue(self.trigger("go4schools_sync", lane="batch"))
+        self.assertFalse(self.trigger("go4schools_sync", lane="batch"))
+        self.assertTrue(self.trigger("go4schools_sync"))
+        self.assertFalse(self.trigger("go4schools_sync"))
+        self.assertEqual(self.published[-1], ("go4schools_sync", "sync_queue"))
+
+    def test_triggers_while_running_request_one_rerun(self):
+        self.trigger()
+        start_sync(self.db, "calendar_sync", self.user_id)
+        self.assertFalse(self.trigger())
+        self.assertFalse(self.trigger())
+
+        self.assertTrue(finish_sync(self.db, "calendar_sync", self.user_id))
+        self.assertEqual(self.db.query(SyncRequest).one().state, "queued")
+        self.assertEqual(len(self.published), 1)  # the worker publishes the rerun itself
+
+        start_sync(self.db, "calendar_sync", self.user_id)
+        self.assertFalse(finish_sync(self.db, "calendar_sync", self.user_id))
+        self.assertEqual(self.db.query(SyncRequest).count(), 0)
+        self.assertTrue(self.trigger())
+
+    def test_stale_request_no_longer_blocks(self):
+        self.trigger()
+        request = self.db.query(SyncRequest).one()
+        request.updated_at -= sync_requests.STALE_AFTER + timedelta(minutes=1)
+        self.db.commit()
+
+        self.assertTrue(self.trigger())
+        self.assertEqual(len(self.published), 2)
+
+    def test_failed_sync_waiting_for_retry_still_collapses_triggers(self):
+        self.trigger()
+        start_sync(self.db, "calendar_sync", self.user_id)
+        self.assertIsNone(finish_sync(self.db, "calendar_sync", self.user_id, succeeded=False, retrying=True))
+        self.assertEqual(self.db.query(SyncRequest).one().state, "retrying")
+        self.assertFalse(self.trigger())
+
+        # Past the usual stale limit, but a retry may still be waiting in its delay queue
+        request = self.db.query(SyncRequest).one()
+        request.updated_at -= sync_requests.STALE_AFTER + timedelta(minutes=1)
+        self.db.commit()
+        self.assertFalse(self.trigger())
+        self.assertEqual(len(self.published), 1)
+
+        forget_sync(self.db, "calendar_sync", self.user_id)  # dead-lettered
+        self.assertTrue(self.trigger())
+
+    def test_rerun_keeps_the_batch_lane(self):
+        self.trigger("go4schools_sync", lane="batch")
+        start_sync(self.db, "go4schools_sync", self.user_id)
+        self.trigger("go4schools_sync", lane="batch")
+        self.assertEqual(finish_sync(self.db, "go4schools_sync", self.user_id), "batch")
+
+        start_sync(self.db, "go4schools_sync", self.user_id)
+        self.trigger("go4schools_sync")
+        self.assertEqual(finish_sync(self.db, "go4schools_sync", self.user_id), "interactive")
+
+    def test_try_request_sync_survives_a_broker_outage(self):
+        async def broken(messages, routing_key="sync_queue"):
+            raise ConnectionError("broker down")
+
+        with mock.patch.object(sync_requests, "send_sync_messages", broken):
+            self.assertFalse(asyncio.run(try_request_sync(self.db, "calendar_sync", self.user_id)))
+        self.assertEqual(self.db.query(SyncRequest).count(), 0)
+        self.assertTrue(self.trigger())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+import asyncio
+import json
+import unittest
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+from unittest import mock
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.routers import sync
+from app.routers.auth import get_me
+from app.services import rabbitmq
+
+
+class TestSyncRetries(unittest.TestCase):
+    def setUp(self):
+        self.published = []
+
+        async def capture(message, routing_key):
+            self.published.append((routing_key, message))
+
+        patcher = mock.patch.object(rabbitmq.publisher, "publish_message", capture)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def fail(self, attempt=None):
+        headers = {"x-attempt": attempt} if attempt else {}
+        body = json.dumps({"type": "calendar_sync", "data": {"user_id": 1}}).encode()
+        message = SimpleNamespace(body=body, headers=headers)
+        asyncio.run(rabbitmq.retry_or_dead_letter(message, "sync_queue", RuntimeError("Google 503")))
+        return self.published[-1]
+
+    def test_backoff_grows_exponentially(self):
+        self.assertEqual(rabbitmq.retry_delays(), [30, 120, 480, 1920])
+
+    def test_first_failure_goes_to_shortest_retry_queue(self):
+        routing_key, message = self.fail()
+        self.assertEqual(routing_key, "sync_queue.retry.30s")
+        self.assertEqual(message.headers["x-attempt"], 2)
+
+    def test_later_failures_back_off(self):
+        routing_key, message = self.fail(attempt=3)
+        self.assertEqual(routing_key, "sync_queue.retry.480s")
+        self.assertEqual(message.headers["x-attempt"], 4)
+
+    def test_last_attempt_is_dead_lettered(self):
+        routing_key, message = self.fail(attempt=5)
+        self.assertEqual(routing_key, "sync_queue.dead")
+        self.assertEqual(message.headers["x-error"], "Google 503")
+        self.assertEqual(message.headers["x-original-queue"], "sync_queue")
+
+
+class FakeQueue:
+    def __init__(self, messages):
+        self.messages = messages
+
+    async def get(self, no_ack=False, fail=True):
+        if not self.messages:
+            return None
+        message = self.messages.pop(0)
+        return SimpleNamespace(body=message.body, headers=message.headers,
+                               ack=mock.AsyncMock(), nack=mock.AsyncMock())
+
+
+class FakeChannel:
+    """Serves each declared queue from the messages published to it."""
+
+    def __init__(self, published):
+        self.published = published
+        self.default_exchange = SimpleNamespace(publish=mock.AsyncMock())
+
+    async def declare_queue(self, name, durable=False):
+        return FakeQueue([m for key, m in self.published if key == name])
+
+
+class TestDeadLetterEndpoints(unittest.TestCase):
+    def setUp(self):
+        self.published = []
+
+        async def capture(message, routing_key):
+            self.published.append((routing_key, message))
+
+        @asynccontextmanager
+        async def channel():
+            yield self.channel
+
+        self.channel = FakeChannel(self.published)
+        for patcher in (mock.patch.object(rabbitmq.publisher, "publish_message", capture),
+                        mock.patch.object(rabbitmq.publisher, "channel", channel)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        app = FastAPI()
+        app.include_router(sync.router)
+        app.dependency_overrides[get_me] = lambda: SimpleNamespace(id=1, role="parent")
+        self.client = TestClient(app)
+
+    def dead_letter_batch_sync(self):
+        body = json.dumps({"type": "go4schools_sync", "data": {"user_id": 1}}).encode()
+        message = SimpleNamespace(body=body, headers={"x-attempt": 5})
+        asyncio.run(rabbitmq.retry_or_dead_letter(message, "sync_queue.batch", RuntimeError("Scrape timed out")))
+
+    def test_batch_lane_dead_letters_can_be_listed(self):
+        self.dead_letter_batch_sync()
+
+        self.assertEqual(self.client.get("/sync/dead-letters").json(), [])
+        listed = self.client.get("/sync/dead-letters?lane=batch").json()
+        self.assertEqual([m["error"] for m in listed], ["Scrape timed out"])
+        self.assertEqual(listed[0]["original_queue"], "sync_queue.batch")
+
+    def test_batch_lane_dead_letters_can_be_replayed(self):
+        self.dead_letter_batch_sync()
+
+        response = self.client.post("/sync/dead-letters/replay?lane=batch")
+
+        self.assertEqual(response.json()["count"], 1)
+        self.assertEqual(self.channel.default_exchange.publish.await_args.kwargs["routing_key"], "sync_queue.batch")
+
+    def test_unknown_lane_is_rejected(self):
+        self.assertEqual(self.client.get("/sync/dead-letters?lane=nightly").status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
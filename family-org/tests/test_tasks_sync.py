@@ -0,0 +1,98 @@
+import unittest
+
+from app.database import engine, SessionLocal
+from app.models import Base, User, Chore
+from app.services.google_tasks import sync_tasks
+from fakes import FakeTasksService
+
+
+class TestGoogleTasksSync(unittest.TestCase):
+    def setUp(self):
+        Base.metadata.create_all(bind=engine)
+        self.db = SessionLocal()
+        user = User(google_id="tasks-sync", email="tasks-sync@example.com", name="Tasks Sync")
+        self.db.add(user)
+        self.db.commit()
+        self.user_id = user.id
+        self.google = FakeTasksService()
+
+    def tearDown(self):
+        self.db.close()
+        Base.metadata.drop_all(bind=engine)
+
+    def sync(self):
+        result = sync_tasks(self.db, self.google, self.user_id)
+        self.db.commit()
+        return result
+
+    def chore(self, task_id):
+        return self.db.query(Chore).filter(Chore.google_task_id == task_id).first()
+
+    def test_pull_creates_personal_chores(self):
+        self.google.put_task("t1", "Book MOT", notes="Before the 12th", due="2030-02-01T00:00:00.000Z")
+        self.google.put_task("t2", "Renew passport", status="completed")
+
+        result = self.sync()
+
+        self.assertEqual(result["upserted"], 2)
+        mot = self.chore("t1")
+        self.assertEqual((mot.title, mot.description, mot.source), ("Book MOT", "Before the 12th", "google_tasks"))
+        self.assertTrue(mot.personal)
+        self.assertEqual(mot.assignee_id, self.user_id)
+        self.assertEqual(mot.due_date.year, 2030)
+        self.assertTrue(self.chore("t2").is_completed)
+
+    def test_repeat_sync_only_fetches_updated_tasks(self):
+        for i in range(150):
+            self.google.put_task(f"t{i}", f"Task {i}")
+        self.sync()
+        self.assertEqual(len(self.google.list_calls), 2)
+
+        self.google.put_task("t5", "Task 5 (edited)")
+        result = self.sync()
+
+        self.assertEqual(self.google.list_calls[-1]["updatedMin"], self.google.store["t149"]["updated"])
+        self.assertEqual(result["upserted"], 1)
+        self.assertEqual(self.chore("t5").title, "Task 5 (edited)")
+
+    def test_deleted_tasks_remove_chores(self):
+        self.google.put_task("t1", "Book MOT")
+        self.sync()
+
+        self.google.delete_task("t1")
+        result = self.sync()
+
+        self.assertEqual(result["deleted"], 1)
+        self.assertIsNone(self.chore("t1"))
+
+    def test_local_completions_are_pushed_in_batches(self):
+        for i in range(60):
+            self.google.put_task(f"t{i}", f"Task {i}")
+        self.sync()
+
+        for chore in self.db.query(Chore).all():
+            chore.is_completed = True
+        self.db.commit()
+        result = self.sync()
+
+        self.assertEqual(result["pushed"], 60)
+        self.assertEqual(self.google.batch_sizes, [50, 10])
+        self.assertTrue(all(t["status"] == "completed" for t in self.google.store.values()))
+        # The pulled echo of our own patches is recognised by etag and not rewritten
+        self.assertEqual(result["upserted"], 0)
+        self.assertEqual(self.sync()["pushed"], 0)
+
+    def test_reopened_chore_is_pushed_as_needs_action(self):
+        self.google.put_task("t1", "Book MOT", status="completed")
+        self.sync()
+
+        self.chore("t1").is_completed = False
+        self.db.commit()
+        self.sync()
+
+        self.assertEqual(self.google.store["t1"]["status"], "needsAction")
+        self.assertNotIn("completed", self.google.store["t1"])
+
+
+if __name__ == "__main__":
+    unittest.main()
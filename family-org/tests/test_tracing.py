@@ -0,0 +1,93 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.config import settings
+from app.services import rabbitmq
+from app.services.tracing import TracingMiddleware, exporter, parse_traceparent, span
+
+REMOTE_TRACE = "0af7651916cd43dd8448eb211c80319c"
+REMOTE_PARENT = "b7ad6b7169203331"
+
+
+class TestTracing(unittest.TestCase):
+    def setUp(self):
+        fd, self.trace_file = tempfile.mkstemp(suffix=".jsonl")
+        os.close(fd)
+        self.addCleanup(os.remove, self.trace_file)
+        patcher = mock.patch.object(settings, "TRACE_FILE", self.trace_file)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def exported(self):
+        exporter.flush()
+        with open(self.trace_file) as f:
+            return {s["name"]: s for s in map(json.loads, f)}
+
+    def test_nested_spans_share_a_trace(self):
+        with span("outer", user_id=1):
+            with span("inner"):
+                pass
+
+        spans = self.exported()
+        self.assertEqual(spans["inner"]["trace_id"], spans["outer"]["trace_id"])
+        self.assertEqual(spans["inner"]["parent_id"], spans["outer"]["span_id"])
+        self.assertIsNone(spans["outer"]["parent_id"])
+        self.assertEqual(spans["outer"]["attributes"], {"user_id": 1})
+
+    def test_errors_are_recorded(self):
+        with self.assertRaises(ValueError):
+            with span("broken"):
+                raise ValueError("bad data")
+
+        self.assertEqual(self.exported()["broken"]["error"], "ValueError: bad data")
+
+    def test_published_messages_carry_the_current_span(self):
+        with span("publisher") as current:
+            message = rabbitmq._build_message("calendar_sync", {"user_id": 1})
+
+        trace_id, parent_id = parse_traceparent(message.headers["traceparent"])
+        self.assertEqual(trace_id, current.trace_id)
+        self.assertEqual(parent_id, current.span_id)
+
+    def test_http_requests_continue_incoming_traces(self):
+        app = FastAPI()
+        app.add_middleware(TracingMiddleware)
+
+        @app.get("/traced/{item_id}")
+        def traced(item_id: int):
+            with span("handler"):
+                return {"ok": True}
+
+        response = TestClient(app).get(
+            "/traced/7", headers={"traceparent": f"00-{REMOTE_TRACE}-{REMOTE_PARENT}-01"})
+
+        self.assertEqual(response.headers["x-trace-id"], REMOTE_TRACE)
+        spans = self.exported()
+        request_span = spans["GET /traced/{item_id}"]
+        self.assertEqual(request_span["parent_id"], REMOTE_PARENT)
+        self.assertEqual(request_span["attributes"], {"status": 200, "path": "/traced/7"})
+        self.assertEqual(spans["handler"]["parent_id"], request_span["span_id"])
+
+    def test_malformed_traceparent_is_ignored(self):
+        self.assertIsNone(parse_traceparent("not-a-trace"))
+        self.assertIsNone(parse_traceparent(None))
+        self.assertEqual(parse_traceparent(f"00-{REMOTE_TRACE}-{REMOTE_PARENT}-01".encode()),
+                         (REMOTE_TRACE, REMOTE_PARENT))
+
+    def test_disabled_tracing_adds_no_headers(self):
+        with mock.patch.object(settings, "TRACE_FILE", ""):
+            with span("ignored") as current:
+                message = rabbitmq._build_message("calendar_sync", {"user_id": 1})
+                current.set(anything=True)
+
+        self.assertIsNone(message.headers.get("traceparent"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import asyncio
+import json
+import unittest
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+from prometheus_client import REGISTRY
+
+from app import worker
+from app.services import rabbitmq
+from app.services.metrics import track_call
+
+
+class FakeMessage:
+    def __init__(self, body, headers=None, age=0):
+        self.body = json.dumps(body).encode()
+        self.headers = headers or {}
+        self.timestamp = datetime.now(timezone.utc) - timedelta(seconds=age)
+
+    @asynccontextmanager
+    async def process(self, requeue=False):
+        yield
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+class TestWorkerMetrics(unittest.TestCase):
+    def setUp(self):
+        async def capture(message, routing_key):
+            pass
+
+        patcher = mock.patch.object(rabbitmq.publisher, "publish_message", capture)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def handle(self, message, error=None):
+        async def process_sync(body, lane="interactive"):
+            if error:
+                raise error
+
+        with mock.patch.object(worker, "process_sync", process_sync):
+            asyncio.run(worker.handle_message(message, "metrics_queue"))
+
+    def test_consumed_message_records_lag_and_duration(self):
+        lag_before = sample("worker_queue_lag_seconds_sum", queue="metrics_queue")
+        count_before = sample("worker_message_duration_seconds_count", type="metrics_ok")
+
+        self.handle(FakeMessage({"type": "metrics_ok", "data": {}}, age=5))
+
+        self.assertEqual(sample("worker_messages_consumed_total", queue="metrics_queue", type="metrics_ok"), 1)
+        self.assertGreaterEqual(sample("worker_queue_lag_seconds_sum", queue="metrics_queue") - lag_before, 4)
+        self.assertEqual(sample("worker_message_duration_seconds_count", type="metrics_ok") - count_before, 1)
+
+    def test_failures_are_counted_by_outcome(self):
+        body = {"type": "metrics_fail", "data": {}}
+        self.handle(FakeMessage(body), error=RuntimeError("boom"))
+        self.handle(FakeMessage(body, headers={"x-attempt": 5}), error=RuntimeError("boom"))
+
+        labels = {"queue": "metrics_queue", "type": "metrics_fail"}
+        self.assertEqual(sample("worker_messages_failed_total", outcome="retried", **labels), 1)
+        self.assertEqual(sample("worker_messages_failed_total", outcome="dead_lettered", **labels), 1)
+
+    def test_track_call_counts_exceptions(self):
+        with self.assertRaises(ValueError):
+            with track_call("metrics_test", "explode"):
+                raise ValueError("nope")
+        with track_call("metrics_test", "explode"):
+            pass
+
+        labels = {"service": "metrics_test", "operation": "explode"}
+        self.assertEqual(sample("external_call_failures_total", **labels), 1)
+        self.assertEqual(sample("external_call_duration_seconds_count", **labels), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()